@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+外部分析服务模拟服务器 - 用于在本地测试外部分析服务客户端（连接池、批量请求、熔断回退）
+
+用法: python analysis_stub_server.py [--port 8002] [--latency 0.05] [--fail-rate 0.1] [--no-batch]
+然后设置 ANALYSIS_SERVICE_URL=http://127.0.0.1:8002 启动应用
+
+使用 --socket /tmp/analysis.sock 时改为提供二进制协议（analysis_protocol的参考实现），
+对应 ANALYSIS_SERVICE_URL=unix:///tmp/analysis.sock
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+class StubHandler(BaseHTTPRequestHandler):
+    """模拟 /analyze 和 /analyze/batch 接口"""
+
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+    options = None
+    service = None
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _analyze(self, document):
+        return self.service.analyze_content(document.get('content', ''))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send(400, {'error': '请求体不是有效的JSON'})
+            return
+
+        if self.path not in ('/analyze', '/analyze/batch') or (self.path == '/analyze/batch' and self.options.no_batch):
+            self._send(404, {'error': '接口不存在'})
+            return
+
+        time.sleep(self.options.latency)
+        if random.random() < self.options.fail_rate:
+            self._send(503, {'error': '模拟服务故障'})
+            return
+
+        if self.path == '/analyze':
+            self._send(200, self._analyze(payload))
+        else:
+            self._send(200, {'results': [self._analyze(d) for d in payload.get('documents', [])]})
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+def serve_socket(options, service) -> int:
+    """提供二进制协议"""
+    from app.services.analysis_protocol import AnalysisProtocolServer, available_codecs, CODEC_MSGPACK
+
+    def analyze(content):
+        time.sleep(options.latency)
+        if random.random() < options.fail_rate:
+            raise RuntimeError('模拟服务故障')
+        return service.analyze_content(content)
+
+    server = AnalysisProtocolServer(options.socket, analyze)
+    codec = 'msgpack' if CODEC_MSGPACK in available_codecs() else 'json'
+    print(f"🚀 模拟分析服务: unix://{options.socket} （编码: {codec}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='外部分析服务模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='请求失败的概率（HTTP返回503，二进制协议返回error）')
+    parser.add_argument('--no-batch', action='store_true', help='不提供 /analyze/batch 接口')
+    parser.add_argument('--socket', help='Unix域套接字路径，提供二进制协议而不是HTTP接口')
+    parser.add_argument('--verbose', action='store_true', help='输出请求日志')
+    options = parser.parse_args()
+
+    from app.services.analysis_service import AnalysisService
+
+    if options.socket:
+        return serve_socket(options, AnalysisService())
+
+    StubHandler.options = options
+    StubHandler.service = AnalysisService()
+    server = ThreadingHTTPServer((options.host, options.port), StubHandler)
+    print(f"🚀 模拟分析服务: http://{options.host}:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -50,9 +50,18 @@ def configure_app(app):
         app.logger.warning(f"无法从ConfigService读取配置，使用默认路径: {e}")
         app.config['OBSIDIAN_VAULT_PATH'] = os.getenv('OBSIDIAN_VAULT_PATH', './docs')
     
-    # 分析服务配置
-    app.config['ANALYSIS_SERVICE_URL'] = os.getenv('ANALYSIS_SERVICE_URL', 'http://localhost:8001')
-    app.config['ANALYSIS_SERVICE_TIMEOUT'] = int(os.getenv('ANALYSIS_SERVICE_TIMEOUT', 30))
+    # 分析服务配置（URL为空时使用本地分析）
+    app.config['ANALYSIS_SERVICE_URL'] = os.getenv('ANALYSIS_SERVICE_URL', '').strip()
+    app.config['ANALYSIS_SERVICE_TIMEOUT'] = float(os.getenv('ANALYSIS_SERVICE_TIMEOUT', 10))
+    app.config['ANALYSIS_SERVICE_DEADLINE'] = float(os.getenv('ANALYSIS_SERVICE_DEADLINE', 20))
+    app.config['ANALYSIS_SERVICE_CONNECT_TIMEOUT'] = float(os.getenv('ANALYSIS_SERVICE_CONNECT_TIMEOUT', 2))
+    app.config['ANALYSIS_SERVICE_POOL_SIZE'] = int(os.getenv('ANALYSIS_SERVICE_POOL_SIZE', 10))
+    app.config['ANALYSIS_SERVICE_RETRIES'] = int(os.getenv('ANALYSIS_SERVICE_RETRIES', 2))
+    app.config['ANALYSIS_SERVICE_BACKOFF'] = float(os.getenv('ANALYSIS_SERVICE_BACKOFF', 0.2))
+    app.config['ANALYSIS_SERVICE_BATCH_SIZE'] = int(os.getenv('ANALYSIS_SERVICE_BATCH_SIZE', 16))
+    app.config['ANALYSIS_SERVICE_CONCURRENCY'] = int(os.getenv('ANALYSIS_SERVICE_CONCURRENCY', 4))
+    app.config['ANALYSIS_SERVICE_BREAKER_THRESHOLD'] = int(os.getenv('ANALYSIS_SERVICE_BREAKER_THRESHOLD', 5))
+    app.config['ANALYSIS_SERVICE_BREAKER_COOLDOWN'] = float(os.getenv('ANALYSIS_SERVICE_BREAKER_COOLDOWN', 30))
     
     # 数据库配置
     app.config['DATABASE_URL'] = os.getenv('DATABASE_URL', 'sqlite:///obsidian_docs.db')
@@ -2,25 +2,132 @@
 API路由 - 为后期C/Rust服务预留接口
 """
 
-from flask import Blueprint, request, jsonify, current_app
-import requests
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 import json
+import time
 from app.services.document_service import DocumentService
-from app.services.analysis_service import AnalysisService
+from app.services.analysis_service import AnalysisService, DEFAULT_ANALYSIS_WORKERS
+from app.services.analysis_client import get_analysis_client
+from app.services.config_service import ConfigService
+from app.services.job_service import get_job_service, SUCCEEDED
+from app.services.link_graph import encode_graph_binary, encode_graph_json
+from app.services.blob_store import iter_chunks
+from app.routes.conditional import make_etag, not_modified, with_validators
 
 api_bp = Blueprint('api', __name__)
 
+def _stream_format():
+    """请求的流式输出格式
+    
+    format=ndjson 或 Accept: application/x-ndjson 时为'ndjson'，stream=1时为'json'，否则为None（普通响应）。
+    """
+    if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return 'json'
+    return None
+
+def _stream_items(items, meta, stream_format):
+    """流式输出列表结果，不在内存中拼接完整响应
+    
+    json格式与普通响应结构相同（{"success": true, ...meta, "data": [...]}），分块输出；
+    ndjson格式每行一条，最后一行为 {"done": true, ...meta}。
+    输出过程中出错时，json格式在末尾附加error字段，ndjson格式在最后一行附加error字段。
+    """
+    dumps = current_app.json.dumps
+    
+    def generate_json():
+        head = dumps({'success': True, **meta})
+        yield head[:-1] + (', ' if meta else '') + '"data": ['
+        error = None
+        try:
+            for index, item in enumerate(items):
+                yield (', ' if index else '') + dumps(item)
+        except Exception as e:
+            current_app.logger.error(f"流式输出失败: {e}")
+            error = str(e)
+        yield ']' + (f', "error": {dumps(error)}' if error else '') + '}'
+    
+    def generate_ndjson():
+        summary = {'done': True, **meta}
+        try:
+            for item in items:
+                yield dumps(item) + '\n'
+        except Exception as e:
+            current_app.logger.error(f"流式输出失败: {e}")
+            summary['error'] = str(e)
+        yield dumps(summary) + '\n'
+    
+    if stream_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
 @api_bp.route('/documents', methods=['GET'])
 def get_documents():
-    """获取所有文档列表"""
+    """获取文档列表（分页）
+    
+    查询参数：
+    - offset / limit: 分页，limit最大1000
+    - cursor: 上一页返回的next_cursor，优先于offset
+    - sort / order: 排序字段和方向（asc/desc）
+    - fields: 逗号分隔的字段列表，正文字段content/html_content需显式指定
+    - stream=1 或 format=ndjson: 流式输出（逐条序列化），此时limit不受上限限制
+    - tag: 按标签筛选（含嵌套子标签，如tag=tech匹配tech/python），可重复，需全部满足
+    - meta.<字段>: 按frontmatter字段值筛选，同一字段可重复（满足其一），不同字段需全部满足
+    - facets: 逗号分隔的分面（tags 或 meta.<字段>），返回筛选结果中各值的文档数
+    
+    支持条件请求：文档库内容未变化时返回304。
+    """
     try:
+        fields = request.args.get('fields')
+        facets = request.args.get('facets')
+        meta_filters = {}
+        for name in request.args:
+            if name.startswith('meta.') and len(name) > len('meta.'):
+                meta_filters[name[len('meta.'):]] = request.args.getlist(name)
+        stream_format = _stream_format()
         doc_service = DocumentService()
-        documents = doc_service.get_all_documents()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('documents', vault['version'], request.query_string, stream_format)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        page = doc_service.list_documents(
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', 50, type=int),
+            sort=request.args.get('sort', 'modified_time'),
+            order=request.args.get('order', 'desc'),
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+            cursor=request.args.get('cursor'),
+            lazy=stream_format is not None,
+            tags=request.args.getlist('tag'),
+            meta=meta_filters,
+            facets=[f.strip() for f in facets.split(',') if f.strip()] if facets else None
+        )
+        meta = {
+            'count': page['count'],
+            'total': page['total'],
+            'offset': page['offset'],
+            'limit': page['limit'],
+            'next_cursor': page['next_cursor']
+        }
+        if page['facets'] is not None:
+            meta['facets'] = page['facets']
+        if stream_format:
+            response = _stream_items(page['items'], meta, stream_format)
+        else:
+            response = jsonify({
+                'success': True,
+                'data': page['items'],
+                **meta
+            })
+        response.vary.add('Accept')  # Accept决定是否使用NDJSON
+        return with_validators(response, etag)
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': documents,
-            'count': len(documents)
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -29,33 +136,86 @@ def get_documents():
 
 @api_bp.route('/documents/<path:doc_path>', methods=['GET'])
 def get_document(doc_path):
-    """获取单个文档"""
+    """获取单个文档（支持条件请求，文档未修改时返回304）"""
     try:
         doc_service = DocumentService()
-        document = doc_service.get_document(doc_path)
+        version = doc_service.get_document_version(doc_path)
+        if version is None:
+            return jsonify({
+                'success': False,
+                'error': '文档不存在'
+            }), 404
+        
+        etag = make_etag('document', doc_path, version['version'])
+        cached = not_modified(etag, version['last_modified'])
+        if cached:
+            return cached
         
+        document = doc_service.get_document(doc_path)
         if not document:
             return jsonify({
                 'success': False,
                 'error': '文档不存在'
             }), 404
         
-        return jsonify({
+        return with_validators(jsonify({
             'success': True,
             'data': document
-        })
+        }), etag, version['last_modified'])
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _body_response(doc_path, kind, mimetype):
+    """输出文档原文或HTML，数据从正文存储的内存映射分块输出（支持条件请求）"""
+    try:
+        doc_service = DocumentService()
+        version = doc_service.get_document_version(doc_path)
+        if version is None:
+            return jsonify({
+                'success': False,
+                'error': '文档不存在'
+            }), 404
+        
+        etag = make_etag(kind, doc_path, version['version'])
+        cached = not_modified(etag, version['last_modified'])
+        if cached:
+            return cached
+        
+        body = doc_service.get_document_body(doc_path, kind)
+        if body is None:
+            return jsonify({
+                'success': False,
+                'error': '文档不存在'
+            }), 404
+        
+        response = Response(iter_chunks(body), mimetype=mimetype)
+        response.headers['Content-Length'] = str(len(body))
+        return with_validators(response, etag, version['last_modified'])
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@api_bp.route('/documents/<path:doc_path>/raw', methods=['GET'])
+def get_document_raw(doc_path):
+    """获取文档的Markdown原文"""
+    return _body_response(doc_path, 'content', 'text/markdown')
+
+@api_bp.route('/documents/<path:doc_path>/html', methods=['GET'])
+def get_document_html(doc_path):
+    """获取文档渲染后的HTML片段"""
+    return _body_response(doc_path, 'html', 'text/html')
+
 @api_bp.route('/documents/<path:doc_path>/analysis', methods=['GET'])
 def analyze_document(doc_path):
     """分析文档 - 预留接口，后期可调用C/Rust服务"""
     try:
         doc_service = DocumentService()
-        document = doc_service.get_document(doc_path)
+        document = doc_service.get_document(doc_path, render=False)
         
         if not document:
             return jsonify({
@@ -88,9 +248,322 @@ def analyze_document(doc_path):
             'error': str(e)
         }), 500
 
+@api_bp.route('/documents/<path:doc_path>/backlinks', methods=['GET'])
+def get_backlinks(doc_path):
+    """获取文档的反向链接（[[双链]]和![[嵌入]]），以及该文档的正向链接和未解析链接"""
+    try:
+        doc_service = DocumentService()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('backlinks', doc_path, vault['version'])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        links = doc_service.get_backlinks(doc_path)
+        if links is None:
+            return jsonify({
+                'success': False,
+                'error': '文档不存在'
+            }), 404
+        
+        return with_validators(jsonify({
+            'success': True,
+            'data': links,
+            'count': len(links['backlinks'])
+        }), etag)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/graph', methods=['GET'])
+def get_graph():
+    """获取文档库的双链图谱
+    
+    查询参数：
+    - format: 默认返回 nodes（文档）、edges（[来源, 目标, 'link' | 'embed']）、unresolved（未解析目标 -> 来源文档）和 stats；
+      csr返回紧凑的CSR数组（nodes、titles、offsets、targets、kinds），binary返回同样内容的二进制编码
+    - folder / tag / min_degree / max_degree / embeds=0: 过滤节点和边（仅csr和binary格式）
+    """
+    graph_format = request.args.get('format', 'json')
+    if graph_format not in ('json', 'csr', 'binary'):
+        return jsonify({
+            'success': False,
+            'error': f'不支持的格式: {graph_format}'
+        }), 400
+    filters = {
+        'folder': request.args.get('folder', ''),
+        'tag': request.args.get('tag') or None,
+        'min_degree': request.args.get('min_degree', 0, type=int),
+        'max_degree': request.args.get('max_degree', None, type=int),
+        'include_embeds': request.args.get('embeds', '1').lower() not in ('0', 'false', 'no')
+    }
+    if graph_format == 'json' and any(name in request.args for name in
+                                      ('folder', 'tag', 'min_degree', 'max_degree', 'embeds')):
+        return jsonify({
+            'success': False,
+            'error': '过滤参数需要format=csr或format=binary'
+        }), 400
+    
+    try:
+        doc_service = DocumentService()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('graph', vault['version'], request.query_string)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        if graph_format == 'json':
+            response = jsonify({
+                'success': True,
+                'data': doc_service.get_link_graph()
+            })
+        else:
+            export = doc_service.export_link_graph(**filters)
+            if graph_format == 'binary':
+                response = Response(encode_graph_binary(export), mimetype='application/octet-stream')
+            else:
+                response = jsonify({
+                    'success': True,
+                    'data': encode_graph_json(export)
+                })
+        return with_validators(response, etag)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/analysis/batch', methods=['POST'])
+def analyze_batch():
+    """批量分析文档，以NDJSON流式返回（每行一个结果，按完成顺序）
+    
+    请求体（JSON）：
+    - paths: 文档路径列表
+    - folder: 文件夹路径，分析其下（含子文件夹）的所有文档，空字符串表示整个文档库
+    
+    配置了外部分析服务时优先使用外部服务，失败的文档回退到本地分析。
+    
+    每个文档一行 {"path", "success", "data", "source"}，失败时为 {"path", "success": false, "error"}，
+    最后一行为汇总 {"done": true, "total", "succeeded", "failed", "elapsed"}。
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({
+            'success': False,
+            'error': '请求体必须是JSON对象'
+        }), 400
+    
+    paths = body.get('paths')
+    folder = body.get('folder')
+    if paths is not None and not (isinstance(paths, list) and all(isinstance(p, str) for p in paths)):
+        return jsonify({
+            'success': False,
+            'error': 'paths必须是字符串列表'
+        }), 400
+    if folder is not None and not isinstance(folder, str):
+        return jsonify({
+            'success': False,
+            'error': 'folder必须是字符串'
+        }), 400
+    if not paths and folder is None:
+        return jsonify({
+            'success': False,
+            'error': '需要提供paths或folder'
+        }), 400
+    
+    try:
+        doc_service = DocumentService()
+        missing = []
+        if paths:
+            documents = []
+            for path in dict.fromkeys(paths):
+                document = doc_service.get_document(path, render=False)
+                if document:
+                    documents.append(document)
+                else:
+                    missing.append(path)
+        else:
+            documents = doc_service.find_documents(folder)
+        workers = ConfigService().get('analysis_workers', DEFAULT_ANALYSIS_WORKERS)
+        client = get_analysis_client(current_app.config)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    def generate():
+        start = time.time()
+        succeeded = failed = 0
+        for path in missing:
+            failed += 1
+            yield json.dumps({'path': path, 'success': False, 'error': '文档不存在'}, ensure_ascii=False) + '\n'
+        for result in AnalysisService().analyze_batch(documents, workers, client):
+            if result['success']:
+                succeeded += 1
+            else:
+                failed += 1
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'done': True,
+            'total': succeeded + failed,
+            'succeeded': succeeded,
+            'failed': failed,
+            'elapsed': round(time.time() - start, 3)
+        }) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api_bp.route('/analysis/service', methods=['GET'])
+def get_analysis_service_status():
+    """获取外部分析服务客户端状态（请求数、错误数、熔断状态和延迟）"""
+    try:
+        client = get_analysis_client(current_app.config)
+        return jsonify({
+            'success': True,
+            'data': {
+                'enabled': client is not None,
+                'metrics': client.get_metrics() if client is not None else None
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _get_job_service():
+    """获取当前配置对应的后台任务服务"""
+    config_service = ConfigService()
+    return get_job_service(config_service.get('cache_dir', './cache'), config_service.get('job_workers', 2))
+
+@api_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交后台任务
+    
+    请求体（JSON）：
+    - kind: 任务类型，analysis / statistics / reindex
+    - params: 任务参数，analysis任务与 /api/analysis/batch 的请求体相同
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('params', {}), dict):
+        return jsonify({
+            'success': False,
+            'error': '请求体必须是包含kind和params的JSON对象'
+        }), 400
+    
+    try:
+        job = _get_job_service().submit(
+            body.get('kind'), body.get('params'), current_app._get_current_object()
+        )
+        return jsonify({
+            'success': True,
+            'data': job
+        }), 202
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """获取最近提交的后台任务"""
+    try:
+        jobs = _get_job_service().list(request.args.get('limit', 50, type=int))
+        return jsonify({
+            'success': True,
+            'data': jobs,
+            'count': len(jobs)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态和进度"""
+    try:
+        job = _get_job_service().get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消后台任务"""
+    try:
+        job = _get_job_service().cancel(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """获取已完成任务的结果"""
+    try:
+        job_service = _get_job_service()
+        job = job_service.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        if job['status'] != SUCCEEDED:
+            return jsonify({
+                'success': False,
+                'error': f'任务尚未成功完成: {job["status"]}',
+                'status': job['status']
+            }), 409
+        return jsonify({
+            'success': True,
+            'data': job_service.get_result(job_id)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/search', methods=['GET'])
 def search_documents():
-    """搜索文档"""
+    """搜索文档（stream=1 或 format=ndjson 时流式输出）"""
     query = request.args.get('q', '')
     if not query:
         return jsonify({
@@ -100,14 +573,26 @@ def search_documents():
     
     try:
         doc_service = DocumentService()
-        results = doc_service.search_documents(query)
+        stream_format = _stream_format()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('search', vault['version'], request.query_string, stream_format)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        return jsonify({
-            'success': True,
-            'data': results,
-            'query': query,
-            'count': len(results)
-        })
+        results = doc_service.search_documents(query)
+        if stream_format:
+            items = (doc_service.materialize(doc) for doc in results)
+            response = _stream_items(items, {'query': query, 'count': len(results)}, stream_format)
+        else:
+            response = jsonify({
+                'success': True,
+                'data': [doc_service.materialize(doc) for doc in results],
+                'query': query,
+                'count': len(results)
+            })
+        response.vary.add('Accept')  # Accept决定是否使用NDJSON
+        return with_validators(response, etag)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -116,15 +601,21 @@ def search_documents():
 
 @api_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """获取全局统计信息"""
+    """获取全局统计信息（支持条件请求，文档库未变化时返回304）"""
     try:
-        analysis_service = AnalysisService()
-        stats = analysis_service.get_global_statistics()
+        doc_service = DocumentService()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('statistics', vault['version'])
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        return jsonify({
+        stats = doc_service.get_global_statistics()
+        
+        return with_validators(jsonify({
             'success': True,
             'data': stats
-        })
+        }), etag)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -144,39 +635,13 @@ def try_external_analysis_service(document):
     """
     尝试调用外部分析服务（预留接口）
     后期可以替换为C/Rust实现的高性能分析服务
+    服务未配置、调用失败或已熔断时返回None，使用本地分析
     """
     try:
-        service_url = current_app.config.get('ANALYSIS_SERVICE_URL')
-        timeout = current_app.config.get('ANALYSIS_SERVICE_TIMEOUT', 30)
-        
-        if not service_url or service_url == 'http://localhost:8001':
-            # 默认服务未启动，返回None使用本地分析
-            return None
-        
-        # 准备请求数据
-        payload = {
-            'content': document.get('content', ''),
-            'metadata': document.get('metadata', {}),
-            'file_path': document.get('file_path', '')
-        }
-        
-        # 调用外部服务
-        response = requests.post(
-            f"{service_url}/analyze",
-            json=payload,
-            timeout=timeout,
-            headers={'Content-Type': 'application/json'}
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            current_app.logger.warning(f"外部分析服务返回错误: {response.status_code}")
+        client = get_analysis_client(current_app.config)
+        if client is None:
             return None
-            
-    except requests.exceptions.RequestException as e:
-        current_app.logger.warning(f"外部分析服务调用失败: {str(e)}")
-        return None
+        return client.analyze(document)
     except Exception as e:
         current_app.logger.error(f"外部分析服务异常: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,45 @@
+"""
+HTTP条件请求 - 根据ETag/Last-Modified处理 If-None-Match / If-Modified-Since，内容未变化时返回304
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+
+def make_etag(*parts) -> str:
+    """根据版本信息生成ETag"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+def _http_time(timestamp: Optional[float]) -> Optional[datetime]:
+    """转换为HTTP时间（精确到秒）"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+
+def not_modified(etag: str, last_modified: Optional[float] = None) -> Optional[Response]:
+    """客户端缓存仍然有效时返回304响应，否则返回None
+
+    同时带有If-None-Match时以ETag为准，忽略If-Modified-Since。
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=_http_time(last_modified)):
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+def with_validators(response: Response, etag: str, last_modified: Optional[float] = None) -> Response:
+    """为响应设置ETag和Last-Modified，并要求客户端和代理每次使用前重新校验"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_time(last_modified)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
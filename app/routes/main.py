@@ -2,9 +2,11 @@
 主要页面路由
 """
 
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, make_response
 from app.services.document_service import DocumentService
 from app.services.analysis_service import AnalysisService
+from app.services.analysis_cache import ANALYZER_VERSION
+from app.routes.conditional import make_etag, not_modified, with_validators
 
 main_bp = Blueprint('main', __name__)
 
@@ -12,16 +14,25 @@ main_bp = Blueprint('main', __name__)
 def index():
     """首页"""
     try:
-        # 获取统计数据
-        analysis_service = AnalysisService()
-        stats = analysis_service.get_global_statistics()
-        
-        # 获取最近文档
         doc_service = DocumentService()
-        documents = doc_service.get_all_documents()
-        recent_docs = documents[:5]  # 取前5个文档
+        vault = doc_service.get_vault_version()
+        etag = make_etag('index', vault['version'])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        # 获取统计数据（复用校验版本时已同步的索引）
+        stats = doc_service.get_global_statistics()
         
-        return render_template('index.html', stats=stats, recent_docs=recent_docs)
+        # 获取最近文档（只取前5个，显示摘要不读取正文）
+        recent_docs = doc_service.list_documents(
+            limit=5, fields=['file_path', 'title', 'tags', 'modified_time', 'excerpt']
+        )['items']
+        
+        return with_validators(
+            make_response(render_template('index.html', stats=stats, recent_docs=recent_docs)),
+            etag
+        )
     except Exception as e:
         # 如果获取数据失败，使用默认值
         return render_template('index.html', stats=None, recent_docs=[])
@@ -31,18 +42,35 @@ def docs_list():
     """文档列表页面"""
     try:
         doc_service = DocumentService()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('docs', vault['version'])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         documents = doc_service.get_all_documents()
-        return render_template('docs_list.html', documents=documents)
+        return with_validators(
+            make_response(render_template('docs_list.html', documents=documents)),
+            etag
+        )
     except Exception as e:
         return render_template('error.html', error=str(e))
 
 @main_bp.route('/doc/<path:doc_path>')
 def doc_detail(doc_path):
-    """文档详情页面"""
+    """文档详情页面（支持条件请求，文档未修改时返回304）"""
     try:
         doc_service = DocumentService()
-        document = doc_service.get_document(doc_path)
+        version = doc_service.get_document_version(doc_path)
+        if version is None:
+            return render_template('error.html', error="文档不存在")
+        
+        etag = make_etag('doc', doc_path, version['version'], ANALYZER_VERSION)
+        cached = not_modified(etag, version['last_modified'])
+        if cached:
+            return cached
         
+        document = doc_service.get_document(doc_path)
         if not document:
             return render_template('error.html', error="文档不存在")
         
@@ -50,9 +78,12 @@ def doc_detail(doc_path):
         analysis_service = AnalysisService()
         analysis = analysis_service.analyze_document(document)
         
-        return render_template('doc_detail.html', 
-                             document=document, 
-                             analysis=analysis)
+        return with_validators(
+            make_response(render_template('doc_detail.html',
+                                          document=document,
+                                          analysis=analysis)),
+            etag, version['last_modified']
+        )
     except Exception as e:
         return render_template('error.html', error=str(e))
 
@@ -76,9 +107,18 @@ def search():
 def analysis_dashboard():
     """分析仪表板"""
     try:
-        analysis_service = AnalysisService()
-        stats = analysis_service.get_global_statistics()
-        return render_template('analysis_dashboard.html', stats=stats)
+        doc_service = DocumentService()
+        vault = doc_service.get_vault_version()
+        etag = make_etag('analysis', vault['version'])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        stats = doc_service.get_global_statistics()
+        return with_validators(
+            make_response(render_template('analysis_dashboard.html', stats=stats)),
+            etag
+        )
     except Exception as e:
         return render_template('error.html', error=str(e))
 
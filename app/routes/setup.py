@@ -17,10 +17,13 @@ def init_services():
     """初始化服务"""
     global config_service, monitor_service
     if config_service is None:
-        config_service = ConfigService()
+        config_service = getattr(current_app, 'config_service', None) or ConfigService()
     if monitor_service is None:
-        monitor_service = MonitorService()
-        monitor_service.initialize(config_service)
+        # 复用应用初始化时创建的监控服务，避免每个进程再启动一个监控线程
+        monitor_service = getattr(current_app, 'monitor_service', None)
+        if monitor_service is None:
+            monitor_service = MonitorService()
+            monitor_service.initialize(config_service)
 
 @setup_bp.route('/setup')
 def setup_page():
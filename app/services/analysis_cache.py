@@ -0,0 +1,178 @@
+"""
+分析结果缓存 - 按文档内容哈希缓存AnalysisService的分析结果，并持久化到SQLite
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 分析逻辑或结果结构变化时递增，旧结果不再命中
+ANALYZER_VERSION = 1
+
+class AnalysisCache:
+    """文档分析结果缓存类
+
+    键为分析器版本与文档内容的哈希，内容不变即可复用。
+    作为文档索引的派生索引注册后，文档修改或删除时自动清理该路径下的旧结果。
+    """
+
+    snapshot_key = 'analysis_cache'  # 在文档库快照中的状态名（结果已在SQLite中，不需要额外状态）
+
+    def __init__(self, vault_path: str, cache_dir: str = './cache', max_entries: int = 256):
+        self.vault_path = os.path.abspath(vault_path)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        vault_hash = hashlib.sha1(self.vault_path.encode('utf-8')).hexdigest()[:12]
+        self.db_path = os.path.join(cache_dir, f'analysis-{vault_hash}.sqlite3')
+        self.entries = OrderedDict()  # key -> 分析结果
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self._conn = None
+        self._conn_pid = None
+
+    @staticmethod
+    def make_key(content: str) -> str:
+        """根据文档内容和分析器版本生成缓存键"""
+        digest = hashlib.sha256(str(ANALYZER_VERSION).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接（fork后重新建立连接）"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis ('
+                'key TEXT PRIMARY KEY, path TEXT, signature TEXT, created REAL, data TEXT)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS analysis_path ON analysis (path)')
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """获取分析结果，未命中返回None"""
+        with self.lock:
+            analysis = self.entries.get(key)
+            if analysis is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return analysis
+            try:
+                row = self._connect().execute('SELECT data FROM analysis WHERE key = ?', (key,)).fetchone()
+            except Exception as e:
+                logging.warning(f"读取分析缓存失败: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                analysis = json.loads(row[0])
+            except ValueError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, analysis)
+            return analysis
+
+    @staticmethod
+    def _signature(document: Dict) -> str:
+        """文档版本标识，与文档索引中的版本不一致的结果视为过期"""
+        return json.dumps([document.get('modified_time'), document.get('size')])
+
+    def put(self, key: str, document: Dict, analysis: Dict):
+        """写入分析结果"""
+        with self.lock:
+            self._remember(key, analysis)
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO analysis (key, path, signature, created, data) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, document.get('file_path', ''), self._signature(document), time.time(),
+                     json.dumps(analysis, ensure_ascii=False))
+                )
+                conn.commit()
+            except Exception as e:
+                logging.warning(f"写入分析缓存失败: {e}")
+
+    def _remember(self, key: str, analysis: Dict):
+        """写入内存并淘汰最久未使用的条目"""
+        self.entries[key] = analysis
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _discard(self, rows: List[Tuple[str]]):
+        """删除指定键的结果"""
+        if not rows:
+            return
+        for (key,) in rows:
+            self.entries.pop(key, None)
+        conn = self._connect()
+        conn.executemany('DELETE FROM analysis WHERE key = ?', rows)
+        conn.commit()
+
+    def reset(self, documents: List[Dict]):
+        """文档库完整扫描后清理已删除或已修改文档的结果"""
+        current = {document['file_path']: self._signature(document) for document in documents}
+        with self.lock:
+            try:
+                rows = self._connect().execute('SELECT key, path, signature FROM analysis').fetchall()
+                self._discard([(key,) for key, path, signature in rows if current.get(path) != signature])
+            except Exception as e:
+                logging.warning(f"清理分析缓存失败: {e}")
+
+    def get_state(self) -> Dict:
+        """写入快照时旧结果已清理完毕，不需要额外状态"""
+        return {}
+
+    def restore_state(self, state: Dict):
+        """从快照恢复时不需要全表清理，快照之后的变更会逐个通过update处理"""
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """文档变更后清理该路径下已过期的结果"""
+        keep = self._signature(document) if document is not None else None
+        with self.lock:
+            try:
+                rows = self._connect().execute(
+                    'SELECT key, signature FROM analysis WHERE path = ?', (relative_path,)
+                ).fetchall()
+                self._discard([(key,) for key, signature in rows if signature != keep])
+            except Exception as e:
+                logging.warning(f"清理分析缓存失败 {relative_path}: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取缓存状态"""
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'db_path': self.db_path
+        }
+
+# 进程内共享的缓存实例，按文档库路径区分
+_caches: Dict[Tuple[str, str], AnalysisCache] = {}
+_caches_lock = threading.Lock()
+
+def get_analysis_cache(vault_path: str, cache_dir: str = './cache') -> AnalysisCache:
+    """获取文档库对应的分析结果缓存"""
+    key = (os.path.abspath(vault_path), os.path.abspath(cache_dir))
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = AnalysisCache(vault_path, cache_dir)
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,469 @@
+"""
+外部分析服务客户端 - 连接池复用、失败重试、熔断、批量请求和延迟统计
+
+HTTP服务接口（ANALYSIS_SERVICE_URL为 http(s)://...）：
+- POST {url}/analyze        请求体为单个文档，返回分析结果
+- POST {url}/analyze/batch  请求体为 {"documents": [...]}，返回 {"results": [...]}（顺序与请求一致）
+
+二进制协议（ANALYSIS_SERVICE_URL为 unix:///path/to/socket）见 analysis_protocol，
+内容未变化的文档只发送内容哈希。
+"""
+
+import os
+import time
+import queue
+import socket
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.analysis_protocol import (
+    MSG_ANALYZE, MSG_ERROR, MSG_HELLO, PROTOCOL_VERSION, ProtocolError,
+    available_codecs, content_id, encode_frame, read_frame
+)
+
+# 可以重试的HTTP状态码（服务暂时不可用）
+RETRY_STATUSES = (502, 503, 504)
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到threshold次后打开，cooldown秒内的请求直接失败；
+    冷却结束后放行一个试探请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """熔断器状态：closed / open / half_open"""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """是否允许发出请求"""
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """记录成功"""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        """记录失败"""
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+class AnalysisClient:
+    """外部分析服务客户端类
+
+    同一进程内的请求共享一个requests.Session（keep-alive连接池），
+    连接失败和502/503/504按指数退避重试，读取超时（服务已收到请求但没有响应）不重试；
+    单次调用的全部尝试和退避等待不超过deadline秒，使超时在工作进程被gunicorn杀掉之前
+    计入熔断。连续失败后熔断，调用方应回退到本地分析。
+    """
+
+    transport = 'http'
+
+    def __init__(self, base_url: str, timeout: float = 10, connect_timeout: float = 2,
+                 pool_size: int = 10, retries: int = 2, backoff: float = 0.2,
+                 batch_size: int = 16, concurrency: int = 4,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30, deadline: float = 20):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.batch_supported = True  # 服务端没有批量接口时改为逐个请求
+
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=1000)  # 最近请求的耗时（毫秒）
+        self.requests = 0
+        self.errors = 0
+        self.short_circuited = 0
+        self._setup_transport(pool_size, retries, backoff)
+
+    def _setup_transport(self, pool_size: int, retries: int, backoff: float):
+        """建立HTTP连接池（重试由_send控制，以便整体时限覆盖每次尝试）"""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+    def _allow(self) -> bool:
+        """熔断器是否放行请求"""
+        if self.breaker.allow():
+            return True
+        with self.lock:
+            self.short_circuited += 1
+        return False
+
+    def _record(self, start: float, success: bool, available: bool):
+        """记录一次请求的耗时和结果，available表示服务可用（用于熔断）"""
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(elapsed)
+            if not success:
+                self.errors += 1
+        if available:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    @staticmethod
+    def _payload(document: Dict) -> Dict:
+        """外部服务的请求数据"""
+        return {
+            'content': document.get('content', ''),
+            'metadata': document.get('metadata', {}),
+            'file_path': document.get('file_path', '')
+        }
+
+    def _remaining(self, deadline: float) -> float:
+        """距整体时限的剩余秒数（用作本次尝试的超时上限）"""
+        return max(deadline - time.monotonic(), 0.001)
+
+    def _retry_delay(self, attempt: int, deadline: float) -> Optional[float]:
+        """第attempt次重试前的退避时间，重试次数用完或会超过整体时限时返回None"""
+        delay = self.backoff * (2 ** attempt)
+        if attempt >= self.retries or time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _send(self, url: str, payload: Dict) -> Optional[requests.Response]:
+        """发送请求，连接失败和502/503/504在整体时限内重试，失败时返回None"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline)
+            timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            response = None
+            retryable = False
+            try:
+                response = self.session.post(url, json=payload, timeout=timeout)
+                retryable = response.status_code in RETRY_STATUSES
+            except requests.exceptions.ConnectionError as e:
+                # 连接失败（分析请求是幂等的，可以重发）
+                logging.warning(f"外部分析服务连接失败: {e}")
+                retryable = True
+            except requests.exceptions.RequestException as e:
+                # 读取超时说明服务卡住，重试只会让请求等待更久
+                logging.warning(f"外部分析服务调用失败: {e}")
+            delay = self._retry_delay(attempt, deadline) if retryable else None
+            if delay is None:
+                return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _post(self, path: str, payload: Dict) -> Optional[requests.Response]:
+        """发送请求并记录指标，熔断或失败时返回None"""
+        if not self._allow():
+            return None
+
+        start = time.perf_counter()
+        response = self._send(f'{self.base_url}{path}', payload)
+
+        status = response.status_code if response is not None else None
+        # 4xx说明服务可用，只是请求不被接受，不计入熔断
+        self._record(start, status == 200, status is not None and status < 500)
+        if status is not None and status != 200:
+            logging.warning(f"外部分析服务返回错误: {status}")
+        return response
+
+    def analyze(self, document: Dict) -> Optional[Dict]:
+        """分析单个文档，不可用时返回None"""
+        response = self._post('/analyze', self._payload(document))
+        if response is None or response.status_code != 200:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def _analyze_chunk(self, documents: List[Dict]) -> List[Optional[Dict]]:
+        """分析一批文档，服务端不支持批量接口时逐个请求"""
+        if self.batch_supported and len(documents) > 1:
+            response = self._post('/analyze/batch', {'documents': [self._payload(d) for d in documents]})
+            if response is not None and response.status_code in (404, 405):
+                self.batch_supported = False
+            elif response is None or response.status_code != 200:
+                return [None] * len(documents)
+            else:
+                try:
+                    results = response.json().get('results', [])
+                except (ValueError, AttributeError):
+                    results = []
+                if len(results) == len(documents):
+                    return results
+                return [None] * len(documents)
+        return [self.analyze(document) for document in documents]
+
+    def analyze_many(self, documents: List[Dict]) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        """按批并发分析文档，按完成顺序返回 (文档, 分析结果或None)"""
+        chunks = [documents[i:i + self.batch_size] for i in range(0, len(documents), self.batch_size)]
+        if not chunks:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as executor:
+            futures = {executor.submit(self._analyze_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logging.error(f"外部批量分析失败: {e}")
+                    results = [None] * len(chunk)
+                for document, result in zip(chunk, results):
+                    yield document, result
+
+    def get_metrics(self) -> Dict:
+        """获取请求指标"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            requests_count, errors, short_circuited = self.requests, self.errors, self.short_circuited
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            'base_url': self.base_url,
+            'transport': self.transport,
+            'requests': requests_count,
+            'errors': errors,
+            'short_circuited': short_circuited,
+            'circuit': self.breaker.state,
+            'batch_supported': self.batch_supported,
+            'latency_ms': {
+                'avg': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99)
+            }
+        }
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+class SocketAnalysisClient(AnalysisClient):
+    """二进制协议客户端类（Unix域套接字）
+
+    复用长连接，批量发送文档；服务端已确认持有的内容只发送哈希，
+    服务端返回missing（例如已淘汰该结果）时再附带内容重发。
+    """
+
+    transport = 'unix'
+
+    def __init__(self, base_url: str, *args, known_entries: int = 4096, **kwargs):
+        self.socket_path = base_url[len('unix://'):] if base_url.startswith('unix://') else base_url
+        self.known = OrderedDict()  # 服务端已持有的内容标识
+        self.known_entries = known_entries
+        self.bytes_sent = 0
+        self.content_skipped = 0  # 只发送哈希的文档数
+        super().__init__(base_url, *args, **kwargs)
+
+    def _setup_transport(self, pool_size: int, retries: int, backoff: float):
+        """建立空闲连接池（连接按需创建）"""
+        self.idle = queue.LifoQueue(maxsize=max(1, pool_size))
+
+    def _connect(self, deadline: float) -> Tuple[socket.socket, int]:
+        """建立连接并协商编码，返回 (连接, 编码)"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(min(self.timeout[0], self._remaining(deadline)))
+            sock.connect(self.socket_path)
+            sock.settimeout(min(self.timeout[1], self._remaining(deadline)))
+            sock.sendall(encode_frame(MSG_HELLO, {'version': PROTOCOL_VERSION, 'codecs': available_codecs()}))
+            msg_type, _, payload = read_frame(sock)
+            if msg_type != MSG_HELLO:
+                raise ProtocolError(f"握手失败: {payload.get('error') if isinstance(payload, dict) else payload}")
+            return sock, payload.get('codec', 0)
+        except Exception:
+            sock.close()
+            raise
+
+    def _exchange(self, items: List[Dict], deadline: float) -> Dict[str, Dict]:
+        """发送一次ANALYZE请求，返回 标识 -> 结果
+
+        连接异常（包括空闲连接已被服务端关闭）时在整体时限内换新连接重试，
+        请求发出后读取超时不重试。
+        """
+        attempt = 0
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            sent = False
+            try:
+                if conn is None:
+                    conn = self._connect(deadline)
+                sock, codec = conn
+                sock.settimeout(min(self.timeout[1], self._remaining(deadline)))
+                frame = encode_frame(MSG_ANALYZE, {'items': items}, codec)
+                sock.sendall(frame)
+                sent = True
+                msg_type, _, payload = read_frame(sock)
+            except (OSError, EOFError, ProtocolError, ValueError) as e:
+                if conn is not None:
+                    conn[0].close()
+                delay = None if sent and isinstance(e, socket.timeout) else self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                logging.warning(f"外部分析服务连接失败，重试 ({attempt}/{self.retries}): {e}")
+                continue
+
+            with self.lock:
+                self.bytes_sent += len(frame)
+            if msg_type == MSG_ERROR:
+                sock.close()
+                raise ProtocolError(payload.get('error') if isinstance(payload, dict) else str(payload))
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                sock.close()
+            return {result.get('id'): result for result in payload.get('results', [])}
+
+    def _remember(self, item_id: str):
+        """记录服务端已持有的内容"""
+        with self.lock:
+            self.known[item_id] = True
+            self.known.move_to_end(item_id)
+            while len(self.known) > self.known_entries:
+                self.known.popitem(last=False)
+
+    def _item(self, item_id: str, document: Dict, with_content: bool) -> Dict:
+        """请求条目"""
+        item = {'id': item_id, 'file_path': document.get('file_path', '')}
+        if with_content:
+            item['content'] = document.get('content', '')
+        return item
+
+    def _analyze_chunk(self, documents: List[Dict]) -> List[Optional[Dict]]:
+        """分析一批文档，相同内容只发送一次"""
+        if not self._allow():
+            return [None] * len(documents)
+
+        ids = [content_id(document.get('content', '')) for document in documents]
+        unique = dict(zip(ids, documents))  # 标识 -> 文档
+        with self.lock:
+            known = {item_id for item_id in unique if item_id in self.known}
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.deadline
+        try:
+            results = self._exchange([self._item(i, d, i not in known) for i, d in unique.items()], deadline)
+            missing = [i for i in unique if results.get(i, {}).get('status') == 'missing']
+            if missing:
+                with self.lock:
+                    for item_id in missing:
+                        self.known.pop(item_id, None)
+                results.update(self._exchange([self._item(i, unique[i], True) for i in missing], deadline))
+        except Exception as e:
+            logging.warning(f"外部分析服务调用失败: {e}")
+            self._record(start, False, False)
+            return [None] * len(documents)
+
+        analyses = {}
+        for item_id in unique:
+            result = results.get(item_id, {})
+            if result.get('status') == 'ok':
+                self._remember(item_id)
+                analyses[item_id] = result.get('data')
+            else:
+                logging.warning(f"外部分析服务分析失败 {unique[item_id].get('file_path')}: "
+                                f"{result.get('error', '无结果')}")
+        self._record(start, len(analyses) == len(unique), True)
+        with self.lock:
+            self.content_skipped += len(known.difference(missing))
+        return [analyses.get(item_id) for item_id in ids]
+
+    def analyze(self, document: Dict) -> Optional[Dict]:
+        """分析单个文档，不可用时返回None"""
+        return self._analyze_chunk([document])[0]
+
+    def get_metrics(self) -> Dict:
+        """获取请求指标（含发送字节数和去重命中数）"""
+        metrics = super().get_metrics()
+        metrics['bytes_sent'] = self.bytes_sent
+        metrics['content_skipped'] = self.content_skipped
+        return metrics
+
+    def close(self):
+        """关闭空闲连接"""
+        while True:
+            try:
+                sock, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            sock.close()
+
+# 进程内共享的客户端，按服务配置区分
+_clients: Dict[Tuple, AnalysisClient] = {}
+_clients_lock = threading.Lock()
+
+def get_analysis_client(config) -> Optional[AnalysisClient]:
+    """按Flask配置获取外部分析服务客户端，未配置服务时返回None"""
+    base_url = config.get('ANALYSIS_SERVICE_URL')
+    if not base_url:
+        return None
+    options = (
+        base_url,
+        config.get('ANALYSIS_SERVICE_TIMEOUT', 10),
+        config.get('ANALYSIS_SERVICE_CONNECT_TIMEOUT', 2),
+        config.get('ANALYSIS_SERVICE_POOL_SIZE', 10),
+        config.get('ANALYSIS_SERVICE_RETRIES', 2),
+        config.get('ANALYSIS_SERVICE_BACKOFF', 0.2),
+        config.get('ANALYSIS_SERVICE_BATCH_SIZE', 16),
+        config.get('ANALYSIS_SERVICE_CONCURRENCY', 4),
+        config.get('ANALYSIS_SERVICE_BREAKER_THRESHOLD', 5),
+        config.get('ANALYSIS_SERVICE_BREAKER_COOLDOWN', 30),
+        config.get('ANALYSIS_SERVICE_DEADLINE', 20)
+    )
+    with _clients_lock:
+        client = _clients.get(options)
+        if client is None:
+            client_class = SocketAnalysisClient if base_url.startswith('unix://') else AnalysisClient
+            client = client_class(*options)
+            _clients[options] = client
+        return client
+
+def _reset_after_fork():
+    """fork出的子进程不能复用父进程的连接"""
+    _clients.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
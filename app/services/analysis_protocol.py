@@ -0,0 +1,179 @@
+"""
+分析服务二进制协议 - 基于Unix域套接字的长度前缀帧协议，供C/Rust等原生分析服务实现
+
+帧格式（网络字节序）：
+    magic(4字节 b'OBAN') | version(1) | type(1) | codec(1) | length(4) | payload(length字节)
+
+payload按codec编码：0为紧凑JSON（UTF-8），1为msgpack（双方都支持时使用）。
+
+消息类型：
+- HELLO    客户端 -> {"version", "codecs": [...]}；服务端 -> {"version", "codec", "max_frame"}
+           连接建立后首先交换，服务端选定之后该连接使用的codec
+- ANALYZE  客户端 -> {"items": [{"id", "content"?, "file_path"?}]}
+           服务端 -> {"results": [{"id", "status": "ok" | "missing" | "error", "data"? , "error"?}]}
+           id为文档内容的sha256，服务端已有该内容的结果时客户端只发送id；
+           服务端没有时返回missing，客户端再附带content重发
+- ERROR    服务端 -> {"error"}，请求无法处理（版本不符、帧格式错误等）
+"""
+
+import os
+import json
+import struct
+import hashlib
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import msgpack
+except ImportError:  # msgpack为可选依赖，未安装时使用JSON
+    msgpack = None
+
+MAGIC = b'OBAN'
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct('!4sBBBI')
+MAX_FRAME = 64 * 1024 * 1024
+
+# 消息类型
+MSG_HELLO = 1
+MSG_ANALYZE = 2
+MSG_ERROR = 3
+
+# payload编码
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+class ProtocolError(Exception):
+    """协议错误（帧格式、版本或编码不符）"""
+
+def available_codecs() -> List[int]:
+    """本地支持的编码，按优先级排列"""
+    return [CODEC_MSGPACK, CODEC_JSON] if msgpack is not None else [CODEC_JSON]
+
+def content_id(content: str) -> str:
+    """文档内容标识，用于服务端去重"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def encode_frame(msg_type: int, payload: Any, codec: int = CODEC_JSON) -> bytes:
+    """编码一帧"""
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ProtocolError('未安装msgpack')
+        body = msgpack.packb(payload, use_bin_type=True)
+    elif codec == CODEC_JSON:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    else:
+        raise ProtocolError(f'不支持的编码: {codec}')
+    if len(body) > MAX_FRAME:
+        raise ProtocolError(f'帧过大: {len(body)} 字节')
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, msg_type, codec, len(body)) + body
+
+def _recv_exact(sock, size: int) -> bytes:
+    """读取指定字节数，连接关闭时抛出EOFError"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1024 * 1024))
+        if not chunk:
+            raise EOFError('连接已关闭')
+        buffer += chunk
+    return bytes(buffer)
+
+def read_frame(sock) -> Tuple[int, int, Any]:
+    """读取一帧，返回 (消息类型, 编码, payload)"""
+    magic, version, msg_type, codec, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ProtocolError('无效的帧头')
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f'不支持的协议版本: {version}')
+    if length > MAX_FRAME:
+        raise ProtocolError(f'帧过大: {length} 字节')
+    body = _recv_exact(sock, length)
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ProtocolError('未安装msgpack')
+        payload = msgpack.unpackb(body, raw=False)
+    elif codec == CODEC_JSON:
+        payload = json.loads(body.decode('utf-8'))
+    else:
+        raise ProtocolError(f'不支持的编码: {codec}')
+    return msg_type, codec, payload
+
+class _ProtocolHandler(socketserver.BaseRequestHandler):
+    """处理一个客户端连接上的所有请求"""
+
+    def handle(self):
+        server = self.server
+        codec = CODEC_JSON
+        while True:
+            try:
+                msg_type, _, payload = read_frame(self.request)
+            except EOFError:
+                return
+            except (ProtocolError, ValueError, struct.error) as e:
+                self.request.sendall(encode_frame(MSG_ERROR, {'error': str(e)}))
+                return
+
+            if msg_type == MSG_HELLO:
+                codecs = payload.get('codecs', [CODEC_JSON]) if isinstance(payload, dict) else [CODEC_JSON]
+                codec = next((c for c in available_codecs() if c in codecs), CODEC_JSON)
+                response = (MSG_HELLO, {'version': PROTOCOL_VERSION, 'codec': codec, 'max_frame': MAX_FRAME})
+            elif msg_type == MSG_ANALYZE and isinstance(payload, dict):
+                try:
+                    response = (MSG_ANALYZE, {'results': server.analyze_items(payload.get('items', []))})
+                except Exception as e:
+                    response = (MSG_ERROR, {'error': str(e)})
+            else:
+                response = (MSG_ERROR, {'error': f'不支持的消息类型: {msg_type}'})
+            self.request.sendall(encode_frame(response[0], response[1], codec))
+
+class AnalysisProtocolServer(socketserver.ThreadingUnixStreamServer):
+    """协议参考实现（本地测试用）
+
+    analyze为分析函数（content -> 分析结果），按内容标识缓存最近的结果，
+    客户端只发送标识时直接返回缓存结果。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, analyze: Callable[[str], Dict], cache_entries: int = 4096):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.analyze = analyze
+        self.cache_entries = cache_entries
+        self.results = OrderedDict()  # 内容标识 -> 分析结果
+        self.lock = threading.Lock()
+        super().__init__(socket_path, _ProtocolHandler)
+
+    def analyze_items(self, items: List[Dict]) -> List[Dict]:
+        """分析一批文档"""
+        results = []
+        for item in items:
+            item_id = item.get('id')
+            content = item.get('content')
+            with self.lock:
+                data = self.results.get(item_id)
+                if data is not None:
+                    self.results.move_to_end(item_id)
+            if data is None and content is None:
+                results.append({'id': item_id, 'status': 'missing'})
+                continue
+            if data is None:
+                try:
+                    data = self.analyze(content)
+                except Exception as e:
+                    logging.error(f"分析失败 {item.get('file_path')}: {e}")
+                    results.append({'id': item_id, 'status': 'error', 'error': str(e)})
+                    continue
+                with self.lock:
+                    self.results[content_id(content)] = data
+                    while len(self.results) > self.cache_entries:
+                        self.results.popitem(last=False)
+            results.append({'id': item_id, 'status': 'ok', 'data': data})
+        return results
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
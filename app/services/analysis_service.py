@@ -3,13 +3,22 @@
 后期可以替换为C/Rust实现的高性能分析服务
 """
 
+import os
 import re
+import logging
 import jieba
 import nltk
 import textstat
+import threading
+import multiprocessing
 from collections import Counter
-from typing import Dict, List, Optional
-from flask import current_app
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+from app.services.global_stats import classify_document_type
+from app.services.analysis_cache import get_analysis_cache
+
+# 批量分析默认使用的子进程数：每个gunicorn工作进程各有一个进程池，按CPU核数创建会成倍超额
+DEFAULT_ANALYSIS_WORKERS = 2
 
 # 初始化NLTK数据，如果下载失败则使用降级方案
 nltk_available = True
@@ -18,10 +27,22 @@ try:
     nltk.data.find('corpora/stopwords')
     stop_words = set(nltk.corpus.stopwords.words('english'))
 except (LookupError, Exception) as e:
-    current_app.logger.warning(f"NLTK数据不可用，使用降级方案: {e}")
+    logging.warning(f"NLTK数据不可用，使用降级方案: {e}")
     nltk_available = False
     stop_words = set()
 
+class TokenizedText:
+    """一次切分得到的文本结构，供各项分析共享"""
+    
+    __slots__ = ('content', 'sentences', 'tokens', 'words', 'lines')
+    
+    def __init__(self, content: str, sentences: List[str], tokens: List[str]):
+        self.content = content
+        self.sentences = sentences  # 句子
+        self.tokens = tokens  # jieba分词结果
+        self.words = content.split()  # 按空白切分的词，用于字数统计
+        self.lines = content.split('\n')
+
 class AnalysisService:
     """文档分析服务类"""
     
@@ -30,81 +51,135 @@ class AnalysisService:
         # 添加中文停用词
         self.stop_words.update(['的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这'])
     
+    def _get_cache(self):
+        """获取分析结果缓存，未启用时返回None"""
+        try:
+            from app.services.config_service import ConfigService
+            config_service = ConfigService()
+            if not config_service.get('analysis_cache', True):
+                return None
+            return get_analysis_cache(
+                config_service.get('obsidian_vault_path', './docs'),
+                config_service.get('cache_dir', './cache')
+            )
+        except Exception as e:
+            logging.warning(f"分析缓存不可用: {e}")
+            return None
+    
     def analyze_document(self, document: Dict) -> Dict:
-        """分析单个文档"""
+        """分析单个文档（内容未变化时直接返回缓存的结果）"""
         content = document.get('content', '')
         
-        analysis = {
-            'basic_stats': self._get_basic_stats(content),
-            'readability': self._analyze_readability(content),
-            'keywords': self._extract_keywords(content),
-            'sentiment': self._analyze_sentiment(content),
-            'topics': self._extract_topics(content),
-            'summary': self._generate_summary(content),
-            'structure': self._analyze_structure(content)
-        }
+        cache = self._get_cache()
+        key = None
+        if cache is not None:
+            key = cache.make_key(content)
+            analysis = cache.get(key)
+            if analysis is not None:
+                return analysis
+        
+        analysis = self.analyze_content(content)
         
+        if cache is not None:
+            cache.put(key, document, analysis)
         return analysis
     
-    def get_global_statistics(self) -> Dict:
-        """获取全局统计信息"""
-        from app.services.document_service import DocumentService
+    def analyze_batch(self, documents: Iterable[Dict], workers: int = DEFAULT_ANALYSIS_WORKERS,
+                      client=None) -> Iterator[Dict]:
+        """批量分析文档，按完成顺序逐个返回结果
         
-        doc_service = DocumentService()
-        documents = doc_service.get_all_documents()
+        缓存命中的文档直接返回，其余文档交给进程池分析（workers为0时使用CPU核数，
+        进程数不超过CPU核数，只有1个时在当前线程顺序分析）。
+        进程池中同时排队的文档数有上限，文档可以按需读取正文。
+        提供外部分析服务客户端（AnalysisClient）时，未命中缓存的文档先交给外部服务，
+        外部服务失败或熔断的文档再在本地分析。
+        每条结果为 {'path', 'success', 'data', 'source'} 或 {'path', 'success', 'error'}。
+        """
+        cache = self._get_cache()
+        if client is not None:
+            pending = []
+            for document in documents:
+                if cache is not None:
+                    analysis = cache.get(cache.make_key(document.get('content', '')))
+                    if analysis is not None:
+                        yield {'path': document.get('file_path'), 'success': True, 'data': analysis, 'source': 'cache'}
+                        continue
+                pending.append(document)
+            documents = []
+            for document, analysis in client.analyze_many(pending):
+                if analysis is None:
+                    documents.append(document)
+                else:
+                    yield {'path': document.get('file_path'), 'success': True, 'data': analysis, 'source': 'external_service'}
+            # 剩余文档已查过缓存
+            cache_checked = True
+        else:
+            cache_checked = False
+        workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1)
+        executor = _get_executor(workers) if workers > 1 else None
+        in_flight = {}  # future -> (document, key)
         
-        # 基础统计
-        total_docs = len(documents)
-        total_words = sum(doc.get('word_count', 0) for doc in documents)
-        total_size = sum(doc.get('size', 0) for doc in documents)
+        def finish(future):
+            document, key = in_flight.pop(future)
+            try:
+                analysis = future.result()
+            except Exception as e:
+                logging.error(f"批量分析失败 {document.get('file_path')}: {e}")
+                return {'path': document.get('file_path'), 'success': False, 'error': str(e)}
+            if cache is not None:
+                cache.put(key, document, analysis)
+            return {'path': document.get('file_path'), 'success': True, 'data': analysis, 'source': 'local_service'}
         
-        # 计算平均可读性
-        readability_scores = []
-        for doc in documents:
-            content = doc.get('content', '')
-            if content:
-                try:
-                    readability = self._analyze_readability(content)
-                    if readability and 'flesch_reading_ease' in readability:
-                        readability_scores.append(readability['flesch_reading_ease'])
-                except Exception as e:
-                    current_app.logger.warning(f"计算文档可读性失败: {e}")
+        try:
+            for document in documents:
+                content = document.get('content', '')
+                key = None
+                if cache is not None:
+                    key = cache.make_key(content)
+                    analysis = None if cache_checked else cache.get(key)
+                    if analysis is not None:
+                        yield {'path': document.get('file_path'), 'success': True, 'data': analysis, 'source': 'cache'}
+                        continue
+                
+                if executor is None:
+                    analysis = self.analyze_content(content)
+                    if cache is not None:
+                        cache.put(key, document, analysis)
+                    yield {'path': document.get('file_path'), 'success': True, 'data': analysis, 'source': 'local_service'}
                     continue
-        
-        average_readability = round(sum(readability_scores) / len(readability_scores), 2) if readability_scores else 0
-        
-        # 标签统计
-        all_tags = []
-        for doc in documents:
-            all_tags.extend(doc.get('tags', []))
-        tag_counts = Counter(all_tags)
-        
-        # 按月份统计
-        monthly_stats = {}
-        for doc in documents:
-            modified_time = doc.get('modified_time', '')
-            if modified_time:
-                month = modified_time[:7]
-                monthly_stats[month] = monthly_stats.get(month, 0) + 1
-        
-        # 文档类型统计
-        doc_types = self._analyze_document_types(documents)
+                
+                in_flight[executor.submit(_analyze_content, content)] = (document, key)
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield finish(future)
+            
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield finish(future)
+        finally:
+            # 客户端断开等提前结束时取消尚未开始的任务
+            for future in in_flight:
+                future.cancel()
+    
+    def analyze_content(self, content: str) -> Dict:
+        """分析文本内容（不使用缓存），只分词一次，各项分析共享分词结果"""
+        text = self._tokenize(content)
+        keywords = self._extract_keywords(text)
         
         return {
-            'total_documents': total_docs,
-            'total_words': total_words,
-            'total_size': total_size,
-            'average_words_per_doc': round(total_words / total_docs, 2) if total_docs > 0 else 0,
-            'average_readability': average_readability,
-            'top_tags': dict(tag_counts.most_common(10)),
-            'monthly_stats': monthly_stats,
-            'document_types': doc_types
+            'basic_stats': self._get_basic_stats(text),
+            'readability': self._analyze_readability(content),
+            'keywords': keywords,
+            'sentiment': self._analyze_sentiment(text),
+            'topics': self._extract_topics(text, keywords),
+            'summary': self._generate_summary(text),
+            'structure': self._analyze_structure(text)
         }
     
-    def _get_basic_stats(self, content: str) -> Dict:
-        """获取基础统计信息"""
-        words = content.split()
-        
+    def _tokenize(self, content: str) -> TokenizedText:
+        """对文本做一次完整切分"""
         # 使用NLTK或简单的句子分割
         if nltk_available:
             try:
@@ -114,13 +189,33 @@ class AnalysisService:
         else:
             sentences = self._simple_sentence_split(content)
         
-        paragraphs = [p for p in content.split('\n\n') if p.strip()]
+        try:
+            tokens = jieba.lcut(content)
+        except Exception as e:
+            logging.warning(f"分词失败: {str(e)}")
+            tokens = []
+        
+        return TokenizedText(content, sentences, tokens)
+    
+    def get_global_statistics(self) -> Dict:
+        """获取全局统计信息"""
+        from app.services.document_service import DocumentService
+        
+        # 统计数据作为文档索引的派生索引增量维护，这里只读取汇总结果
+        doc_service = DocumentService()
+        return doc_service.get_global_statistics()
+    
+    def _get_basic_stats(self, text: TokenizedText) -> Dict:
+        """获取基础统计信息"""
+        words = text.words
+        sentences = text.sentences
+        paragraphs = [p for p in text.content.split('\n\n') if p.strip()]
         
         return {
             'word_count': len(words),
             'sentence_count': len(sentences),
             'paragraph_count': len(paragraphs),
-            'character_count': len(content),
+            'character_count': len(text.content),
             'average_sentence_length': len(words) / len(sentences) if sentences else 0,
             'average_paragraph_length': len(words) / len(paragraphs) if paragraphs else 0
         }
@@ -146,18 +241,15 @@ class AnalysisService:
                 'dale_chall_readability_score': textstat.dale_chall_readability_score(content)
             }
         except Exception as e:
-            current_app.logger.warning(f"可读性分析失败: {str(e)}")
+            logging.warning(f"可读性分析失败: {str(e)}")
             return {}
     
-    def _extract_keywords(self, content: str, top_n: int = 10) -> List[Dict]:
+    def _extract_keywords(self, text: TokenizedText, top_n: int = 10) -> List[Dict]:
         """提取关键词"""
         try:
-            # 分词
-            words = jieba.cut(content)
-            
             # 过滤停用词和短词
             filtered_words = [
-                word for word in words 
+                word for word in text.tokens
                 if len(word) > 1 and word.lower() not in self.stop_words
             ]
             
@@ -175,20 +267,20 @@ class AnalysisService:
             
             return keywords
         except Exception as e:
-            current_app.logger.warning(f"关键词提取失败: {str(e)}")
+            logging.warning(f"关键词提取失败: {str(e)}")
             return []
     
-    def _analyze_sentiment(self, content: str) -> Dict:
+    def _analyze_sentiment(self, text: TokenizedText) -> Dict:
         """分析情感倾向（简化版）"""
         # 简单的情感词统计
         positive_words = ['好', '优秀', '棒', '喜欢', '爱', '开心', '快乐', '成功', '满意', '精彩']
         negative_words = ['坏', '糟糕', '讨厌', '恨', '难过', '痛苦', '失败', '失望', '无聊', '困难']
         
-        content_lower = content.lower()
+        content_lower = text.content.lower()
         positive_count = sum(content_lower.count(word) for word in positive_words)
         negative_count = sum(content_lower.count(word) for word in negative_words)
         
-        total_words = len(content.split())
+        total_words = len(text.words)
         positive_ratio = positive_count / total_words if total_words > 0 else 0
         negative_ratio = negative_count / total_words if total_words > 0 else 0
         
@@ -213,30 +305,23 @@ class AnalysisService:
         else:
             return '中性'
     
-    def _extract_topics(self, content: str) -> List[str]:
+    def _extract_topics(self, text: TokenizedText, keywords: List[Dict]) -> List[str]:
         """提取主题（简化版）"""
-        # 基于关键词和标题提取主题
-        keywords = self._extract_keywords(content, 5)
-        topics = [kw['word'] for kw in keywords]
+        # 基于出现次数最多的5个关键词提取主题（关键词按次数排序，与单独取前5个一致）
+        topics = [kw['word'] for kw in keywords[:5]]
         
         # 添加一些常见主题
         common_topics = ['技术', '学习', '工作', '生活', '思考', '笔记', '总结']
         for topic in common_topics:
-            if topic in content:
+            if topic in text.content:
                 topics.append(topic)
         
         return list(set(topics))[:5]  # 去重并限制数量
     
-    def _generate_summary(self, content: str, max_length: int = 200) -> str:
+    def _generate_summary(self, text: TokenizedText, max_length: int = 200) -> str:
         """生成文档摘要"""
         # 简单的摘要生成：选择前几句话
-        if nltk_available:
-            try:
-                sentences = nltk.sent_tokenize(content)
-            except:
-                sentences = self._simple_sentence_split(content)
-        else:
-            sentences = self._simple_sentence_split(content)
+        sentences = text.sentences
         
         if not sentences:
             return ""
@@ -251,9 +336,10 @@ class AnalysisService:
         
         return summary
     
-    def _analyze_structure(self, content: str) -> Dict:
+    def _analyze_structure(self, text: TokenizedText) -> Dict:
         """分析文档结构"""
-        lines = content.split('\n')
+        lines = text.lines
+        content = text.content
         
         # 统计标题层级
         headers = {
@@ -283,22 +369,43 @@ class AnalysisService:
         doc_types = {}
         
         for doc in documents:
-            # 基于标签和内容判断文档类型
-            tags = doc.get('tags', [])
-            content = doc.get('content', '')
-            
-            doc_type = '其他'
-            
-            # 根据标签判断类型
-            if any(tag in ['技术', '编程', '代码'] for tag in tags):
-                doc_type = '技术文档'
-            elif any(tag in ['学习', '笔记', '总结'] for tag in tags):
-                doc_type = '学习笔记'
-            elif any(tag in ['工作', '项目', '任务'] for tag in tags):
-                doc_type = '工作文档'
-            elif any(tag in ['生活', '日记', '随笔'] for tag in tags):
-                doc_type = '生活记录'
-            
+            # 基于标签判断文档类型
+            doc_type = classify_document_type(doc)
             doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
         
-        return doc_types 
\ No newline at end of file
+        return doc_types
+
+# 进程内共享的分析进程池，首次批量分析时创建
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """获取分析进程池（进程数变化时重新创建）"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # 使用spawn避免在含监控线程的进程中fork
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+def _reset_executor():
+    """fork出的子进程不能使用父进程的进程池"""
+    global _executor, _executor_workers
+    _executor = None
+    _executor_workers = 0
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+_worker_service = None
+
+def _analyze_content(content: str) -> Dict:
+    """进程池任务：在子进程中分析文本内容"""
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = AnalysisService()
+    return _worker_service.analyze_content(content)
@@ -0,0 +1,300 @@
+"""
+正文存储 - 把文档正文和渲染后的HTML追加写入单个blob文件，通过内存映射按偏移量读取
+
+多个工作进程映射同一个文件，数据只在系统页缓存中保存一份；
+文档缓存的正文也由它提供，进程内的文档记录不保存正文。
+读取返回映射区域上的memoryview，输出响应时不需要构造完整的Python字符串。
+"""
+
+import os
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，跨进程写锁退化为空操作
+    fcntl = None
+
+# 记录格式：头部（magic, 键sha256, 长度） | 数据
+BLOB_MAGIC = b'OBBL'
+BLOB_HEADER = struct.Struct('<4s32sQ')
+
+# 输出响应时每块的大小
+CHUNK_SIZE = 64 * 1024
+
+# 文件小于该大小时不压缩
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+def make_blob_key(*parts) -> bytes:
+    """根据版本信息生成blob键"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+def document_blob_key(kind: str, document: Dict, *extra) -> bytes:
+    """文档某个版本的blob键（kind为 'content' 或 'html'，extra为渲染配置等附加版本信息）"""
+    return make_blob_key(kind, document.get('file_path'), document.get('modified_time'),
+                         document.get('size'), *extra)
+
+def iter_chunks(view: memoryview, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """按块输出blob数据，同一时间只复制一块"""
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+class BlobStore:
+    """只追加的blob文件存储类
+
+    键为内容版本的哈希（同一版本只写入一次），索引为 键 -> (偏移量, 长度)，
+    打开时扫描记录头建立，其他进程追加的记录在查询未命中时增量扫描。
+    写入时持有文件锁，并截掉上次写入中断留下的不完整记录。
+    旧版本的数据在有效数据比例过低时由compact重写文件清除（见maybe_compact），
+    其他进程通过inode变化发现文件被重写后重新扫描。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = {}  # 键 -> (偏移量, 长度)
+        self.scanned = 0  # 已扫描到的文件位置
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        # 上次检查有效数据比例时的文件大小，记录在旁边的文件中，新启动的进程不必重新检查
+        self.checked_path = f'{path}.checked'
+        self.checked_bytes = self._read_checked()
+        self._inode = None
+        self._map = None
+        self._refresh()
+
+    def _mapping(self, end: int) -> Optional[mmap.mmap]:
+        """获取覆盖到end位置的只读映射，文件增长后重新映射
+
+        旧的映射不主动关闭，仍被响应引用的memoryview可以继续读取，释放引用后自动解除映射。
+        文件已被其他进程重写（inode变化）时返回None，由调用方重新扫描。
+        """
+        if self._map is None or len(self._map) < end:
+            try:
+                with open(self.path, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    size = stat.st_size
+                    if size < end or stat.st_ino != self._inode:
+                        return None
+                    self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return None
+        return self._map
+
+    def _refresh(self) -> int:
+        """扫描上次位置之后新追加的记录，返回有效数据的结束位置"""
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                stat = None
+            inode = stat.st_ino if stat else None
+            if inode != self._inode:
+                # 文件被删除或重建
+                self.index, self.scanned, self._map = {}, 0, None
+                self._inode = inode
+                self.checked_bytes = self._read_checked()
+            size = stat.st_size if stat else 0
+            if size <= self.scanned:
+                return size
+            mapping = self._mapping(size)
+            if mapping is None:
+                return self.scanned
+            position = self.scanned
+            while position + BLOB_HEADER.size <= size:
+                magic, key, length = BLOB_HEADER.unpack_from(mapping, position)
+                end = position + BLOB_HEADER.size + length
+                if magic != BLOB_MAGIC or end > size:
+                    break
+                self.index[key] = (position + BLOB_HEADER.size, length)
+                position = end
+            self.scanned = position
+            return position
+
+    def _view(self, key: bytes) -> Optional[memoryview]:
+        """按索引读取blob数据"""
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        mapping = self._mapping(offset + length)
+        if mapping is None:
+            return None
+        return memoryview(mapping)[offset:offset + length]
+
+    def get(self, key: bytes) -> Optional[memoryview]:
+        """获取blob数据（映射区域上的只读视图），未命中返回None"""
+        with self.lock:
+            view = self._view(key)
+            if view is None:
+                self._refresh()
+                view = self._view(key)
+            if view is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return view
+
+    @contextmanager
+    def _locked_file(self):
+        """以追加方式打开blob文件并持有文件锁，打开后文件被其他进程重写时重新打开"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        while True:
+            f = open(self.path, 'ab')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def put(self, key: bytes, data: bytes) -> Optional[memoryview]:
+        """追加写入blob数据（键已存在时不重复写入），返回写入后的视图"""
+        if not self.put_many([(key, data)]):
+            return None
+        return self.get(key)
+
+    def put_many(self, items: Iterable[Tuple[bytes, bytes]]) -> bool:
+        """在一次加锁中追加写入多条blob数据（键已存在时跳过），写入失败时返回False"""
+        with self.lock:
+            try:
+                with self._locked_file() as f:
+                    end = self._refresh()
+                    if os.fstat(f.fileno()).st_size > end:
+                        # 上次写入中断留下的不完整记录
+                        f.truncate(end)
+                    for key, data in items:
+                        if key in self.index:
+                            continue
+                        f.write(BLOB_HEADER.pack(BLOB_MAGIC, key, len(data)))
+                        f.write(data)
+                        self.index[key] = (end + BLOB_HEADER.size, len(data))
+                        end += BLOB_HEADER.size + len(data)
+                        self.writes += 1
+                    f.flush()
+                    self.scanned = end
+                return True
+            except Exception as e:
+                logging.error(f"写入正文存储失败: {e}")
+                return False
+
+    def _read_checked(self) -> int:
+        """读取上次检查时的文件大小"""
+        try:
+            with open(self.checked_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checked(self, size: int):
+        """记录本次检查时的文件大小"""
+        self.checked_bytes = size
+        try:
+            tmp_path = f'{self.checked_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(str(size))
+            os.replace(tmp_path, self.checked_path)
+        except OSError as e:
+            logging.warning(f"记录正文存储检查位置失败: {e}")
+
+    def maybe_compact(self, live_keys: Callable[[], Iterable[bytes]], min_live_ratio: float = 0.5) -> bool:
+        """文件比上次检查时增长一倍以上时统计有效数据比例，低于min_live_ratio时压缩
+
+        live_keys 返回当前仍需要的键，只在需要检查时调用。
+        """
+        with self.lock:
+            end = self._refresh()
+            if end < max(COMPACT_MIN_BYTES, 2 * self.checked_bytes):
+                return False
+            live = set(live_keys())
+            live_bytes = sum(BLOB_HEADER.size + self.index[key][1] for key in live if key in self.index)
+            if live_bytes >= end * min_live_ratio:
+                self._write_checked(end)
+                return False
+            self.compact(live)
+            return True
+
+    def compact(self, live_keys: Iterable[bytes]) -> int:
+        """只保留live_keys中的记录重写blob文件，返回释放的字节数
+
+        新文件写入临时文件后整体替换，正在使用旧映射的读取不受影响。
+        """
+        with self.lock:
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            try:
+                with self._locked_file():
+                    end = self._refresh()
+                    mapping = self._mapping(end) if end else None
+                    index = {}
+                    position = 0
+                    with open(tmp_path, 'wb') as out:
+                        for key in live_keys:
+                            entry = self.index.get(key)
+                            if entry is None or key in index or mapping is None:
+                                continue
+                            offset, length = entry
+                            out.write(BLOB_HEADER.pack(BLOB_MAGIC, key, length))
+                            out.write(mapping[offset:offset + length])
+                            index[key] = (position + BLOB_HEADER.size, length)
+                            position += BLOB_HEADER.size + length
+                    os.replace(tmp_path, self.path)
+                    self.index, self.scanned, self._map = index, position, None
+                    self._inode = os.stat(self.path).st_ino
+                    self._write_checked(position)
+                    self.compactions += 1
+            except Exception as e:
+                logging.error(f"压缩正文存储失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return 0
+        logging.info(f"已压缩正文存储: {end} -> {position} 字节, {len(index)} 条: {self.path}")
+        return end - position
+
+    def get_stats(self) -> Dict:
+        """获取存储状态"""
+        with self.lock:
+            return {
+                'entries': len(self.index),
+                'bytes': self.scanned,
+                'mapped_bytes': len(self._map) if self._map is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'compactions': self.compactions,
+                'path': self.path
+            }
+
+# 进程内共享的存储实例，按文档库路径区分
+_stores: Dict[Tuple[str, str], BlobStore] = {}
+_stores_lock = threading.Lock()
+
+def get_blob_store(vault_path: str, cache_dir: str = './cache') -> BlobStore:
+    """获取文档库对应的正文存储"""
+    vault_path = os.path.abspath(vault_path)
+    key = (vault_path, os.path.abspath(cache_dir))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            vault_hash = hashlib.sha1(vault_path.encode('utf-8')).hexdigest()[:12]
+            store = BlobStore(os.path.join(cache_dir, f'blobs-{vault_hash}.dat'))
+            _stores[key] = store
+        return store
@@ -8,6 +8,7 @@ import logging
 from pathlib import Path
 from typing import Dict, Any, Optional
 from flask import current_app
+from app.services.vault_walker import VaultWalker
 
 class ConfigService:
     """配置服务类"""
@@ -21,6 +22,24 @@ class ConfigService:
             'max_file_size': 10 * 1024 * 1024,  # 10MB
             'supported_extensions': ['.md', '.markdown'],
             'exclude_patterns': ['.git', '.obsidian', 'node_modules', '__pycache__'],
+            'cache_dir': './cache',  # 解析缓存目录
+            'document_cache': True,
+            'document_store': 'memory',  # memory: 每个进程保存完整文档（开启blob_store时正文从blob文件按需读取）; shared: 正文总是按需读取
+            'render_cache_max_bytes': 64 * 1024 * 1024,  # 渲染缓存内存上限
+            'render_cache_disk': True,  # 渲染结果是否同时写入cache_dir/html
+            'render_cache_disk_max_bytes': 256 * 1024 * 1024,  # cache_dir/html的大小上限，超出时删除最久未使用的结果
+            'blob_store': True,  # 文档正文和渲染后的HTML追加写入cache_dir/blobs-*.dat，通过内存映射按需读取，进程内不保存正文
+            'parallel_parse': False,  # 冷启动时使用多进程解析文档
+            'parse_workers': 0,  # 解析进程数，0表示CPU核数
+            'parallel_parse_threshold': 64,  # 待解析文件少于该数量时顺序解析
+            'watcher_poll_interval': 1,  # 非主监控进程读取变更事件的间隔（秒）
+            'monitor_backend': 'auto',  # 文档变更监控方式：auto、inotify 或 polling
+            'trust_dir_mtime': False,  # 轮询监控和无监控时的完整扫描跳过mtime未变化的目录（仅适合保存时重命名文件的编辑器）
+            'vault_snapshot': True,  # 索引后写入文档库快照（cache_dir/snapshot-*.pickle），冷启动时只重新加载有变化的文件
+            'snapshot_interval': 60,  # 增量更新后重新写入快照的最小间隔（秒）
+            'analysis_cache': True,  # 按内容哈希缓存文档分析结果（cache_dir/analysis-*.sqlite3）
+            'analysis_workers': 2,  # 每个工作进程批量分析的子进程数（不超过CPU核数），0表示CPU核数，1表示在请求线程中顺序分析
+            'job_workers': 2,  # 每个进程执行后台任务的线程数
             'theme': 'light',
             'language': 'zh-CN'
         }
@@ -77,14 +96,8 @@ class ConfigService:
                 return result
             
             # 检查是否包含Markdown文件
-            md_files = []
-            for root, dirs, files in os.walk(vault_path):
-                # 跳过隐藏目录
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
-                
-                for file in files:
-                    if file.endswith(('.md', '.markdown')):
-                        md_files.append(os.path.join(root, file))
+            walker = VaultWalker.from_config(vault_path, self)
+            md_files = [f.path for f in walker.walk(with_stat=False)]
             
             if not md_files:
                 result['message'] = f'在路径 {vault_path} 中未找到Markdown文件'
@@ -127,15 +140,10 @@ class ConfigService:
         
         if info['exists']:
             try:
-                md_files = []
-                for root, dirs, files in os.walk(vault_path):
-                    dirs[:] = [d for d in dirs if not d.startswith('.')]
-                    for file in files:
-                        if file.endswith(('.md', '.markdown')):
-                            md_files.append(os.path.join(root, file))
+                total_files = VaultWalker.from_config(vault_path, self).count()
                 
-                info['total_files'] = len(md_files)
-                info['last_scan'] = os.path.getmtime(vault_path) if md_files else None
+                info['total_files'] = total_files
+                info['last_scan'] = os.path.getmtime(vault_path) if total_files else None
                 
             except Exception as e:
                 logging.error(f"扫描文档库失败: {e}")
@@ -160,16 +168,7 @@ class ConfigService:
                 return result
             
             # 检查是否包含Markdown文件
-            md_count = 0
-            for root, dirs, files in os.walk(path):
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
-                for file in files:
-                    if file.endswith(('.md', '.markdown')):
-                        md_count += 1
-                        if md_count >= 10:  # 只检查前10个文件
-                            break
-                if md_count >= 10:
-                    break
+            md_count = VaultWalker.from_config(path, self).count(limit=10)  # 只检查前10个文件
             
             if md_count == 0:
                 result['message'] = '目录中未找到Markdown文件'
@@ -0,0 +1,341 @@
+"""
+文档缓存 - 按 (路径, mtime, size) 缓存解析后的文档，并持久化到SQLite
+
+SQLite文件同时作为多个工作进程共享的文档存储：
+同一时间只有持有索引锁的进程解析文档，其他进程直接读取其写入的结果。
+"""
+
+import os
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+from app.services.blob_store import get_blob_store, document_blob_key
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，跨进程锁退化为空操作
+    fcntl = None
+
+# 解析结果结构变化时递增，旧缓存会被整体丢弃
+CACHE_SCHEMA_VERSION = 5
+
+# 共享模式下SQLite映射到内存的最大字节数，各进程通过系统页缓存共享
+MMAP_SIZE = 256 * 1024 * 1024
+
+class DocumentRecord(dict):
+    """不含正文的文档记录（共享模式或正文存于blob文件时）
+
+    只在进程内保存元数据，正文content在访问时从blob文件或共享存储读取且不驻留内存。
+    """
+
+    def __init__(self, data: Dict, cache: 'DocumentCache'):
+        super().__init__(data)
+        self._cache = cache
+
+    def __missing__(self, key):
+        if key == 'content':
+            return self._cache.get_content(self['file_path'], self)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        """转换为包含正文的普通字典"""
+        return dict(self, content=self['content'])
+
+    def __reduce__(self):
+        return (dict, (self.to_dict(),))
+
+class DocumentCache:
+    """解析文档缓存类
+
+    内存中保存每个文件的解析结果，并写入SQLite文件，
+    使冷启动的工作进程可以直接复用上一次的解析结果。
+    shared为True或blob_content为True时进程内只保存元数据，正文按需读取：
+    blob_content为True时从正文存储（blob文件的内存映射）读取，否则从SQLite读取，
+    内存占用不随工作进程数增长。
+    全部条目在第一次完整扫描时才加载，在此之前按路径逐条读取。
+    """
+
+    def __init__(self, vault_path: str, cache_dir: str = './cache', shared: bool = False,
+                 blob_content: bool = False):
+        self.vault_path = os.path.abspath(vault_path)
+        self.cache_dir = cache_dir
+        self.shared = shared
+        self.content_store = get_blob_store(vault_path, cache_dir) if blob_content else None
+        self.lazy_content = shared or blob_content  # 进程内的文档记录是否不含正文
+        self.db_path = self._get_db_path()
+        self.entries = {}  # relative_path -> (mtime_ns, size, document)
+        self.pending = {}  # 待写入磁盘的条目
+        self.removed = set()  # 待从磁盘删除的条目
+        self.generation = None  # 已加载的磁盘数据版本，None表示尚未整体加载
+        self.lock = threading.RLock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _get_db_path(self) -> str:
+        """获取缓存数据库路径（每个文档库一个文件）"""
+        vault_hash = hashlib.sha1(self.vault_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f'documents-{vault_hash}.sqlite3')
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接（fork后重新建立连接）"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            # WAL模式下读写互不阻塞，适合多个工作进程同时访问
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            self._ensure_schema(self._conn)
+        return self._conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        """创建表结构，版本不一致时重建"""
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is None or row[0] != str(CACHE_SCHEMA_VERSION):
+            conn.execute('DROP TABLE IF EXISTS documents')
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(CACHE_SCHEMA_VERSION),)
+            )
+            conn.execute("DELETE FROM meta WHERE key = 'generation'")
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, data BLOB, content TEXT)'
+        )
+        conn.commit()
+
+    def _read_generation(self, conn: sqlite3.Connection) -> int:
+        """读取磁盘数据版本，每次写入后递增"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def refresh(self):
+        """磁盘数据被其他进程更新后重新加载"""
+        try:
+            with self.lock:
+                conn = self._connect()
+                generation = self._read_generation(conn)
+                if generation == self.generation:
+                    return
+                self._load(conn)
+                self.generation = generation
+        except Exception as e:
+            logging.warning(f"加载文档缓存失败，将重新解析: {e}")
+
+    def _document(self, data: bytes, content: Optional[str]) -> Dict:
+        """把数据库中的一行转换为文档（正文按需读取时为不含正文的记录）"""
+        document = pickle.loads(data)
+        if self.lazy_content:
+            return DocumentRecord(document, self)
+        document['content'] = content
+        return document
+
+    def _load(self, conn: sqlite3.Connection):
+        """从磁盘加载全部缓存条目（正文按需读取时不加载正文）"""
+        entries = {}
+        if self.lazy_content:
+            rows = conn.execute('SELECT path, mtime_ns, size, data, NULL FROM documents')
+        else:
+            rows = conn.execute('SELECT path, mtime_ns, size, data, content FROM documents')
+        for path, mtime_ns, size, data, content in rows:
+            try:
+                entries[path] = (mtime_ns, size, self._document(data, content))
+            except Exception:
+                continue
+        entries.update((path, self.entries[path]) for path in self.pending)
+        self.entries = entries
+        logging.info(f"已加载文档缓存 {len(self.entries)} 条: {self.db_path}")
+
+    def _read_entry(self, relative_path: str) -> Optional[Tuple]:
+        """尚未整体加载时从磁盘读取单个条目"""
+        try:
+            with self.lock:
+                row = self._connect().execute(
+                    'SELECT mtime_ns, size, data, content FROM documents WHERE path = ?', (relative_path,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (row[0], row[1], self._document(row[2], None if self.lazy_content else row[3]))
+                self.entries.setdefault(relative_path, entry)
+                return self.entries[relative_path]
+        except Exception as e:
+            logging.warning(f"读取文档缓存失败 {relative_path}: {e}")
+            return None
+
+    @contextmanager
+    def indexer_lock(self, refresh: bool = True):
+        """跨进程索引锁，保证同一时间只有一个进程扫描和解析文档库
+
+        获得锁后先加载其他进程已写入的结果，避免重复解析；
+        refresh为False时不整体加载，之后的查询逐条读取磁盘。
+        """
+        lock_file = None
+        if fcntl is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            lock_file = open(f'{self.db_path}.lock', 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if refresh:
+                self.refresh()
+            yield self
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def get(self, relative_path: str, mtime_ns: int, size: int) -> Optional[Dict]:
+        """获取缓存的文档，文件已变更时返回None"""
+        entry = self.entries.get(relative_path)
+        if entry is None and self.generation is None:
+            entry = self._read_entry(relative_path)
+        if entry and entry[0] == mtime_ns and entry[1] == size:
+            return entry[2]
+        return None
+
+    def get_content(self, relative_path: str, document: Optional[Dict] = None) -> str:
+        """读取文档正文
+
+        给出document（不含正文的记录）时优先从正文存储读取该版本的正文，
+        未命中时从SQLite读取并补写到正文存储（blob文件被删除或压缩后）。
+        """
+        key = None
+        if self.content_store is not None and document is not None:
+            key = document_blob_key('content', document)
+            view = self.content_store.get(key)
+            if view is not None:
+                return str(view, 'utf-8')
+        with self.lock:
+            pending = self.pending.get(relative_path)
+            if pending:
+                return pending[2].get('content', '')
+            try:
+                row = self._connect().execute(
+                    'SELECT content FROM documents WHERE path = ?', (relative_path,)
+                ).fetchone()
+            except Exception as e:
+                logging.error(f"读取文档正文失败 {relative_path}: {e}")
+                return ''
+        content = row[0] if row and row[0] is not None else ''
+        if key is not None and row:
+            self.content_store.put_many([(key, content.encode('utf-8'))])
+        return content
+
+    def put(self, relative_path: str, mtime_ns: int, size: int, document: Dict) -> Dict:
+        """写入缓存（调用flush后持久化）
+
+        返回调用方应保留的文档：正文按需读取时为不含正文的记录，
+        flush之前它的正文从待写入的条目中读取。
+        """
+        with self.lock:
+            stored = document
+            if self.lazy_content:
+                stored = DocumentRecord({key: value for key, value in document.items() if key != 'content'}, self)
+            self.entries[relative_path] = (mtime_ns, size, stored)
+            self.pending[relative_path] = (mtime_ns, size, document)
+            self.removed.discard(relative_path)
+            return stored
+
+    def remove(self, relative_path: str):
+        """移除缓存条目"""
+        with self.lock:
+            if self.entries.pop(relative_path, None) is not None:
+                self.removed.add(relative_path)
+            self.pending.pop(relative_path, None)
+
+    def prune(self, existing_paths: Iterable[str]):
+        """移除已不存在的文件"""
+        existing = set(existing_paths)
+        with self.lock:
+            for relative_path in [p for p in self.entries if p not in existing]:
+                self.remove(relative_path)
+
+    def flush(self):
+        """将待写入的变更持久化到磁盘"""
+        with self.lock:
+            if not self.pending and not self.removed:
+                return
+            pending, removed = self.pending, self.removed
+            self.pending, self.removed = {}, set()
+            try:
+                conn = self._connect()
+                rows = []
+                blobs = []
+                for path, (mtime_ns, size, document) in pending.items():
+                    data = {key: value for key, value in document.items() if key != 'content'}
+                    content = document.get('content', '')
+                    rows.append((
+                        path, mtime_ns, size,
+                        pickle.dumps(data, pickle.HIGHEST_PROTOCOL),
+                        content
+                    ))
+                    if self.content_store is not None:
+                        blobs.append((document_blob_key('content', data), content.encode('utf-8')))
+                if blobs:
+                    self.content_store.put_many(blobs)
+                conn.executemany(
+                    'INSERT OR REPLACE INTO documents (path, mtime_ns, size, data, content) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+                conn.executemany('DELETE FROM documents WHERE path = ?', [(p,) for p in removed])
+                generation = self._read_generation(conn) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                    (str(generation),)
+                )
+                conn.commit()
+                if self.generation is not None:
+                    self.generation = generation
+            except Exception as e:
+                logging.error(f"写入文档缓存失败: {e}")
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
+            self.removed.clear()
+            try:
+                conn = self._connect()
+                conn.execute('DELETE FROM documents')
+                conn.commit()
+            except Exception as e:
+                logging.error(f"清空文档缓存失败: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取缓存状态"""
+        return {
+            'entries': len(self.entries),
+            'pending': len(self.pending),
+            'shared': self.shared,
+            'blob_content': self.content_store is not None,
+            'generation': self.generation,
+            'db_path': self.db_path
+        }
+
+# 进程内共享的缓存实例，按文档库路径区分
+_caches: Dict[Tuple[str, str, bool, bool], DocumentCache] = {}
+_caches_lock = threading.Lock()
+
+def get_document_cache(vault_path: str, cache_dir: str = './cache', shared: bool = False,
+                       blob_content: bool = False) -> DocumentCache:
+    """获取文档库对应的缓存实例"""
+    key = (os.path.abspath(vault_path), os.path.abspath(cache_dir), shared, blob_content)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = DocumentCache(vault_path, cache_dir, shared, blob_content)
+            _caches[key] = cache
+        return cache
@@ -4,18 +4,73 @@
 
 import os
 import re
+import json
+import math
+import base64
+import bisect
+import time
+import logging
+import multiprocessing
 import frontmatter
 import markdown
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from flask import current_app
+from app.services.document_cache import get_document_cache, DocumentRecord
+from app.services.vault_index import get_vault_index, SORT_FIELDS, sort_value
+from app.services.search_index import get_search_index
+from app.services.render_cache import get_render_cache
+from app.services.vault_walker import get_vault_walker
+from app.services.global_stats import get_global_statistics
+from app.services.analysis_cache import get_analysis_cache
+from app.services.link_graph import get_link_graph, extract_wikilinks
+from app.services.facet_index import get_facet_index
+from app.services.vault_snapshot import get_vault_snapshot, gc_paused
+from app.services.blob_store import get_blob_store, document_blob_key
+
+# 列表接口可返回的字段，正文字段需显式请求
+METADATA_FIELDS = [
+    'file_path', 'title', 'tags', 'metadata', 'links', 'wikilinks', 'embeds', 'images',
+    'created_time', 'modified_time', 'size', 'word_count', 'line_count', 'excerpt'
+]
+BODY_FIELDS = ['content', 'html_content']
+MAX_PAGE_SIZE = 1000
+
+# 列表页面显示的正文摘要长度，摘要在解析时保存在元数据中，渲染列表时不读取正文
+EXCERPT_LENGTH = 200
+
+# Markdown渲染配置，修改后处理逻辑时递增RENDERER_VERSION使渲染缓存失效
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'toc', 'codehilite', 'nl2br', 'sane_lists']
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {
+        'css_class': 'highlight',
+        'use_pygments': True,
+        'noclasses': True,
+        'linenums': False
+    }
+}
+RENDERER_VERSION = 1
+RENDER_FINGERPRINT = json.dumps(
+    [RENDERER_VERSION, MARKDOWN_EXTENSIONS, MARKDOWN_EXTENSION_CONFIGS], sort_keys=True
+)
+
+def _timestamp(iso_time: Optional[str]) -> Optional[float]:
+    """把文档的ISO格式时间转换为时间戳，无法解析时返回None"""
+    try:
+        return datetime.fromisoformat(iso_time).timestamp() if iso_time else None
+    except (TypeError, ValueError):
+        return None
 
 class DocumentService:
-    """文档服务类"""
+    """文档服务类
+    
+    路由每个请求创建一个实例：同一实例只同步一次文档索引，ETag校验和随后的查询使用同一版本。
+    """
     
     def __init__(self):
+        self._synced_index = None
         self._update_vault_path()
-        self.md_extensions = ['.md', '.markdown']
         
     def _update_vault_path(self):
         """更新文档库路径"""
@@ -23,85 +78,497 @@ class DocumentService:
             from app.services.config_service import ConfigService
             config_service = ConfigService()
             self.vault_path = config_service.get('obsidian_vault_path', './docs')
+            self.cache_dir = config_service.get('cache_dir', './cache')
+            self.cache_enabled = config_service.get('document_cache', True)
+            self.document_store = config_service.get('document_store', 'memory')
+            self.render_cache_max_bytes = config_service.get('render_cache_max_bytes', 64 * 1024 * 1024)
+            self.render_cache_disk = config_service.get('render_cache_disk', True)
+            self.render_cache_disk_max_bytes = config_service.get('render_cache_disk_max_bytes', 256 * 1024 * 1024)
+            self.blob_store_enabled = config_service.get('blob_store', True)
+            self.parallel_parse = config_service.get('parallel_parse', False)
+            self.parse_workers = config_service.get('parse_workers', 0)
+            self.parallel_parse_threshold = config_service.get('parallel_parse_threshold', 64)
+            self.analysis_cache_enabled = config_service.get('analysis_cache', True)
+            self.snapshot_enabled = config_service.get('vault_snapshot', True)
+            self.snapshot_interval = config_service.get('snapshot_interval', 60)
+            self.walker = get_vault_walker(self.vault_path, config_service)
         except Exception as e:
             current_app.logger.warning(f"无法从ConfigService读取配置，使用默认路径: {e}")
             self.vault_path = current_app.config.get('OBSIDIAN_VAULT_PATH', './docs')
+            self.cache_dir = './cache'
+            self.cache_enabled = True
+            self.document_store = 'memory'
+            self.render_cache_max_bytes = 64 * 1024 * 1024
+            self.render_cache_disk = True
+            self.render_cache_disk_max_bytes = 256 * 1024 * 1024
+            self.blob_store_enabled = True
+            self.parallel_parse = False
+            self.parse_workers = 0
+            self.parallel_parse_threshold = 64
+            self.analysis_cache_enabled = True
+            self.snapshot_enabled = True
+            self.snapshot_interval = 60
+            self.walker = get_vault_walker(self.vault_path)
+    
+    def _get_cache(self):
+        """获取当前文档库的解析缓存"""
+        if not self.cache_enabled:
+            return None
+        try:
+            return get_document_cache(
+                self.vault_path, self.cache_dir, self.document_store == 'shared', self.blob_store_enabled
+            )
+        except Exception as e:
+            current_app.logger.warning(f"文档缓存不可用: {e}")
+            return None
+    
+    def _load_document(self, file_path: str, relative_path: str, cache=None) -> Optional[Dict]:
+        """读取文档，文件未变更时直接使用缓存"""
+        if cache is None:
+            return self._parse_document(file_path, relative_path)
+        
+        stat = os.stat(file_path)
+        document = cache.get(relative_path, stat.st_mtime_ns, stat.st_size)
+        if document is None:
+            document = self._parse_document(file_path, relative_path)
+            if document:
+                # 共享模式或正文存于blob文件时换成不含正文的记录，正文不随索引常驻内存
+                document = cache.put(relative_path, stat.st_mtime_ns, stat.st_size, document)
+        return document
+    
+    def _is_document_path(self, relative_path: str) -> bool:
+        """判断相对路径是否为应收录的文档（与完整扫描的过滤规则一致）"""
+        return self.walker.is_document_path(relative_path)
+    
+    def _sync_index(self, index) -> None:
+        """将监控到的变更应用到文档索引"""
+        cache = self._get_cache()
+        
+        def loader(relative_path):
+            file_path = os.path.join(self.vault_path, relative_path)
+            if not self._is_document_path(relative_path) or not os.path.exists(file_path):
+                return None
+            return self._load_document(file_path, relative_path, cache)
+        
+        if index.sync(loader) and cache:
+            cache.flush()
+        
+    def _get_search_index(self):
+        """获取当前文档库的搜索索引"""
+        try:
+            return get_search_index(self.vault_path, self.cache_dir)
+        except Exception as e:
+            current_app.logger.warning(f"搜索索引不可用: {e}")
+            return None
+    
+    def _get_snapshot(self):
+        """获取当前文档库的快照（快照中的文档不含正文，需要文档缓存提供正文）"""
+        if not self.snapshot_enabled or not self.cache_enabled:
+            return None
+        return get_vault_snapshot(self.vault_path, self.cache_dir, self.snapshot_interval)
+    
+    def _get_index(self):
+        """获取已同步的文档索引（有监控器时只应用增量变更，否则完整扫描）"""
+        index = get_vault_index(self.vault_path)
+        if index is self._synced_index:
+            # 本实例已同步过（文档库路径未变），不再重复扫描
+            return index
+        snapshot = self._get_snapshot()
+        search_index = self._get_search_index()
+        if search_index:
+            index.add_listener(search_index)
+        index.add_listener(get_global_statistics(self.vault_path))
+        index.add_listener(get_link_graph(self.vault_path))
+        index.add_listener(get_facet_index(self.vault_path))
+        if self.analysis_cache_enabled:
+            # 文档变更时清理过期的分析结果
+            index.add_listener(get_analysis_cache(self.vault_path, self.cache_dir))
+        if snapshot:
+            index.add_listener(snapshot)
+        
+        if index.is_fresh():
+            self._sync_index(index)
+        else:
+            self._scan_documents(index, snapshot)
+        
+        if search_index:
+            search_index.save()
+        if snapshot:
+            snapshot.save(index)
+        store = self._get_blob_store()
+        if store:
+            store.maybe_compact(lambda: self._live_blob_keys(index))
+        self._synced_index = index
+        return index
+    
+    def _live_blob_keys(self, index):
+        """正文存储中当前文档版本仍需要的键（正文和渲染后的HTML）"""
+        with index.lock:
+            documents = list(index.documents.values())
+        for document in documents:
+            yield document_blob_key('content', document)
+            yield document_blob_key('html', document, RENDER_FINGERPRINT)
+    
+    def _scan_documents(self, index, snapshot=None) -> None:
+        """完整扫描文档库并替换索引内容（进程内首次加载时优先从快照恢复）
+
+        扫描期间监控器上报的变更记录在索引的pending中，替换索引内容后立即应用；
+        扫描期间要求重新扫描时，只重新检查一遍文件状态（见_recheck_scan）。
+        """
+        index.begin_scan()
+        if not os.path.exists(self.vault_path):
+            current_app.logger.warning(f"文档库路径不存在: {self.vault_path}")
+            index.replace([])
+            return
+        
+        cache = self._get_cache()
+        if cache is None:
+            documents, stamps = self._scan_and_parse(None)
+            index.merge(documents)
+            self._recheck_scan(index, stamps)
+            self._sync_index(index)
+            return
+        
+        if snapshot and index.generation == 0:
+            # 快照恢复只需要stat一遍文件，不整体加载文档缓存
+            with cache.indexer_lock(refresh=False):
+                if self._restore_snapshot(index, snapshot, cache):
+                    return
+        
+        # 多个工作进程同时冷启动时只有一个进程解析，其余进程等待后直接读取结果
+        with cache.indexer_lock():
+            documents, stamps = self._scan_and_parse(cache)
+            # 没有监控器时每次请求都会完整扫描，只把有变化的文档增量应用到索引和派生索引
+            changed = index.merge(documents)
+            self._recheck_scan(index, stamps)
+            self._sync_index(index)
+        if snapshot and changed:
+            snapshot.save(index, stamps, force=True)
+    
+    def _recheck_scan(self, index, stamps: List[tuple]) -> None:
+        """扫描期间收到重新扫描的通知（监控器启动、事件丢失等）时重新遍历文档库，
+        与扫描时状态不同的文件记为待处理变更，不重新解析整个文档库"""
+        while index.take_stale():
+            scanned = {path: (mtime_ns, size) for path, mtime_ns, size in stamps}
+            stamps = [(f.relative_path, f.mtime_ns, f.size) for f in self.walker.walk()]
+            current = {path: (mtime_ns, size) for path, mtime_ns, size in stamps}
+            index.queue_changes(
+                [path for path, stamp in current.items() if scanned.get(path) != stamp],
+                [path for path in scanned if path not in current]
+            )
+    
+    def _restore_snapshot(self, index, snapshot, cache) -> bool:
+        """从快照恢复文档索引和派生索引，只重新加载快照之后有变化的文件，快照不可用时返回False"""
+        start = time.time()
+        with gc_paused():
+            state = snapshot.load()
+        if state is None:
+            return False
+        
+        stamps = [(f.relative_path, f.mtime_ns, f.size) for f in self.walker.walk()]
+        changed, deleted = snapshot.diff({path: (mtime_ns, size) for path, mtime_ns, size in stamps})
+        # 快照中的文档不含正文，恢复后正文按需从文档缓存读取（与shared模式相同）
+        with gc_paused():
+            documents = [DocumentRecord(document, cache) for document in state['documents']]
+        index.restore(documents, state['states'], changed, deleted)
+        self._recheck_scan(index, stamps)
+        self._sync_index(index)
+        if changed or deleted:
+            snapshot.save(index, stamps, force=True)
+        
+        snapshot.last_load = {
+            'documents': len(state['documents']),
+            'changed': len(changed),
+            'deleted': len(deleted),
+            'seconds': round(time.time() - start, 3)
+        }
+        current_app.logger.info(
+            f"已从快照恢复文档索引: {len(state['documents'])} 篇文档, {len(changed)} 个变更, "
+            f"{len(deleted)} 个删除, 耗时 {time.time() - start:.2f}s"
+        )
+        return True
+    
+    def _scan_and_parse(self, cache) -> Tuple[List[Dict], List[tuple]]:
+        """遍历文档库，解析缓存未命中的文件，返回 (全部文档, 文件状态列表)"""
+        documents = {}
+        stamps = []  # (relative_path, mtime_ns, size)
+        to_parse = []  # 缓存未命中的文件
+        
+        for vault_file in self.walker.walk():
+            stamp = (vault_file.relative_path, vault_file.mtime_ns, vault_file.size)
+            stamps.append(stamp)
+            if cache is None or cache.get(*stamp) is None:
+                to_parse.append(stamp)
+        
+        for relative_path, mtime_ns, size, document in self._parse_files(to_parse):
+            if document:
+                if cache:
+                    document = cache.put(relative_path, mtime_ns, size, document)
+                documents[relative_path] = document
         
+        if cache is None:
+            return list(documents.values()), stamps
+        
+        cache.prune(stamp[0] for stamp in stamps)
+        cache.flush()
+        # 以缓存中的记录为准（正文按需读取时为不含正文的轻量记录）
+        results = []
+        for stamp in stamps:
+            document = cache.get(*stamp) or documents.get(stamp[0])
+            if document:
+                results.append(document)
+        return results, stamps
+    
+    def _parse_files(self, entries: List[tuple]) -> List[tuple]:
+        """解析一组文件，数量较多且开启并行解析时使用进程池"""
+        workers = self.parse_workers or os.cpu_count() or 1
+        if self.parallel_parse and workers > 1 and len(entries) >= self.parallel_parse_threshold:
+            try:
+                return self._parse_files_parallel(entries, workers)
+            except Exception as e:
+                current_app.logger.warning(f"并行解析失败，改为顺序解析: {e}")
+        return _parse_batch(self.vault_path, entries, self)
+    
+    def _parse_files_parallel(self, entries: List[tuple], workers: int) -> List[tuple]:
+        """按文件批次将解析任务分发到进程池，结果顺序与输入一致"""
+        batch_size = max(16, math.ceil(len(entries) / (workers * 4)))
+        batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+        
+        results = []
+        # 使用spawn避免在含监控线程的进程中fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches)), mp_context=context) as executor:
+            for batch_results in executor.map(_parse_batch, [self.vault_path] * len(batches), batches):
+                results.extend(batch_results)
+        
+        current_app.logger.info(f"并行解析完成: {len(entries)} 个文档, {len(batches)} 个批次, {workers} 个进程")
+        return results
+    
     def get_all_documents(self) -> List[Dict]:
-        """获取所有文档"""
+        """获取所有文档，按修改时间倒序（返回的文档字典在请求间共享，调用方不应修改）"""
         # 更新文档库路径
         self._update_vault_path()
+        return self._get_index().get_all()
+    
+    def get_global_statistics(self) -> Dict:
+        """获取全局统计信息（随文档变更增量维护）"""
+        self._update_vault_path()
+        self._get_index()
+        return get_global_statistics(self.vault_path).snapshot()
+    
+    def get_backlinks(self, doc_path: str) -> Optional[Dict]:
+        """获取文档的反向链接、正向链接、嵌入和未解析链接，文档不存在时返回None"""
+        self._update_vault_path()
+        self._get_index()
+        return get_link_graph(self.vault_path).get_backlinks(doc_path)
+    
+    def get_link_graph(self) -> Dict:
+        """获取文档库的双链图谱"""
+        self._update_vault_path()
+        self._get_index()
+        graph = get_link_graph(self.vault_path)
+        return dict(graph.get_graph(), stats=graph.get_stats())
+    
+    def export_link_graph(self, folder: str = '', tag: Optional[str] = None, min_degree: int = 0,
+                          max_degree: Optional[int] = None, include_embeds: bool = True) -> Dict:
+        """导出紧凑图谱（CSR邻接数组，见LinkGraph.export），参数不合法时抛出ValueError"""
+        if min_degree < 0 or (max_degree is not None and max_degree < min_degree):
+            raise ValueError('度数范围不合法')
+        self._update_vault_path()
+        self._get_index()
+        return get_link_graph(self.vault_path).export(folder, tag, min_degree, max_degree, include_embeds)
+    
+    def get_vault_version(self) -> Dict:
+        """获取文档库的版本信息，用于列表和统计接口的HTTP缓存校验
         
-        documents = []
+        返回 {'version': 内容版本}。这类聚合响应只使用ETag：删除文档或恢复较早版本的文件时
+        最近修改时间不会前进，用它作为Last-Modified会让If-Modified-Since得到过期的304。
+        """
+        self._update_vault_path()
+        return {'version': self._get_index().version}
+    
+    def get_document_version(self, doc_path: str) -> Optional[Dict]:
+        """获取单个文档的版本信息（不读取正文），文档不存在时返回None
         
-        if not os.path.exists(self.vault_path):
-            current_app.logger.warning(f"文档库路径不存在: {self.vault_path}")
-            return documents
+        返回 {'version': 修改时间、大小和渲染器版本, 'last_modified': 修改时间的时间戳}。
+        """
+        document = self._get_document_record(doc_path)
+        if document is None:
+            return None
+        return {
+            'version': f"{document.get('modified_time')}-{document.get('size')}-{RENDERER_VERSION}",
+            'last_modified': _timestamp(document.get('modified_time'))
+        }
+    
+    def find_documents(self, folder: str = '') -> List[Dict]:
+        """获取指定文件夹（含子文件夹）下的所有文档，按路径排序，folder为空时返回全部文档"""
+        self._update_vault_path()
+        documents = self._get_index().get_all()
+        prefix = folder.replace('\\', '/').strip('/')
+        if prefix:
+            prefix += '/'
+            documents = [doc for doc in documents if doc['file_path'].replace('\\', '/').startswith(prefix)]
+        return sorted(documents, key=lambda doc: doc['file_path'])
+    
+    def list_documents(self, offset: int = 0, limit: int = 50, sort: str = 'modified_time',
+                       order: str = 'desc', fields: Optional[List[str]] = None,
+                       cursor: Optional[str] = None, lazy: bool = False,
+                       tags: Optional[List[str]] = None, meta: Optional[Dict[str, List[str]]] = None,
+                       facets: Optional[List[str]] = None) -> Dict:
+        """分页获取文档列表
         
-        for root, dirs, files in os.walk(self.vault_path):
-            # 跳过隐藏目录
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for file in files:
-                if any(file.endswith(ext) for ext in self.md_extensions):
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, self.vault_path)
-                    
-                    try:
-                        document = self._parse_document(file_path, relative_path)
-                        if document:
-                            documents.append(document)
-                    except Exception as e:
-                        current_app.logger.error(f"解析文档失败 {file_path}: {str(e)}")
-        
-        # 按修改时间排序
-        documents.sort(key=lambda x: x.get('modified_time', ''), reverse=True)
-        return documents
-    
-    def get_document(self, doc_path: str) -> Optional[Dict]:
-        """获取单个文档"""
+        支持offset分页和基于游标的分页（cursor优先），fields用于只返回指定字段。
+        lazy为True时items为逐条生成的迭代器（用于流式输出），且不限制limit上限。
+        tags和meta（字段 -> 可选值列表）按标签和元数据索引筛选，facets为需要统计的分面
+        （'tags' 或 'meta.<字段>'），计数范围为筛选后的全部文档，结果中的facets仅在请求分面时返回。
+        参数不合法时抛出ValueError。
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'不支持的排序方向: {order}')
+        if offset < 0 or limit < 1:
+            raise ValueError('offset不能为负数，limit必须大于0')
+        if not lazy:
+            limit = min(limit, MAX_PAGE_SIZE)
+        
+        fields = fields or METADATA_FIELDS
+        unknown = [field for field in fields if field not in METADATA_FIELDS + BODY_FIELDS]
+        if unknown:
+            raise ValueError(f'不支持的字段: {", ".join(unknown)}')
+        
+        self._update_vault_path()
+        keys, documents = self._get_index().get_sorted(sort)
+        facet_counts = None
+        if tags or meta or facets:
+            facet_index = get_facet_index(self.vault_path)
+            matched = facet_index.match(tags or (), meta)
+            if facets:
+                facet_counts = facet_index.facets(matched, facets)
+            if tags or meta:
+                # 只对匹配的文档排序，不遍历整个文档库
+                index = get_vault_index(self.vault_path)
+                entries = sorted(
+                    ((sort_value(document, sort), path), document)
+                    for path, document in ((path, index.get(path)) for path in matched) if document
+                )
+                keys = [key for key, _ in entries]
+                documents = [document for _, document in entries]
+        total = len(documents)
+        
+        # 游标记录上一页最后一条的排序键，插入或删除文档不会导致翻页错位
+        if cursor:
+            cursor_key = self._decode_cursor(cursor)
+            if order == 'asc':
+                start = bisect.bisect_right(keys, cursor_key)
+            else:
+                start = total - bisect.bisect_left(keys, cursor_key)
+        else:
+            start = offset
+        
+        if order == 'asc':
+            page = documents[start:start + limit]
+        else:
+            end = max(total - start, 0)
+            page = documents[max(end - limit, 0):end][::-1]
+        
+        next_cursor = None
+        if page and start + len(page) < total:
+            last = page[-1]
+            next_cursor = self._encode_cursor((sort_value(last, sort), last['file_path']))
+        
+        def project(document):
+            item = {field: document.get(field) for field in fields if field != 'html_content'}
+            if 'html_content' in fields:
+                item['html_content'] = self.get_html(document)
+            return item
+        
+        return {
+            'items': (project(document) for document in page) if lazy else [project(d) for d in page],
+            'facets': facet_counts,
+            'count': len(page),
+            'total': total,
+            'offset': start,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
+    
+    def _encode_cursor(self, key) -> str:
+        """编码分页游标"""
+        return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+    
+    def _decode_cursor(self, cursor: str):
+        """解码分页游标"""
+        try:
+            value, path = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            return (value, path)
+        except Exception:
+            raise ValueError('无效的分页游标')
+    
+    def get_document(self, doc_path: str, render: bool = True) -> Optional[Dict]:
+        """获取单个文档，render为True时附带渲染后的html_content"""
+        document = self._get_document_record(doc_path)
+        if document is None:
+            return None
+        
+        result = self.materialize(document)
+        if render:
+            result['html_content'] = self.get_html(document)
+        return result
+    
+    def materialize(self, document: Dict) -> Dict:
+        """转换为包含正文的独立字典，用于整体序列化"""
+        if isinstance(document, DocumentRecord):
+            return document.to_dict()
+        return dict(document)
+    
+    def _get_document_record(self, doc_path: str) -> Optional[Dict]:
+        """获取单个文档的元数据记录"""
         # 更新文档库路径
         self._update_vault_path()
         
+        index = get_vault_index(self.vault_path)
+        if index.is_fresh():
+            self._sync_index(index)
+            document = index.get(doc_path)
+            if document:
+                return document
+        
         full_path = os.path.join(self.vault_path, doc_path)
         
         if not os.path.exists(full_path):
             return None
         
         try:
-            return self._parse_document(full_path, doc_path)
+            cache = self._get_cache()
+            document = self._load_document(full_path, doc_path, cache)
+            if cache:
+                cache.flush()
+            return document
         except Exception as e:
             current_app.logger.error(f"解析文档失败 {full_path}: {str(e)}")
             return None
     
-    def search_documents(self, query: str) -> List[Dict]:
-        """搜索文档"""
-        all_docs = self.get_all_documents()
-        results = []
-        
-        query_lower = query.lower()
-        
-        for doc in all_docs:
-            # 搜索标题
-            if query_lower in doc.get('title', '').lower():
-                results.append(doc)
-                continue
-            
-            # 搜索内容
-            if query_lower in doc.get('content', '').lower():
-                results.append(doc)
-                continue
-            
-            # 搜索标签
-            tags = doc.get('tags', [])
-            if any(query_lower in tag.lower() for tag in tags):
-                results.append(doc)
-                continue
+    def search_documents(self, query: str, limit: Optional[int] = None) -> List[Dict]:
+        """搜索文档（倒排索引，按BM25得分排序）"""
+        self._update_vault_path()
+        index = self._get_index()
+        search_index = self._get_search_index()
+        if search_index is None:
+            return []
         
+        results = []
+        for relative_path, score in search_index.search(query, limit):
+            document = index.get(relative_path)
+            if document:
+                results.append(document)
         return results
     
     def _parse_document(self, file_path: str, relative_path: str) -> Optional[Dict]:
-        """解析单个文档"""
+        """解析单个文档的元数据记录（不渲染HTML，见get_html）
+        
+        可能在并行解析的子进程中执行，因此不依赖Flask应用上下文。
+        """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -112,7 +579,7 @@ class DocumentService:
                 metadata = dict(post.metadata) if post.metadata else {}
                 markdown_content = post.content
             except Exception as e:
-                current_app.logger.warning(f"Frontmatter解析失败，使用原始内容 {file_path}: {str(e)}")
+                logging.warning(f"Frontmatter解析失败，使用原始内容 {file_path}: {str(e)}")
                 metadata = {}
                 markdown_content = content
             
@@ -131,36 +598,9 @@ class DocumentService:
             if isinstance(tags, str):
                 tags = [tags]
             
-            # 转换Markdown为HTML
-            try:
-                html_content = markdown.markdown(
-                    markdown_content,
-                    extensions=[
-                        'fenced_code',
-                        'tables', 
-                        'toc',
-                        'codehilite',
-                        'nl2br',
-                        'sane_lists'
-                    ],
-                    extension_configs={
-                        'codehilite': {
-                            'css_class': 'highlight',
-                            'use_pygments': True,
-                            'noclasses': True,
-                            'linenums': False
-                        }
-                    }
-                )
-                
-                # 后处理HTML，改进代码块显示
-                html_content = self._post_process_html(html_content)
-            except Exception as e:
-                current_app.logger.warning(f"Markdown转换失败，使用原始内容 {file_path}: {str(e)}")
-                html_content = f'<pre>{markdown_content}</pre>'
-            
             # 提取链接
             links = self._extract_links(markdown_content)
+            wikilinks, embeds = extract_wikilinks(markdown_content)
             
             # 提取图片
             images = self._extract_images(markdown_content)
@@ -169,24 +609,96 @@ class DocumentService:
                 'file_path': relative_path,
                 'title': title,
                 'content': markdown_content,
-                'html_content': html_content,
                 'metadata': metadata,
                 'tags': tags,
                 'links': links,
+                'wikilinks': wikilinks,
+                'embeds': embeds,
                 'images': images,
                 'created_time': datetime.fromtimestamp(stat.st_ctime).isoformat(),
                 'modified_time': datetime.fromtimestamp(stat.st_mtime).isoformat(),
                 'size': stat.st_size,
                 'word_count': len(markdown_content.split()),
-                'line_count': len(markdown_content.splitlines())
+                'line_count': len(markdown_content.splitlines()),
+                'excerpt': markdown_content[:EXCERPT_LENGTH] + ('...' if len(markdown_content) > EXCERPT_LENGTH else '')
             }
             
             return document
             
         except Exception as e:
-            current_app.logger.error(f"解析文档失败 {file_path}: {str(e)}")
+            logging.error(f"解析文档失败 {file_path}: {str(e)}")
             return None
     
+    def get_html(self, document: Dict) -> str:
+        """获取文档渲染后的HTML，Markdown内容不变时复用渲染缓存"""
+        markdown_content = document.get('content', '')
+        render_cache = get_render_cache(
+            self.render_cache_max_bytes,
+            os.path.join(self.cache_dir, 'html') if self.render_cache_disk else None,
+            self.render_cache_disk_max_bytes
+        )
+        key = render_cache.make_key(markdown_content, RENDER_FINGERPRINT)
+        
+        html_content = render_cache.get(key)
+        if html_content is None:
+            html_content = self._render_html(markdown_content, document.get('file_path', ''))
+            render_cache.put(key, html_content)
+        return html_content
+    
+    def _get_blob_store(self):
+        """获取当前文档库的正文存储"""
+        if not self.blob_store_enabled:
+            return None
+        try:
+            return get_blob_store(self.vault_path, self.cache_dir)
+        except Exception as e:
+            current_app.logger.warning(f"正文存储不可用: {e}")
+            return None
+    
+    def get_document_body(self, doc_path: str, kind: str = 'content') -> Optional[memoryview]:
+        """获取文档原文（kind='content'）或渲染后HTML（kind='html'）的UTF-8数据，文档不存在时返回None
+        
+        开启正文存储时返回blob文件映射区域上的只读视图，每个文档版本只在第一次请求时读取正文或渲染，
+        之后各工作进程直接从映射区域输出；未开启时返回临时编码的数据。
+        """
+        if kind not in ('content', 'html'):
+            raise ValueError(f'不支持的正文类型: {kind}')
+        self._update_vault_path()
+        document = self._get_document_record(doc_path)
+        if document is None:
+            return None
+        
+        store = self._get_blob_store()
+        if store:
+            extra = (RENDER_FINGERPRINT,) if kind == 'html' else ()
+            key = document_blob_key(kind, document, *extra)
+            view = store.get(key)
+            if view is not None:
+                return view
+        
+        text = document.get('content', '') if kind == 'content' else self.get_html(document)
+        data = text.encode('utf-8')
+        if store:
+            view = store.put(key, data)
+            if view is not None:
+                return view
+        return memoryview(data)
+    
+    def _render_html(self, markdown_content: str, file_path: str = '') -> str:
+        """将Markdown转换为HTML"""
+        try:
+            html_content = markdown.markdown(
+                markdown_content,
+                extensions=MARKDOWN_EXTENSIONS,
+                extension_configs=MARKDOWN_EXTENSION_CONFIGS
+            )
+            
+            # 后处理HTML，改进代码块显示
+            return self._post_process_html(html_content)
+        except Exception as e:
+            current_app.logger.warning(f"Markdown转换失败，使用原始内容 {file_path}: {str(e)}")
+            return f'<pre>{markdown_content}</pre>'
+    
     def _extract_links(self, content: str) -> List[str]:
         """提取文档中的链接"""
         # Markdown链接模式
@@ -202,34 +714,18 @@ class DocumentService:
         return [img[1] for img in images]
     
     def get_document_stats(self) -> Dict:
-        """获取文档统计信息"""
-        documents = self.get_all_documents()
-        
-        total_docs = len(documents)
-        total_words = sum(doc.get('word_count', 0) for doc in documents)
-        total_size = sum(doc.get('size', 0) for doc in documents)
-        
-        # 标签统计
-        tag_counts = {}
-        for doc in documents:
-            for tag in doc.get('tags', []):
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
-        # 按月份统计
-        monthly_stats = {}
-        for doc in documents:
-            modified_time = doc.get('modified_time', '')
-            if modified_time:
-                month = modified_time[:7]  # YYYY-MM
-                monthly_stats[month] = monthly_stats.get(month, 0) + 1
-        
-        return {
-            'total_documents': total_docs,
-            'total_words': total_words,
-            'total_size': total_size,
-            'tag_counts': tag_counts,
-            'monthly_stats': monthly_stats
-        }
+        """获取文档统计信息（读取增量维护的全局统计，不遍历文档）"""
+        self._update_vault_path()
+        self._get_index()
+        statistics = get_global_statistics(self.vault_path)
+        with statistics.lock:
+            return {
+                'total_documents': len(statistics.contributions),
+                'total_words': statistics.total_words,
+                'total_size': statistics.total_size,
+                'tag_counts': dict(statistics.tags),
+                'monthly_stats': dict(statistics.months)
+            }
     
     def _post_process_html(self, html_content: str) -> str:
         """后处理HTML内容，改进代码块显示"""
@@ -301,4 +797,16 @@ class DocumentService:
         elif any(keyword in code_lower for keyword in ['{', '}', '"name"', '"version"']):
             return 'json'
         
-        return 'text' 
\ No newline at end of file
+        return 'text' 
+
+def _parse_batch(vault_path: str, entries: List[tuple], parser: DocumentService = None) -> List[tuple]:
+    """解析一批文档，返回 (relative_path, mtime_ns, size, document)
+    
+    作为进程池任务时在子进程中执行，不依赖Flask应用上下文。
+    """
+    parser = parser or DocumentService()
+    results = []
+    for relative_path, mtime_ns, size in entries:
+        file_path = os.path.join(vault_path, relative_path)
+        results.append((relative_path, mtime_ns, size, parser._parse_document(file_path, relative_path)))
+    return results
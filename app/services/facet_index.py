@@ -0,0 +1,210 @@
+"""
+标签和元数据索引 - 作为文档索引的派生索引，按标签（含嵌套标签）和frontmatter字段值维护文档集合，用于分面筛选
+"""
+
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+def normalize_tag(tag) -> str:
+    """标签的规范形式：去掉#前缀和首尾斜杠，小写"""
+    return str(tag).strip().lstrip('#').strip('/').lower()
+
+def document_tags(document: Dict) -> List[str]:
+    """文档的规范化标签（去重，保持原顺序），标签缺失或为None时返回空列表，列表中的空值被忽略"""
+    tags = document.get('tags') or []
+    if not isinstance(tags, (list, tuple, set)):
+        tags = [tags]
+    result = []
+    for tag in tags:
+        tag = normalize_tag(tag) if tag is not None else ''
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+def expand_tag(tag: str) -> List[str]:
+    """嵌套标签及其所有上级标签，如 tech/python -> [tech, tech/python]"""
+    parts = tag.split('/')
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+def normalize_value(value) -> Optional[str]:
+    """frontmatter字段值的规范形式（用于匹配查询参数），不可索引的值返回None"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float)):
+        return str(value).strip().lower()
+    return None
+
+class FacetIndex:
+    """标签和元数据索引类
+
+    标签索引中每篇文档同时计入其嵌套标签的所有上级标签；
+    元数据索引只收录标量值，列表值的每个元素分别收录。
+    筛选和计数只使用索引中的路径集合，不读取文档正文。
+    """
+
+    snapshot_key = 'facets'  # 在文档库快照中的状态名
+
+    def __init__(self, vault_path: str):
+        self.vault_path = vault_path
+        self.lock = threading.RLock()
+        self.tags = defaultdict(set)  # 标签（含上级标签） -> 文档路径
+        self.fields = defaultdict(lambda: defaultdict(set))  # 字段 -> 值 -> 文档路径
+        self.entries = {}  # relative_path -> (标签列表, {字段: 值列表})
+
+    @staticmethod
+    def _entry(document: Dict):
+        """文档在索引中的条目"""
+        tags = set()
+        for tag in document_tags(document):
+            tags.update(expand_tag(tag))
+        fields = {}
+        metadata = document.get('metadata') or {}
+        if isinstance(metadata, dict):
+            for field, value in metadata.items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                normalized = {normalize_value(v) for v in values} - {None, ''}
+                if normalized:
+                    fields[str(field)] = sorted(normalized)
+        return sorted(tags), fields
+
+    def _remove(self, relative_path: str):
+        """移除文档的索引条目"""
+        entry = self.entries.pop(relative_path, None)
+        if entry is None:
+            return
+        tags, fields = entry
+        for tag in tags:
+            paths = self.tags.get(tag)
+            if paths is not None:
+                paths.discard(relative_path)
+                if not paths:
+                    del self.tags[tag]
+        for field, values in fields.items():
+            field_index = self.fields.get(field)
+            if field_index is None:
+                continue
+            for value in values:
+                paths = field_index.get(value)
+                if paths is not None:
+                    paths.discard(relative_path)
+                    if not paths:
+                        del field_index[value]
+            if not field_index:
+                del self.fields[field]
+
+    def _add(self, relative_path: str, document: Dict):
+        """加入文档的索引条目"""
+        tags, fields = self._entry(document)
+        self.entries[relative_path] = (tags, fields)
+        for tag in tags:
+            self.tags[tag].add(relative_path)
+        for field, values in fields.items():
+            for value in values:
+                self.fields[field][value].add(relative_path)
+
+    def reset(self, documents: List[Dict]):
+        """按完整文档集合重建"""
+        with self.lock:
+            self.tags = defaultdict(set)
+            self.fields = defaultdict(lambda: defaultdict(set))
+            self.entries = {}
+            for document in documents:
+                self._add(document['file_path'], document)
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """更新单个文档（document为None表示删除）"""
+        with self.lock:
+            self._remove(relative_path)
+            if document is not None:
+                self._add(relative_path, document)
+
+    def get_state(self) -> Dict:
+        """导出可写入文档库快照的状态"""
+        with self.lock:
+            return {
+                'entries': self.entries,
+                'tags': dict(self.tags),
+                'fields': {field: dict(values) for field, values in self.fields.items()}
+            }
+
+    def restore_state(self, state: Dict):
+        """从文档库快照恢复"""
+        fields = defaultdict(lambda: defaultdict(set))
+        for field, values in state['fields'].items():
+            fields[field] = defaultdict(set, values)
+        with self.lock:
+            self.entries = state['entries']
+            self.tags = defaultdict(set, state['tags'])
+            self.fields = fields
+
+    def match(self, tags: Iterable[str] = (), meta: Optional[Dict[str, List[str]]] = None) -> Set[str]:
+        """筛选文档路径：所有标签都要匹配（含子标签），同一字段的多个值满足其一即可，不同字段都要满足"""
+        with self.lock:
+            candidates = []
+            for tag in tags:
+                candidates.append(self.tags.get(normalize_tag(tag), set()))
+            for field, values in (meta or {}).items():
+                field_index = self.fields.get(field, {})
+                matched = set()
+                for value in values:
+                    matched |= field_index.get(normalize_value(value), set())
+                candidates.append(matched)
+            if not candidates:
+                return set(self.entries)
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for paths in candidates[1:]:
+                result &= paths
+                if not result:
+                    break
+            return result
+
+    def facets(self, paths: Set[str], names: Iterable[str], limit: int = 50) -> Dict[str, Dict[str, int]]:
+        """统计一组文档的分面计数
+
+        names中'tags'表示标签计数（含上级标签），'meta.<字段>'表示该字段各值的计数，每个分面最多返回limit个值。
+        """
+        counters = {}
+        with self.lock:
+            for name in names:
+                counter = Counter()
+                if name == 'tags':
+                    for path in paths:
+                        counter.update(self.entries.get(path, ((), {}))[0])
+                elif name.startswith('meta.'):
+                    field = name[len('meta.'):]
+                    for path in paths:
+                        counter.update(self.entries.get(path, ((), {}))[1].get(field, ()))
+                else:
+                    raise ValueError(f'不支持的分面: {name}')
+                counters[name] = dict(counter.most_common(limit))
+        return counters
+
+    def get_tags(self) -> Dict[str, int]:
+        """所有标签（含上级标签）及其文档数"""
+        with self.lock:
+            return {tag: len(paths) for tag, paths in sorted(self.tags.items())}
+
+    def get_fields(self) -> Dict[str, int]:
+        """所有已索引的frontmatter字段及其取值个数"""
+        with self.lock:
+            return {field: len(values) for field, values in sorted(self.fields.items())}
+
+# 进程内共享的索引实例，按文档库路径区分
+_indexes: Dict[str, FacetIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_facet_index(vault_path: str) -> FacetIndex:
+    """获取文档库对应的标签和元数据索引"""
+    key = os.path.abspath(vault_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FacetIndex(vault_path)
+            _indexes[key] = index
+        return index
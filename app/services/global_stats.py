@@ -0,0 +1,178 @@
+"""
+全局统计 - 作为文档索引的派生索引，按文档增量维护全局统计数据
+"""
+
+import os
+import logging
+import threading
+import textstat
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from app.services.facet_index import document_tags
+
+# 根据标签判断文档类型，按顺序匹配
+DOCUMENT_TYPE_TAGS = [
+    ('技术文档', ['技术', '编程', '代码']),
+    ('学习笔记', ['学习', '笔记', '总结']),
+    ('工作文档', ['工作', '项目', '任务']),
+    ('生活记录', ['生活', '日记', '随笔'])
+]
+
+def classify_document_type(document: Dict) -> str:
+    """根据标签判断文档类型"""
+    tags = document_tags(document)
+    for doc_type, type_tags in DOCUMENT_TYPE_TAGS:
+        if any(tag in type_tags for tag in tags):
+            return doc_type
+    return '其他'
+
+def reading_ease(content: str) -> Optional[float]:
+    """计算Flesch可读性分数，失败时返回None"""
+    if not content:
+        return None
+    try:
+        return textstat.flesch_reading_ease(content)
+    except Exception as e:
+        logging.warning(f"计算文档可读性失败: {e}")
+        return None
+
+class GlobalStatistics:
+    """全局统计类
+
+    每篇文档的贡献（字数、大小、可读性、标签、月份、类型）单独记录，
+    文档变化时先减去旧贡献再加上新贡献，读取统计时不需要遍历文档。
+    可读性只在文档内容变化后重新计算。
+    """
+
+    snapshot_key = 'global_stats'  # 在文档库快照中的状态名
+
+    def __init__(self, vault_path: str):
+        self.vault_path = vault_path
+        self.lock = threading.RLock()
+        self.contributions = {}  # relative_path -> 文档贡献
+        self.total_words = 0
+        self.total_size = 0
+        self.readability_sum = 0.0
+        self.readability_count = 0
+        self.tags = Counter()
+        self.months = Counter()
+        self.doc_types = Counter()
+        self._snapshot = None
+
+    @staticmethod
+    def _signature(document: Dict) -> Tuple:
+        """文档版本标识，用于判断是否需要重新计算可读性"""
+        return (document.get('modified_time'), document.get('size'))
+
+    def _contribution(self, document: Dict, previous: Optional[Dict]) -> Dict:
+        """计算单篇文档对全局统计的贡献"""
+        signature = self._signature(document)
+        if previous is not None and previous['signature'] == signature:
+            readability = previous['readability']
+        else:
+            readability = reading_ease(document.get('content', ''))
+        modified_time = document.get('modified_time') or ''
+        return {
+            'signature': signature,
+            'words': document.get('word_count', 0),
+            'size': document.get('size', 0),
+            'readability': readability,
+            'tags': document_tags(document),  # 与标签索引相同的规范形式
+            'month': modified_time[:7] if modified_time else None,
+            'doc_type': classify_document_type(document)
+        }
+
+    def _apply(self, contribution: Dict, sign: int):
+        """把文档贡献加入（sign=1）或移出（sign=-1）汇总"""
+        self.total_words += sign * contribution['words']
+        self.total_size += sign * contribution['size']
+        if contribution['readability'] is not None:
+            self.readability_sum += sign * contribution['readability']
+            self.readability_count += sign
+        keys = [(self.tags, tag) for tag in contribution['tags']]
+        keys.append((self.doc_types, contribution['doc_type']))
+        if contribution['month']:
+            keys.append((self.months, contribution['month']))
+        for counter, key in keys:
+            counter[key] += sign
+            if counter[key] <= 0:
+                del counter[key]
+
+    def reset(self, documents: List[Dict]):
+        """按完整文档集合重建，未变化的文档复用已计算的可读性"""
+        with self.lock:
+            current = set()
+            for document in documents:
+                relative_path = document['file_path']
+                current.add(relative_path)
+                previous = self.contributions.get(relative_path)
+                if previous is not None and previous['signature'] == self._signature(document):
+                    continue
+                self.update(relative_path, document)
+            for relative_path in [p for p in self.contributions if p not in current]:
+                self.update(relative_path, None)
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """更新单个文档（document为None表示删除）"""
+        with self.lock:
+            previous = self.contributions.pop(relative_path, None)
+            if previous is not None:
+                self._apply(previous, -1)
+            if document is not None:
+                contribution = self._contribution(document, previous)
+                self.contributions[relative_path] = contribution
+                self._apply(contribution, 1)
+            self._snapshot = None
+
+    def get_state(self) -> Dict:
+        """导出可写入文档库快照的状态（各文档的贡献和汇总数据）"""
+        with self.lock:
+            return {
+                'contributions': self.contributions,
+                'totals': (self.total_words, self.total_size, self.readability_sum, self.readability_count),
+                'tags': self.tags,
+                'months': self.months,
+                'doc_types': self.doc_types
+            }
+
+    def restore_state(self, state: Dict):
+        """从文档库快照恢复"""
+        totals = state['totals']
+        counters = state['tags'], state['months'], state['doc_types']
+        with self.lock:
+            self.contributions = state['contributions']
+            self.total_words, self.total_size, self.readability_sum, self.readability_count = totals
+            self.tags, self.months, self.doc_types = counters
+            self._snapshot = None
+
+    def snapshot(self) -> Dict:
+        """获取全局统计信息（格式与AnalysisService.get_global_statistics一致）"""
+        with self.lock:
+            if self._snapshot is None:
+                total_docs = len(self.contributions)
+                self._snapshot = {
+                    'total_documents': total_docs,
+                    'total_words': self.total_words,
+                    'total_size': self.total_size,
+                    'average_words_per_doc': round(self.total_words / total_docs, 2) if total_docs > 0 else 0,
+                    'average_readability': (round(self.readability_sum / self.readability_count, 2)
+                                            if self.readability_count else 0),
+                    'top_tags': dict(self.tags.most_common(10)),
+                    'monthly_stats': dict(sorted(self.months.items(), reverse=True)),
+                    'document_types': dict(self.doc_types)
+                }
+            return dict(self._snapshot)
+
+# 进程内共享的统计实例，按文档库路径区分
+_statistics: Dict[str, GlobalStatistics] = {}
+_statistics_lock = threading.Lock()
+
+def get_global_statistics(vault_path: str) -> GlobalStatistics:
+    """获取文档库对应的全局统计实例"""
+    key = os.path.abspath(vault_path)
+    with _statistics_lock:
+        statistics = _statistics.get(key)
+        if statistics is None:
+            statistics = GlobalStatistics(vault_path)
+            _statistics[key] = statistics
+        return statistics
@@ -0,0 +1,152 @@
+"""
+inotify监听 - 通过ctypes调用Linux inotify接口，递归监听目录树
+"""
+
+import os
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+from typing import Callable, List, Optional, Tuple
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+def _get_libc():
+    """加载libc中的inotify函数，不可用时返回None"""
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            _libc = libc
+        except (OSError, AttributeError):
+            return None
+    return _libc
+
+def inotify_available() -> bool:
+    """当前系统是否支持inotify"""
+    return _get_libc() is not None
+
+class InotifyError(OSError):
+    """inotify调用失败"""
+
+class InotifyWatcher:
+    """递归目录监听器
+
+    read_events返回 (目录路径, 事件掩码, 文件名) 列表；
+    队列溢出时返回的事件中包含 IN_Q_OVERFLOW，调用方应完整重新扫描。
+    """
+
+    def __init__(self):
+        libc = _get_libc()
+        if libc is None:
+            raise InotifyError(errno.ENOSYS, '当前系统不支持inotify')
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError(err, os.strerror(err))
+        self.watches = {}  # wd -> 目录路径
+        self.paths = {}  # 目录路径 -> wd
+
+    def add_watch(self, path: str):
+        """监听单个目录"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError(err, f'{os.strerror(err)}: {path}')
+        self.watches[wd] = path
+        self.paths[path] = wd
+
+    def add_tree(self, root: str, skip_dir: Optional[Callable[[str], bool]] = None):
+        """递归监听目录树，skip_dir(目录名)返回True的目录不监听"""
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                self.add_watch(path)
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and not (skip_dir and skip_dir(entry.name)):
+                            stack.append(entry.path)
+            except FileNotFoundError:
+                continue
+            except InotifyError as e:
+                if e.errno == errno.ENOENT:
+                    continue
+                raise
+
+    def remove_tree(self, root: str):
+        """停止监听目录树（目录已删除时内核会自动移除监听）"""
+        prefix = root.rstrip(os.sep) + os.sep
+        for path in [p for p in self.paths if p == root or p.startswith(prefix)]:
+            wd = self.paths.pop(path)
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> List[Tuple[str, int, str]]:
+        """等待并读取事件，超时返回空列表"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_IGNORED:
+                    path = self.watches.pop(wd, None)
+                    if path is not None:
+                        self.paths.pop(path, None)
+                    continue
+                events.append((self.watches.get(wd, ''), mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        """关闭inotify描述符"""
+        if self.fd >= 0:
+            try:
+                os.close(self.fd)
+            except OSError as e:
+                logging.warning(f"关闭inotify失败: {e}")
+            self.fd = -1
+        self.watches.clear()
+        self.paths.clear()
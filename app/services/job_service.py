@@ -0,0 +1,367 @@
+"""
+后台任务服务 - 在进程内线程池中执行耗时的文档库级任务，任务状态持久化到SQLite
+
+任务表位于cache_dir下，任何工作进程都可以查询进度、取消任务和读取结果；
+任务由提交它的进程执行，不需要外部消息队列。
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+class JobContext:
+    """传给任务函数的上下文，用于读取参数、上报进度和检查取消"""
+
+    report_interval = 0.5  # 写入进度和检查取消标记的最小间隔（秒）
+
+    def __init__(self, service: 'JobService', job_id: str, params: Dict):
+        self.service = service
+        self.job_id = job_id
+        self.params = params
+        self.done = 0
+        self.total = 0
+        self.message = ''
+        self._last_report = 0
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        """上报进度（按时间节流写入），任务已被取消时抛出JobCancelled"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        now = time.time()
+        if now - self._last_report < self.report_interval and done != self.total:
+            return
+        self._last_report = now
+        self.service._update(self.job_id, progress_done=self.done, progress_total=self.total, message=self.message)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        """任务已被取消时抛出JobCancelled"""
+        if self.service._cancel_requested(self.job_id):
+            raise JobCancelled()
+
+class JobService:
+    """后台任务服务类
+
+    任务类型通过register注册，任务函数接收JobContext并返回可JSON序列化的结果。
+    """
+
+    def __init__(self, cache_dir: str = './cache', workers: int = 2, retention: int = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.retention = retention  # 已结束任务的保留时间（秒）
+        self.db_path = os.path.join(cache_dir, 'jobs.sqlite3')
+        self.handlers = {}  # kind -> 任务函数
+        self.lock = threading.Lock()
+        self._executor = None
+        self._local = threading.local()
+        self._recover()
+
+    def register(self, kind: str, handler: Callable[[JobContext], Any]):
+        """注册任务类型"""
+        self.handlers[kind] = handler
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（fork后重新建立连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT, params TEXT, status TEXT, '
+                'progress_done INTEGER DEFAULT 0, progress_total INTEGER DEFAULT 0, message TEXT, '
+                'cancel_requested INTEGER DEFAULT 0, result TEXT, error TEXT, pid INTEGER, '
+                'created REAL, started REAL, finished REAL, instance TEXT)'
+            )
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'instance' not in columns:
+                # 早期版本创建的任务表没有进程实例标识
+                conn.execute('ALTER TABLE jobs ADD COLUMN instance TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created)')
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, job_id: str, **fields):
+        """更新任务字段"""
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._connect()
+        conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        conn.commit()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        """任务是否已被请求取消"""
+        row = self._connect().execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def _recover(self):
+        """把执行进程已退出的未完成任务标记为失败
+
+        只判断PID是否存活不够：容器重启或PID回绕后，同一PID可能属于另一个进程。
+        提交时记录了进程实例标识的任务，还要求该PID当前的实例标识与之相同。
+        """
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                'SELECT id, pid, instance FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+            ).fetchall()
+            for row in rows:
+                alive = _process_alive(row['pid'])
+                if alive and row['instance']:
+                    alive = _process_instance(row['pid']) == row['instance']
+                if not alive:
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                        (FAILED, '执行任务的进程已退出', time.time(), row['id'])
+                    )
+            conn.commit()
+        except Exception as e:
+            logging.warning(f"恢复后台任务状态失败: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取任务线程池"""
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            return self._executor
+
+    def submit(self, kind: str, params: Optional[Dict] = None, app=None) -> Dict:
+        """提交任务，返回任务信息；kind未注册时抛出ValueError
+
+        app为Flask应用时，任务在该应用的上下文中执行。
+        """
+        handler = self.handlers.get(kind)
+        if handler is None:
+            raise ValueError(f'不支持的任务类型: {kind}')
+        params = params or {}
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO jobs (id, kind, params, status, message, pid, instance, created) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(params, ensure_ascii=False), QUEUED, '', os.getpid(),
+             _process_instance(os.getpid()), now)
+        )
+        conn.execute(
+            'DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished < ?',
+            (*FINISHED_STATES, now - self.retention)
+        )
+        conn.commit()
+        self._get_executor().submit(self._run, job_id, handler, params, app)
+        return self.get(job_id)
+
+    def _run(self, job_id: str, handler: Callable, params: Dict, app):
+        """在线程池中执行任务"""
+        context = JobContext(self, job_id, params)
+        try:
+            context.check_cancelled()
+            self._update(job_id, status=RUNNING, started=time.time())
+            if app is not None:
+                with app.app_context():
+                    result = handler(context)
+            else:
+                result = handler(context)
+            self._update(
+                job_id, status=SUCCEEDED, finished=time.time(),
+                progress_done=context.done, progress_total=context.total, message=context.message,
+                result=json.dumps(result, ensure_ascii=False)
+            )
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, finished=time.time())
+            logging.info(f"后台任务已取消: {job_id}")
+        except Exception as e:
+            logging.error(f"后台任务失败 {job_id}: {e}")
+            self._update(job_id, status=FAILED, finished=time.time(), error=str(e))
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """请求取消任务（执行中的任务在下次上报进度时停止），任务不存在时返回None"""
+        conn = self._connect()
+        conn.execute(
+            'UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)',
+            (job_id, QUEUED, RUNNING)
+        )
+        conn.commit()
+        return self.get(job_id)
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        """转换为任务信息（不含结果）"""
+        total = row['progress_total'] or 0
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'params': json.loads(row['params'] or '{}'),
+            'status': row['status'],
+            'progress': {
+                'done': row['progress_done'] or 0,
+                'total': total,
+                'percent': round(100 * (row['progress_done'] or 0) / total, 1) if total else None,
+                'message': row['message'] or ''
+            },
+            'cancel_requested': bool(row['cancel_requested']),
+            'error': row['error'],
+            'created': row['created'],
+            'started': row['started'],
+            'finished': row['finished']
+        }
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """获取任务信息，不存在时返回None"""
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        """获取最近提交的任务"""
+        rows = self._connect().execute('SELECT * FROM jobs ORDER BY created DESC LIMIT ?', (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get_result(self, job_id: str) -> Any:
+        """获取已成功任务的结果"""
+        row = self._connect().execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or row['result'] is None:
+            return None
+        return json.loads(row['result'])
+
+    def after_fork(self):
+        """fork出的子进程不能使用父进程的线程池"""
+        self._executor = None
+        self._local = threading.local()
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """进程是否仍在运行"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _process_instance(pid: int) -> Optional[str]:
+    """进程实例标识（本次开机的boot_id和进程启动时间），PID被复用时不同；无法获取时返回None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+        # 进程名可能包含空格和括号，从最后一个')'之后切分，第20项为启动时间（开机后的时钟周期数）
+        start_time = stat[stat.rindex(b')') + 2:].split()[19].decode('ascii')
+    except (OSError, ValueError, IndexError):
+        return None
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            boot_id = f.read().strip()
+    except OSError:
+        boot_id = ''
+    return f'{boot_id}:{start_time}'
+
+def _run_analysis(job: JobContext) -> Dict:
+    """批量分析文档（参数与 /api/analysis/batch 相同）"""
+    from flask import current_app
+    from app.services.analysis_client import get_analysis_client
+    from app.services.analysis_service import AnalysisService, DEFAULT_ANALYSIS_WORKERS
+    from app.services.config_service import ConfigService
+    from app.services.document_service import DocumentService
+
+    doc_service = DocumentService()
+    client = get_analysis_client(current_app.config) if current_app else None
+    paths = job.params.get('paths')
+    failed = {}
+    if paths:
+        documents = []
+        for path in dict.fromkeys(paths):
+            document = doc_service.get_document(path, render=False)
+            if document:
+                documents.append(document)
+            else:
+                failed[path] = '文档不存在'
+    else:
+        documents = doc_service.find_documents(job.params.get('folder', ''))
+
+    total = len(documents)
+    job.progress(0, total, '正在分析文档')
+    results = {}
+    workers = ConfigService().get('analysis_workers', DEFAULT_ANALYSIS_WORKERS)
+    for done, result in enumerate(AnalysisService().analyze_batch(documents, workers, client), 1):
+        if result['success']:
+            results[result['path']] = result['data']
+        else:
+            failed[result['path']] = result['error']
+        job.progress(done, total)
+    return {'documents': results, 'failed': failed}
+
+def _run_statistics(job: JobContext) -> Dict:
+    """计算全局统计信息"""
+    from app.services.document_service import DocumentService
+
+    job.progress(0, 1, '正在统计文档库')
+    stats = DocumentService().get_global_statistics()
+    job.progress(1, 1)
+    return stats
+
+def _run_reindex(job: JobContext) -> Dict:
+    """丢弃内存索引并重新扫描文档库"""
+    from flask import current_app
+    from app.services.document_service import DocumentService
+    from app.services.vault_index import get_vault_index
+
+    doc_service = DocumentService()
+    job.progress(0, 1, '正在重新扫描文档库')
+    monitor_service = getattr(current_app, 'monitor_service', None)
+    if monitor_service is not None:
+        # 同时通知其他工作进程重新扫描
+        monitor_service.force_refresh()
+    else:
+        get_vault_index(doc_service.vault_path).invalidate()
+    documents = doc_service.get_all_documents()
+    job.progress(1, 1)
+    return {'documents': len(documents)}
+
+# 进程内共享的任务服务，按缓存目录区分
+_services: Dict[str, JobService] = {}
+_services_lock = threading.Lock()
+
+def get_job_service(cache_dir: str = './cache', workers: int = 2) -> JobService:
+    """获取任务服务实例（已注册内置任务类型）"""
+    key = os.path.abspath(cache_dir)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = JobService(cache_dir, workers)
+            service.register('analysis', _run_analysis)
+            service.register('statistics', _run_statistics)
+            service.register('reindex', _run_reindex)
+            _services[key] = service
+        return service
+
+def _reset_after_fork():
+    for service in list(_services.values()):
+        service.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
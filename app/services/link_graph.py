@@ -0,0 +1,357 @@
+"""
+链接图谱 - 作为文档索引的派生索引，增量维护Obsidian双链（[[note]]）和嵌入（![[note]]）的正向链接、反向链接和未解析链接
+"""
+
+import os
+import re
+import json
+import struct
+import threading
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.facet_index import document_tags, normalize_tag
+
+WIKILINK_PATTERN = re.compile(r'(!?)\[\[([^\[\]\n]+?)\]\]')
+FENCED_CODE_PATTERN = re.compile(r'^(`{3,}|~{3,}).*?^\1', re.MULTILINE | re.DOTALL)
+INLINE_CODE_PATTERN = re.compile(r'`[^`\n]*`')
+
+# 链接类型
+LINK = 'link'
+EMBED = 'embed'
+KIND_CODES = {LINK: 0, EMBED: 1}
+
+# 二进制图谱格式（小端）：头部 | offsets uint32[n+1] | targets uint32[m] | kinds uint8[m] | 节点表JSON
+# 头部为 magic, version, flags（bit0表示含kinds）, reserved, n_nodes, n_edges, nodes_json_length；
+# 节点表为 {"nodes": [路径], "titles": [标题]}，节点编号即数组下标
+GRAPH_MAGIC = b'OBGR'
+GRAPH_FORMAT_VERSION = 1
+GRAPH_HEADER = struct.Struct('<4sBBHIII')
+
+def extract_wikilinks(content: str) -> Tuple[List[str], List[str]]:
+    """提取文档中的双链和嵌入目标，返回 (链接目标列表, 嵌入目标列表)
+
+    目标去掉别名（|）和标题/块引用（#），代码块中的内容不计入，同一目标只保留一次。
+    """
+    content = FENCED_CODE_PATTERN.sub('', content)
+    content = INLINE_CODE_PATTERN.sub('', content)
+    links, embeds = {}, {}
+    for bang, inner in WIKILINK_PATTERN.findall(content):
+        # 表格中的别名分隔符写作 \|
+        target = inner.replace('\\|', '|').split('|', 1)[0].split('#', 1)[0].strip()
+        if target:
+            (embeds if bang else links)[target] = True
+    return list(links), list(embeds)
+
+def _target_key(target: str) -> str:
+    """链接目标的规范形式：小写、正斜杠、去掉.md扩展名和首尾斜杠"""
+    key = target.replace('\\', '/').strip().strip('/').lower()
+    return key[:-3] if key.endswith('.md') else key
+
+class LinkGraph:
+    """链接图谱类
+
+    按Obsidian规则解析链接目标：带路径的目标按路径（后缀）匹配，否则按文件名匹配，
+    同名文档有多个时取路径最短的一个。
+    每个文档的链接按目标的文件名部分登记，新增或删除文档时只重新解析引用了该文件名的文档，
+    反向链接查询为一次字典查找。
+    """
+
+    snapshot_key = 'link_graph'  # 在文档库快照中的状态名
+    STATE_FIELDS = ('titles', 'tags', 'targets', 'names', 'referrers', 'outgoing', 'backlinks', 'unresolved')
+
+    def __init__(self, vault_path: str):
+        self.vault_path = vault_path
+        self.lock = threading.RLock()
+        self.titles = {}  # relative_path -> 标题
+        self.tags = {}  # relative_path -> 规范化标签
+        self.targets = {}  # relative_path -> [(目标, 类型)]
+        self.names = defaultdict(set)  # 文件名（小写，不含扩展名） -> 文档路径
+        self.referrers = defaultdict(set)  # 目标文件名 -> 引用该文件名的文档
+        self.outgoing = {}  # relative_path -> {'links': [...], 'embeds': [...], 'unresolved': [...]}
+        self.backlinks = defaultdict(dict)  # 目标文档 -> {来源文档: 类型}
+        self.unresolved = defaultdict(set)  # 未解析的目标（规范形式） -> 来源文档
+        self.generation = 0
+        self._exports = OrderedDict()  # 导出参数 -> 导出结果（当前版本）
+        self._exports_generation = None
+
+    @staticmethod
+    def _name(key: str) -> str:
+        """目标或路径的文件名部分"""
+        return key.rsplit('/', 1)[-1]
+
+    def _resolve(self, target: str) -> Optional[str]:
+        """解析链接目标，返回文档路径，无法解析时返回None"""
+        key = _target_key(target)
+        candidates = self.names.get(self._name(key))
+        if not candidates:
+            return None
+        if '/' in key:
+            candidates = [path for path in candidates
+                          if _target_key(path) == key or _target_key(path).endswith('/' + key)]
+            if not candidates:
+                return None
+        return min(candidates, key=lambda path: (path.count('/'), len(path), path))
+
+    def _unlink(self, source: str):
+        """移除文档的已解析链接"""
+        outgoing = self.outgoing.pop(source, None)
+        if outgoing is None:
+            return
+        for target in outgoing['links'] + outgoing['embeds']:
+            sources = self.backlinks.get(target)
+            if sources is not None:
+                sources.pop(source, None)
+                if not sources:
+                    del self.backlinks[target]
+        for target in outgoing['unresolved']:
+            key = _target_key(target)
+            sources = self.unresolved.get(key)
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self.unresolved[key]
+
+    def _link(self, source: str):
+        """解析文档的链接并登记反向链接"""
+        outgoing = {'links': [], 'embeds': [], 'unresolved': []}
+        for target, kind in self.targets.get(source, []):
+            resolved = self._resolve(target)
+            if resolved is None:
+                if kind == EMBED and os.path.splitext(target)[1].lower() not in ('', '.md'):
+                    # 嵌入的图片等附件不是文档，不算未解析链接
+                    continue
+                if target not in outgoing['unresolved']:
+                    outgoing['unresolved'].append(target)
+                    self.unresolved[_target_key(target)].add(source)
+                continue
+            outgoing['links' if kind == LINK else 'embeds'].append(resolved)
+            # 同一文档既链接又嵌入时记为链接
+            previous = self.backlinks[resolved].get(source)
+            if previous != LINK:
+                self.backlinks[resolved][source] = kind
+        self.outgoing[source] = outgoing
+
+    def _relink(self, sources: Set[str]):
+        """重新解析一组文档的链接"""
+        for source in sources:
+            if source in self.targets:
+                self._unlink(source)
+                self._link(source)
+
+    def _register(self, relative_path: str, document: Dict):
+        """登记文档本身及其链接目标"""
+        self.titles[relative_path] = document.get('title', '')
+        self.tags[relative_path] = document_tags(document)
+        targets = [(t, LINK) for t in document.get('wikilinks', [])]
+        targets += [(t, EMBED) for t in document.get('embeds', [])]
+        self.targets[relative_path] = targets
+        self.names[self._name(_target_key(relative_path))].add(relative_path)
+        for target, _ in targets:
+            self.referrers[self._name(_target_key(target))].add(relative_path)
+
+    def _unregister(self, relative_path: str):
+        """注销文档本身及其链接目标"""
+        self.titles.pop(relative_path, None)
+        self.tags.pop(relative_path, None)
+        for target, _ in self.targets.pop(relative_path, []):
+            name = self._name(_target_key(target))
+            referrers = self.referrers.get(name)
+            if referrers is not None:
+                referrers.discard(relative_path)
+                if not referrers:
+                    del self.referrers[name]
+        name = self._name(_target_key(relative_path))
+        paths = self.names.get(name)
+        if paths is not None:
+            paths.discard(relative_path)
+            if not paths:
+                del self.names[name]
+
+    def reset(self, documents: List[Dict]):
+        """按完整文档集合重建"""
+        with self.lock:
+            self.titles, self.tags, self.targets, self.outgoing = {}, {}, {}, {}
+            self.names, self.referrers = defaultdict(set), defaultdict(set)
+            self.backlinks, self.unresolved = defaultdict(dict), defaultdict(set)
+            for document in documents:
+                self._register(document['file_path'], document)
+            for relative_path in self.targets:
+                self._link(relative_path)
+            self.generation += 1
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """更新单个文档（document为None表示删除）"""
+        with self.lock:
+            existed = relative_path in self.targets
+            self._unlink(relative_path)
+            self._unregister(relative_path)
+            if document is not None:
+                self._register(relative_path, document)
+                self._link(relative_path)
+            if existed != (document is not None):
+                # 文档新增或删除会改变同名链接的解析结果
+                name = self._name(_target_key(relative_path))
+                self._relink(set(self.referrers.get(name, ())) - {relative_path})
+            self.generation += 1
+
+    def get_state(self) -> Dict:
+        """导出可写入文档库快照的状态（已解析的链接结构）"""
+        with self.lock:
+            return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    def restore_state(self, state: Dict):
+        """从文档库快照恢复，不重新解析链接"""
+        with self.lock:
+            for field in self.STATE_FIELDS:
+                setattr(self, field, state[field])
+            self.generation += 1
+
+    def _node(self, relative_path: str) -> Dict:
+        return {'file_path': relative_path, 'title': self.titles.get(relative_path, '')}
+
+    def get_backlinks(self, relative_path: str) -> Optional[Dict]:
+        """获取文档的反向链接和正向链接，文档不存在时返回None"""
+        with self.lock:
+            if relative_path not in self.targets:
+                return None
+            sources = self.backlinks.get(relative_path, {})
+            outgoing = self.outgoing.get(relative_path, {'links': [], 'embeds': [], 'unresolved': []})
+            return {
+                'file_path': relative_path,
+                'backlinks': [dict(self._node(source), type=kind) for source, kind in sorted(sources.items())],
+                'links': [self._node(path) for path in outgoing['links']],
+                'embeds': [self._node(path) for path in outgoing['embeds']],
+                'unresolved': list(outgoing['unresolved'])
+            }
+
+    def get_graph(self) -> Dict:
+        """获取完整图谱：节点、边（[来源, 目标, 类型]）和未解析链接"""
+        with self.lock:
+            edges = []
+            for source in sorted(self.outgoing):
+                outgoing = self.outgoing[source]
+                edges.extend([source, target, LINK] for target in outgoing['links'])
+                edges.extend([source, target, EMBED] for target in outgoing['embeds'])
+            return {
+                'nodes': [self._node(path) for path in sorted(self.titles)],
+                'edges': edges,
+                'unresolved': {key: sorted(sources) for key, sources in sorted(self.unresolved.items())}
+            }
+
+    def _has_tag(self, relative_path: str, tag: str) -> bool:
+        """文档是否带有指定标签（含嵌套子标签，如 a 匹配 a/b）"""
+        return any(t == tag or t.startswith(tag + '/') for t in self.tags.get(relative_path, []))
+
+    def export(self, folder: str = '', tag: Optional[str] = None, min_degree: int = 0,
+               max_degree: Optional[int] = None, include_embeds: bool = True) -> Dict:
+        """导出紧凑图谱（CSR邻接数组）
+
+        节点按路径排序并编号，节点i的出边为 targets[offsets[i]:offsets[i+1]]，kinds中0为链接、1为嵌入。
+        只保留folder目录下、带tag标签的节点以及它们之间的边；度数（子图内出度+入度）
+        不在[min_degree, max_degree]范围内的节点随后被去掉。同一版本下相同参数的结果会被复用。
+        """
+        # 与分面、统计一致：大小写、#前缀和首尾斜杠不影响匹配
+        tag = (normalize_tag(tag) or None) if tag else None
+        params = (folder, tag, min_degree, max_degree, include_embeds)
+        with self.lock:
+            if self._exports_generation != self.generation:
+                self._exports.clear()
+                self._exports_generation = self.generation
+            cached = self._exports.get(params)
+            if cached is not None:
+                self._exports.move_to_end(params)
+                return cached
+
+            prefix = folder.replace('\\', '/').strip('/')
+            prefix = prefix + '/' if prefix else ''
+            selected = [path for path in sorted(self.titles)
+                        if path.startswith(prefix) and (tag is None or self._has_tag(path, tag))]
+            chosen = set(selected)
+            adjacency = {}
+            for path in selected:
+                outgoing = self.outgoing.get(path, {})
+                edges = [(target, 0) for target in outgoing.get('links', []) if target in chosen]
+                if include_embeds:
+                    edges += [(target, 1) for target in outgoing.get('embeds', []) if target in chosen]
+                adjacency[path] = edges
+
+            if min_degree > 0 or max_degree is not None:
+                degree = Counter()
+                for path, edges in adjacency.items():
+                    degree[path] += len(edges)
+                    for target, _ in edges:
+                        degree[target] += 1
+                selected = [path for path in selected if degree[path] >= min_degree
+                            and (max_degree is None or degree[path] <= max_degree)]
+
+            ids = {path: i for i, path in enumerate(selected)}
+            offsets, targets, kinds = array('I', [0]), array('I'), array('B')
+            for path in selected:
+                for target, kind in adjacency[path]:
+                    target_id = ids.get(target)
+                    if target_id is not None:
+                        targets.append(target_id)
+                        kinds.append(kind)
+                offsets.append(len(targets))
+
+            result = {
+                'paths': selected,
+                'titles': [self.titles.get(path, '') for path in selected],
+                'offsets': offsets,
+                'targets': targets,
+                'kinds': kinds
+            }
+            self._exports[params] = result
+            while len(self._exports) > 8:
+                self._exports.popitem(last=False)
+            return result
+
+    def get_stats(self) -> Dict:
+        """获取图谱规模"""
+        with self.lock:
+            return {
+                'nodes': len(self.titles),
+                'edges': sum(len(o['links']) + len(o['embeds']) for o in self.outgoing.values()),
+                'unresolved': len(self.unresolved),
+                'orphans': sum(1 for path in self.titles
+                               if path not in self.backlinks and not any(self.outgoing.get(path, {}).values()))
+            }
+
+def encode_graph_json(export: Dict) -> Dict:
+    """紧凑图谱的JSON形式"""
+    return {
+        'nodes': export['paths'],
+        'titles': export['titles'],
+        'offsets': export['offsets'].tolist(),
+        'targets': export['targets'].tolist(),
+        'kinds': export['kinds'].tolist()
+    }
+
+def encode_graph_binary(export: Dict) -> bytes:
+    """紧凑图谱的二进制形式（格式见GRAPH_HEADER），头部长度为4的倍数，数组可直接映射为类型化数组"""
+    nodes = json.dumps({'nodes': export['paths'], 'titles': export['titles']},
+                       ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    offsets, targets, kinds = export['offsets'], export['targets'], export['kinds']
+    if struct.pack('=H', 1) != struct.pack('<H', 1):  # 大端机器上转换为小端
+        offsets, targets = array(offsets.typecode, offsets), array(targets.typecode, targets)
+        offsets.byteswap()
+        targets.byteswap()
+    header = GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_FORMAT_VERSION, 1, 0,
+                               len(export['paths']), len(targets), len(nodes))
+    return b''.join([header, offsets.tobytes(), targets.tobytes(), kinds.tobytes(), nodes])
+
+# 进程内共享的图谱实例，按文档库路径区分
+_graphs: Dict[str, LinkGraph] = {}
+_graphs_lock = threading.Lock()
+
+def get_link_graph(vault_path: str) -> LinkGraph:
+    """获取文档库对应的链接图谱"""
+    key = os.path.abspath(vault_path)
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is None:
+            graph = LinkGraph(vault_path)
+            _graphs[key] = graph
+        return graph
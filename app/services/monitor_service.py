@@ -4,24 +4,94 @@
 
 import os
 import time
+import sqlite3
+import hashlib
+import weakref
 import threading
 import logging
 from datetime import datetime
-from typing import Dict, List, Set, Callable, Any
+from typing import Dict, List, Set, Callable, Any, Optional, Tuple
 from pathlib import Path
 from flask import current_app
+from app.services.vault_index import get_vault_index
+from app.services.vault_walker import VaultWalker
+from app.services.inotify_watcher import (
+    InotifyWatcher, inotify_available, IN_CREATE, IN_DELETE_SELF, IN_ISDIR,
+    IN_MOVE_SELF, IN_MOVED_FROM, IN_MOVED_TO, IN_Q_OVERFLOW
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，每个进程各自监控
+    fcntl = None
+
+class ChangeSet:
+    """文档变更集合（路径均相对于文档库根目录）"""
+    
+    def __init__(self, vault_path: str, added: List[str] = None,
+                 modified: List[str] = None, deleted: List[str] = None,
+                 rescan: bool = False):
+        self.vault_path = vault_path
+        self.added = added or []
+        self.modified = modified or []
+        self.deleted = deleted or []
+        # 无法确定具体变更（首次扫描、事件丢失等）时要求消费方完整重新扫描
+        self.rescan = rescan
+    
+    def is_empty(self) -> bool:
+        """是否没有任何变更"""
+        return not (self.added or self.modified or self.deleted or self.rescan)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'vault_path': self.vault_path,
+            'added': self.added,
+            'modified': self.modified,
+            'deleted': self.deleted,
+            'rescan': self.rescan
+        }
+    
+    def __repr__(self):
+        return (f"ChangeSet(added={len(self.added)}, modified={len(self.modified)}, "
+                f"deleted={len(self.deleted)}, rescan={self.rescan})")
 
 class DocumentMonitor:
-    """文档监控器"""
+    """文档监控器
+    
+    backend可选：
+    - polling: 定时遍历文档库比较修改时间
+    - inotify: 通过Linux inotify接收变更事件，空闲时不占用CPU
+    - auto: 支持inotify时使用inotify，否则使用轮询
+    """
     
-    def __init__(self, vault_path: str, callback: Callable = None):
+    BACKENDS = ('auto', 'inotify', 'polling')
+    
+    def __init__(self, vault_path: str, callback: Callable[[ChangeSet], None] = None,
+                 backend: str = 'auto', walker: Optional[VaultWalker] = None):
         self.vault_path = vault_path
         self.callback = callback
         self.running = False
         self.monitor_thread = None
         self.last_scan_time = 0
-        self.file_timestamps = {}
-        self.exclude_patterns = ['.git', '.obsidian', 'node_modules', '__pycache__', '.DS_Store']
+        self.file_timestamps = {}  # 绝对路径 -> mtime_ns
+        self.initialized = False  # 首次扫描只建立基线
+        self.walker = walker or VaultWalker(vault_path)
+        self.debounce = 0.05  # 收到事件后等待同一批写入完成的时间（秒）
+        self.backend = self._select_backend(backend)
+    
+    @staticmethod
+    def _select_backend(backend: str) -> str:
+        """确定实际使用的监控方式"""
+        if backend not in DocumentMonitor.BACKENDS:
+            logging.warning(f"未知的监控方式 {backend}，使用auto")
+            backend = 'auto'
+        if backend == 'auto':
+            return 'inotify' if inotify_available() else 'polling'
+        if backend == 'inotify' and not inotify_available():
+            logging.warning("当前系统不支持inotify，改用轮询")
+            return 'polling'
+        return backend
         
     def start(self):
         """启动监控"""
@@ -29,9 +99,10 @@ class DocumentMonitor:
             return
         
         self.running = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        target = self._inotify_loop if self.backend == 'inotify' else self._monitor_loop
+        self.monitor_thread = threading.Thread(target=target, daemon=True)
         self.monitor_thread.start()
-        logging.info(f"文档监控已启动: {self.vault_path}")
+        logging.info(f"文档监控已启动 ({self.backend}): {self.vault_path}")
     
     def stop(self):
         """停止监控"""
@@ -50,55 +121,353 @@ class DocumentMonitor:
                 logging.error(f"监控循环错误: {e}")
                 time.sleep(10)  # 出错时等待更长时间
     
-    def _check_for_changes(self):
-        """检查文件变更"""
-        if not os.path.exists(self.vault_path):
+    def _inotify_loop(self):
+        """inotify事件循环，无法使用inotify时退回轮询"""
+        try:
+            watcher = InotifyWatcher()
+        except OSError as e:
+            logging.warning(f"初始化inotify失败，改用轮询: {e}")
+            self.backend = 'polling'
+            self._monitor_loop()
+            return
+        
+        # 完整扫描只在事件丢失时执行，必须精确，不能跳过未变化的目录
+        self.walker.trust_dir_mtime = False
+        try:
+            # 先注册监听再建立基线，两者之间的变更不会丢失
+            watcher.add_tree(self.vault_path, self.walker.is_excluded)
+            self._check_for_changes()
+            while self.running:
+                events = watcher.read_events(0.5)
+                if not events:
+                    continue
+                # 编辑器保存通常产生多个事件，稍等片刻合并为一批
+                time.sleep(self.debounce)
+                events.extend(watcher.read_events(0))
+                self._apply_events(watcher, events)
+        except Exception as e:
+            # 例如超出 fs.inotify.max_user_watches 限制
+            logging.error(f"inotify监控失败，改用轮询: {e}")
+            self.backend = 'polling'
+            watcher.close()
+            self._monitor_loop()
             return
+        watcher.close()
+    
+    def _apply_events(self, watcher: InotifyWatcher, events: List[Tuple[str, int, str]]) -> ChangeSet:
+        """把一批inotify事件转换为变更集合"""
+        touched = set()
+        full_scan = False
+        for directory, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，具体变更未知
+                full_scan = True
+                continue
+            if not directory:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if path == self.vault_path:
+                    full_scan = True
+                continue
+            if mask & IN_ISDIR:
+                if self.walker.is_excluded(name):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    watcher.add_tree(path, self.walker.is_excluded)
+                elif mask & IN_MOVED_FROM:
+                    watcher.remove_tree(path)
+                # 目录整体移入/移出时不会收到其中文件的事件
+                full_scan = True
+                continue
+            if self.walker.is_document(name):
+                touched.add(path)
+        
+        if full_scan:
+            logging.info("inotify无法确定具体变更，重新扫描文档库")
+            watcher.add_tree(self.vault_path, self.walker.is_excluded)
+            return self._check_for_changes()
+        
+        changes = ChangeSet(self.vault_path)
+        for file_path in sorted(touched):
+            relative_path = os.path.relpath(file_path, self.vault_path)
+            previous = self.file_timestamps.get(file_path)
+            try:
+                mtime = os.stat(file_path).st_mtime_ns
+            except OSError:
+                if previous is not None:
+                    del self.file_timestamps[file_path]
+                    changes.deleted.append(relative_path)
+                    logging.info(f"检测到文件删除: {file_path}")
+                continue
+            if previous == mtime:
+                continue
+            self.file_timestamps[file_path] = mtime
+            if previous is None:
+                changes.added.append(relative_path)
+            else:
+                changes.modified.append(relative_path)
+                logging.info(f"检测到文件变更: {file_path}")
+        self._emit(changes)
+        return changes
+    
+    def _emit(self, changes: ChangeSet):
+        """有变更时调用回调函数"""
+        if not changes.is_empty() and self.callback:
+            try:
+                self.callback(changes)
+            except Exception as e:
+                logging.error(f"回调函数执行失败: {e}")
+    
+    def _check_for_changes(self) -> ChangeSet:
+        """检查文件变更，返回变更集合"""
+        changes = ChangeSet(self.vault_path, rescan=not self.initialized)
+        self.initialized = True
+        if not os.path.exists(self.vault_path):
+            return changes
         
         current_files = set()
-        changes_detected = False
         
-        # 扫描当前文件
-        for root, dirs, files in os.walk(self.vault_path):
-            # 跳过排除的目录
-            dirs[:] = [d for d in dirs if not any(pattern in d for pattern in self.exclude_patterns)]
+        # 扫描当前文件（trust_dir_mtime时跳过未变化的目录）
+        for vault_file in self.walker.walk():
+            file_path = vault_file.path
+            current_files.add(file_path)
             
-            for file in files:
-                if file.endswith(('.md', '.markdown')):
-                    file_path = os.path.join(root, file)
-                    current_files.add(file_path)
-                    
-                    # 检查文件时间戳
-                    try:
-                        mtime = os.path.getmtime(file_path)
-                        if file_path not in self.file_timestamps or self.file_timestamps[file_path] != mtime:
-                            self.file_timestamps[file_path] = mtime
-                            changes_detected = True
-                            logging.info(f"检测到文件变更: {file_path}")
-                    except OSError:
-                        pass
+            # 检查文件时间戳
+            previous = self.file_timestamps.get(file_path)
+            if previous != vault_file.mtime_ns:
+                self.file_timestamps[file_path] = vault_file.mtime_ns
+                if previous is None:
+                    changes.added.append(vault_file.relative_path)
+                else:
+                    changes.modified.append(vault_file.relative_path)
+                    logging.info(f"检测到文件变更: {file_path}")
         
         # 检查删除的文件
         deleted_files = set(self.file_timestamps.keys()) - current_files
-        if deleted_files:
-            for file_path in deleted_files:
-                del self.file_timestamps[file_path]
-                changes_detected = True
-                logging.info(f"检测到文件删除: {file_path}")
+        for file_path in deleted_files:
+            del self.file_timestamps[file_path]
+            changes.deleted.append(os.path.relpath(file_path, self.vault_path))
+            logging.info(f"检测到文件删除: {file_path}")
         
         # 如果有变更，调用回调函数
-        if changes_detected and self.callback:
+        self._emit(changes)
+        
+        return changes
+
+class VaultEventLog:
+    """文档变更事件日志
+    
+    主监控进程把变更写入cache_dir下的SQLite文件，其他进程按序号增量读取，
+    读取成本与文档库大小无关。
+    """
+    
+    max_events = 10000  # 保留的事件条数，落后更多的读取方需要完整重新扫描
+    
+    def __init__(self, vault_path: str, cache_dir: str = './cache'):
+        self.vault_path = vault_path
+        self.cache_dir = cache_dir
+        vault_hash = hashlib.sha1(os.path.abspath(vault_path).encode('utf-8')).hexdigest()[:12]
+        self.db_path = os.path.join(cache_dir, f'events-{vault_hash}.sqlite3')
+        self.lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接（fork后重新建立连接）"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, path TEXT, source INTEGER, created REAL)'
+            )
+            self._conn.commit()
+        return self._conn
+    
+    def publish(self, changes: ChangeSet):
+        """写入一组变更"""
+        now = time.time()
+        source = os.getpid()
+        if changes.rescan:
+            rows = [('rescan', '', source, now)]
+        else:
+            rows = ([('added', p, source, now) for p in changes.added] +
+                    [('modified', p, source, now) for p in changes.modified] +
+                    [('deleted', p, source, now) for p in changes.deleted])
+        with self.lock:
+            conn = self._connect()
+            conn.executemany('INSERT INTO events (kind, path, source, created) VALUES (?, ?, ?, ?)', rows)
+            conn.execute(
+                'DELETE FROM events WHERE seq <= (SELECT MAX(seq) FROM events) - ?',
+                (self.max_events,)
+            )
+            conn.commit()
+    
+    def latest_seq(self) -> int:
+        """获取最新事件序号"""
+        with self.lock:
+            row = self._connect().execute('SELECT MAX(seq) FROM events').fetchone()
+        return row[0] or 0
+    
+    def read_since(self, seq: int) -> Tuple[ChangeSet, int]:
+        """读取序号之后其他进程写入的事件，返回合并后的变更和最新序号"""
+        changes = ChangeSet(self.vault_path)
+        with self.lock:
+            conn = self._connect()
+            oldest = conn.execute('SELECT MIN(seq) FROM events').fetchone()[0]
+            rows = conn.execute(
+                'SELECT seq, kind, path, source FROM events WHERE seq > ? ORDER BY seq', (seq,)
+            ).fetchall()
+        
+        if oldest is not None and oldest > seq + 1 and seq > 0:
+            # 中间的事件已被清理，无法增量更新
+            changes.rescan = True
+        for row_seq, kind, path, source in rows:
+            seq = row_seq
+            if source == os.getpid():
+                continue
+            if kind == 'rescan':
+                changes.rescan = True
+            elif kind in ('added', 'modified', 'deleted'):
+                getattr(changes, kind).append(path)
+        return changes, seq
+
+class VaultWatcher:
+    """文档库监视器（每台主机一个主监控进程）
+    
+    各进程通过文件锁竞选：获得锁的进程运行DocumentMonitor并把变更写入事件日志，
+    其他进程只轮询事件日志。主进程退出后锁自动释放，由其他进程接替。
+    """
+    
+    def __init__(self, vault_path: str, callback: Callable[[ChangeSet], None],
+                 cache_dir: str = './cache', poll_interval: float = 1.0,
+                 backend: str = 'auto', walker: Optional[VaultWalker] = None):
+        self.vault_path = vault_path
+        self.callback = callback
+        self.cache_dir = cache_dir
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.walker = walker
+        self.event_log = VaultEventLog(vault_path, cache_dir)
+        vault_hash = hashlib.sha1(os.path.abspath(vault_path).encode('utf-8')).hexdigest()[:12]
+        self.lock_path = os.path.join(cache_dir, f'watcher-{vault_hash}.lock')
+        self.lock_file = None
+        self.monitor = None
+        self.last_seq = 0
+        self.running = False
+        self.thread = None
+    
+    @property
+    def role(self) -> str:
+        """当前进程的角色"""
+        return 'leader' if self.monitor else 'follower'
+    
+    @property
+    def active_backend(self) -> Optional[str]:
+        """主监控进程实际使用的监控方式"""
+        return self.monitor.backend if self.monitor else None
+    
+    def start(self):
+        """启动监视"""
+        if self.running:
+            return
+        self.running = True
+        try:
+            self.last_seq = self.event_log.latest_seq()
+        except Exception as e:
+            logging.warning(f"读取变更事件失败: {e}")
+        self._try_lead()
+        self.thread = threading.Thread(target=self._follow_loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止监视并释放主监控锁"""
+        self.running = False
+        if self.monitor:
+            self.monitor.stop()
+            self.monitor = None
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        self._release_lock()
+    
+    def _try_lead(self) -> bool:
+        """尝试成为主监控进程"""
+        if self.monitor:
+            return True
+        if fcntl is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (OSError, IOError):
+                lock_file.close()
+                return False
+            self.lock_file = lock_file
+        
+        self.monitor = DocumentMonitor(self.vault_path, self._on_local_changes, self.backend, self.walker)
+        self.monitor.start()
+        logging.info(f"当前进程 {os.getpid()} 成为主监控进程: {self.vault_path}")
+        return True
+    
+    def _release_lock(self):
+        """释放主监控锁"""
+        if self.lock_file is not None:
             try:
-                self.callback()
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            except (OSError, IOError):
+                pass
+            self.lock_file.close()
+            self.lock_file = None
+    
+    def _on_local_changes(self, changes: ChangeSet):
+        """主监控进程检测到变更：本进程直接处理，并发布给其他进程"""
+        self.callback(changes)
+        try:
+            self.event_log.publish(changes)
+        except Exception as e:
+            logging.error(f"发布变更事件失败: {e}")
+    
+    def publish_rescan(self):
+        """通知所有进程完整重新扫描"""
+        self.event_log.publish(ChangeSet(self.vault_path, rescan=True))
+    
+    def _follow_loop(self):
+        """轮询事件日志，并在主监控进程退出后接替"""
+        while self.running:
+            try:
+                if not self.monitor:
+                    self._try_lead()
+                changes, seq = self.event_log.read_since(self.last_seq)
+                self.last_seq = seq
+                if not changes.is_empty():
+                    self.callback(changes)
             except Exception as e:
-                logging.error(f"回调函数执行失败: {e}")
+                logging.error(f"读取变更事件失败: {e}")
+            time.sleep(self.poll_interval)
+    
+    def after_fork(self):
+        """fork出的子进程中重置状态（线程不会被继承），以跟随者身份重新启动"""
+        if self.lock_file is not None:
+            # 关闭继承的文件描述符不会释放父进程持有的锁
+            self.lock_file.close()
+            self.lock_file = None
+        self.monitor = None
+        self.thread = None
+        self.running = False
+        self.event_log = VaultEventLog(self.vault_path, self.cache_dir)
+        self.start()
 
 class MonitorService:
     """监控服务类"""
     
     def __init__(self):
-        self.monitors = {}
+        self.monitors = {}  # vault_path -> VaultWatcher
         self.config_service = None
+        _services.add(self)
         
     def initialize(self, config_service):
         """初始化监控服务"""
@@ -111,29 +480,40 @@ class MonitorService:
         if vault_path in self.monitors:
             self.stop_monitoring(vault_path)
         
-        def refresh_callback():
-            """文档变更回调函数"""
+        vault_index = get_vault_index(vault_path)
+        
+        def refresh_callback(changes: ChangeSet):
+            """文档变更回调函数，将变更交给文档索引增量处理"""
             try:
-                # 清除缓存（如果有的话）
-                if current_app and hasattr(current_app, 'cache'):
-                    current_app.cache.clear()
-                
-                logging.info("文档库已更新，缓存已清除")
-                
+                vault_index.apply_changes(changes)
+                logging.info(f"文档库已更新: {changes}")
             except Exception as e:
                 logging.error(f"处理文档变更失败: {e}")
         
-        monitor = DocumentMonitor(vault_path, refresh_callback)
-        monitor.start()
-        self.monitors[vault_path] = monitor
+        cache_dir = './cache'
+        poll_interval = 1.0
+        backend = 'auto'
+        trust_dir_mtime = False
+        if self.config_service:
+            cache_dir = self.config_service.get('cache_dir', cache_dir)
+            poll_interval = self.config_service.get('watcher_poll_interval', poll_interval)
+            backend = self.config_service.get('monitor_backend', backend)
+            trust_dir_mtime = self.config_service.get('trust_dir_mtime', trust_dir_mtime)
+        walker = VaultWalker.from_config(vault_path, self.config_service, trust_dir_mtime)
         
-        logging.info(f"开始监控文档库: {vault_path}")
+        watcher = VaultWatcher(vault_path, refresh_callback, cache_dir, poll_interval, backend, walker)
+        watcher.start()
+        self.monitors[vault_path] = watcher
+        vault_index.monitored = True
+        
+        logging.info(f"开始监控文档库: {vault_path} ({watcher.role})")
     
     def stop_monitoring(self, vault_path: str):
         """停止监控指定路径"""
         if vault_path in self.monitors:
             self.monitors[vault_path].stop()
             del self.monitors[vault_path]
+            get_vault_index(vault_path).monitored = False
             logging.info(f"停止监控文档库: {vault_path}")
     
     def stop_all(self):
@@ -146,7 +526,10 @@ class MonitorService:
         status = {
             'monitoring': len(self.monitors) > 0,
             'monitored_paths': list(self.monitors.keys()),
-            'active_monitors': len(self.monitors)
+            'active_monitors': len(self.monitors),
+            'roles': {path: watcher.role for path, watcher in self.monitors.items()},
+            'backends': {path: watcher.active_backend for path, watcher in self.monitors.items()},
+            'pid': os.getpid()
         }
         
         if self.config_service:
@@ -167,9 +550,10 @@ class MonitorService:
             if self.config_service:
                 vault_path = self.config_service.get('obsidian_vault_path')
                 if vault_path and os.path.exists(vault_path):
-                    # 清除缓存
-                    if current_app and hasattr(current_app, 'cache'):
-                        current_app.cache.clear()
+                    # 丢弃内存索引，下次请求时重新扫描，并通知其他进程
+                    get_vault_index(vault_path).invalidate()
+                    if vault_path in self.monitors:
+                        self.monitors[vault_path].publish_rescan()
                     
                     result['success'] = True
                     result['message'] = f'文档库已刷新: {vault_path}'
@@ -182,4 +566,22 @@ class MonitorService:
             result['message'] = f'刷新失败: {str(e)}'
             logging.error(f"强制刷新失败: {e}")
         
-        return result 
\ No newline at end of file
+        return result 
+    
+    def after_fork(self):
+        """fork后在子进程中重新启动监视"""
+        for watcher in self.monitors.values():
+            watcher.after_fork()
+
+# 已创建的监控服务，fork后需要在子进程中重新启动（如gunicorn preload_app）
+_services = weakref.WeakSet()
+
+def _restart_after_fork():
+    for service in list(_services):
+        try:
+            service.after_fork()
+        except Exception as e:
+            logging.error(f"子进程重新启动监控失败: {e}")
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
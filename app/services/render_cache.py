@@ -0,0 +1,200 @@
+"""
+渲染缓存 - 按Markdown内容哈希缓存渲染后的HTML，内存LRU淘汰并可选落盘（磁盘按修改时间淘汰）
+"""
+
+import os
+import sys
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 磁盘缓存超出上限时清理到上限的该比例，避免每次写入都遍历目录
+DISK_PRUNE_RATIO = 0.9
+
+class RenderCache:
+    """HTML渲染缓存类
+
+    键为Markdown内容与渲染配置的哈希，内容不变即可复用，与文件路径无关。
+    内存部分按 max_bytes 做LRU淘汰；设置 disk_dir 时渲染结果同时写入磁盘，
+    工作进程重启后可以直接读取。磁盘部分按 disk_max_bytes 限制总大小，读取命中时
+    更新文件修改时间，超出上限时删除修改时间最早（最久未使用）的文件。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_bytes = None  # 磁盘部分的估计大小，首次写入时统计（其他进程的写入在清理时重新统计）
+        self.disk_evictions = 0
+        self.entries = OrderedDict()  # key -> html
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()  # 清理磁盘时不阻塞内存读取
+
+    @staticmethod
+    def make_key(markdown_content: str, fingerprint: str) -> str:
+        """根据Markdown内容和渲染配置指纹生成缓存键"""
+        digest = hashlib.sha256(fingerprint.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(markdown_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """获取渲染结果，未命中返回None"""
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = self._read_disk(key)
+        with self.lock:
+            if html is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, html)
+            return html
+
+    def put(self, key: str, html: str):
+        """写入渲染结果"""
+        with self.lock:
+            self._insert(key, html)
+        self._write_disk(key, html)
+
+    def _insert(self, key: str, html: str):
+        """写入内存并按预算淘汰最久未使用的条目"""
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= sys.getsizeof(old)
+        self.entries[key] = html
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= sys.getsizeof(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        """磁盘缓存文件路径（按前两位分目录）"""
+        return os.path.join(self.disk_dir, key[:2], f'{key}.html')
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        """从磁盘读取渲染结果"""
+        if not self.disk_dir:
+            return None
+        try:
+            path = self._disk_path(key)
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+            # 修改时间记录最近使用时间，清理时保留最近读取过的结果
+            os.utime(path)
+            return html
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"读取渲染缓存失败 {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, html: str):
+        """将渲染结果写入磁盘（先写临时文件再替换）"""
+        if not self.disk_dir:
+            return
+        data = html.encode('utf-8')
+        if len(data) > self.disk_max_bytes:
+            return
+        try:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"写入渲染缓存失败 {key}: {e}")
+            return
+
+        with self.disk_lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self.disk_bytes += len(data)
+            if self.disk_bytes > self.disk_max_bytes:
+                self._prune_disk()
+
+    def _scan_disk(self) -> List[Tuple[int, int, str]]:
+        """列出磁盘缓存文件 [(修改时间, 大小, 路径)]"""
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith('.html'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        return files
+
+    def _prune_disk(self):
+        """按修改时间从旧到新删除磁盘缓存文件，直到总大小不超过上限的DISK_PRUNE_RATIO"""
+        files = sorted(self._scan_disk())
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * DISK_PRUNE_RATIO
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # 已被其他进程清理
+            except OSError as e:
+                logging.warning(f"清理渲染缓存失败 {path}: {e}")
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self.disk_bytes = total
+
+    def clear(self):
+        """清空内存缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """获取缓存状态"""
+        return {
+            'entries': len(self.entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'disk_dir': self.disk_dir,
+            'disk_bytes': self.disk_bytes,
+            'disk_max_bytes': self.disk_max_bytes,
+            'disk_evictions': self.disk_evictions
+        }
+
+# 进程内共享的渲染缓存
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+def get_render_cache(max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                     disk_max_bytes: int = 256 * 1024 * 1024) -> RenderCache:
+    """获取进程内共享的渲染缓存，配置变化时重新创建"""
+    global _render_cache
+    with _render_cache_lock:
+        if (_render_cache is None or _render_cache.max_bytes != max_bytes
+                or _render_cache.disk_dir != disk_dir or _render_cache.disk_max_bytes != disk_max_bytes):
+            _render_cache = RenderCache(max_bytes, disk_dir, disk_max_bytes)
+        return _render_cache
@@ -0,0 +1,357 @@
+"""
+全文搜索索引 - 基于jieba分词的倒排索引，支持AND/OR、短语匹配和BM25排序
+"""
+
+import gc
+import os
+import re
+import math
+import time
+import heapq
+import pickle
+import bisect
+import hashlib
+import logging
+import threading
+import jieba
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.facet_index import document_tags
+
+# 索引结构或分词规则变化时递增，旧索引文件会被丢弃
+SEARCH_INDEX_VERSION = 2
+
+# 不同字段之间的位置间隔，避免短语跨字段匹配
+FIELD_GAP = 16
+
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text: str) -> List[str]:
+    """分词（与AnalysisService一致使用jieba），返回小写词元"""
+    return [
+        token.lower() for token in jieba.cut(text)
+        if any(ch.isalnum() for ch in token)
+    ]
+
+class SearchIndex:
+    """倒排索引类
+
+    查询语法：
+    - 空格分隔的词默认为AND
+    - OR 或 | 分隔多个分组
+    - "双引号" 表示短语
+    - 以 * 结尾的词表示前缀匹配
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, vault_path: str, cache_dir: str = './cache', save_interval: int = 30):
+        self.vault_path = os.path.abspath(vault_path)
+        self.cache_dir = cache_dir
+        self.save_interval = save_interval
+        self.index_path = self._get_index_path()
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.last_save = 0
+        self.loaded = False  # 磁盘上的索引在第一次查询时才加载
+        self._deferred = []  # 加载前收到的 reset/update，加载后依次应用
+        self._clear()
+
+    def _get_index_path(self) -> str:
+        """获取索引文件路径（每个文档库一个文件）"""
+        vault_hash = hashlib.sha1(self.vault_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f'search-{vault_hash}.pickle')
+
+    def _clear(self):
+        """清空索引结构"""
+        self.doc_ids = {}  # relative_path -> doc_id
+        self.doc_info = {}  # doc_id -> (relative_path, signature, length)
+        self.doc_terms = {}  # doc_id -> 文档包含的词元
+        self.postings = {}  # term -> {doc_id: [positions]}
+        self.total_length = 0
+        self.next_id = 0
+        self._sorted_terms = None
+
+    def _load(self):
+        """从磁盘加载索引"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            # 倒排表由大量小容器组成，反序列化期间暂停循环垃圾回收
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                with open(self.index_path, 'rb') as f:
+                    state = pickle.load(f)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            if state.get('version') != SEARCH_INDEX_VERSION or state.get('vault_path') != self.vault_path:
+                return
+            with self.lock:
+                self.doc_ids = state['doc_ids']
+                self.doc_info = state['doc_info']
+                self.doc_terms = state['doc_terms']
+                self.postings = state['postings']
+                self.total_length = state['total_length']
+                self.next_id = state['next_id']
+            logging.info(f"已加载搜索索引 {len(self.doc_ids)} 篇文档: {self.index_path}")
+        except Exception as e:
+            logging.warning(f"加载搜索索引失败，将重新建立: {e}")
+            self._clear()
+
+    def _ensure_loaded(self):
+        """加载磁盘上的索引，并应用加载前收到的文档变更"""
+        with self.lock:
+            if self.loaded:
+                return
+            self._load()
+            self.loaded = True
+            deferred, self._deferred = self._deferred, []
+            for operation, *args in deferred:
+                getattr(self, operation)(*args)
+
+    def save(self, force: bool = False):
+        """保存索引到磁盘（默认按save_interval节流）"""
+        with self.lock:
+            if not self.dirty:
+                return
+            if not force and time.time() - self.last_save < self.save_interval:
+                return
+            state = {
+                'version': SEARCH_INDEX_VERSION,
+                'vault_path': self.vault_path,
+                'doc_ids': self.doc_ids,
+                'doc_info': self.doc_info,
+                'doc_terms': self.doc_terms,
+                'postings': self.postings,
+                'total_length': self.total_length,
+                'next_id': self.next_id
+            }
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.index_path)
+                self.dirty = False
+                self.last_save = time.time()
+            except Exception as e:
+                logging.error(f"保存搜索索引失败: {e}")
+
+    @staticmethod
+    def _signature(document: Dict) -> Tuple:
+        """文档版本标识，用于判断是否需要重新分词"""
+        return (document.get('modified_time'), document.get('size'))
+
+    def reset(self, documents: List[Dict]):
+        """按完整文档集合同步索引，只重新分词有变化的文档"""
+        with self.lock:
+            if not self.loaded:
+                self._deferred = [('reset', documents)]
+                return
+            current = set()
+            for document in documents:
+                relative_path = document['file_path']
+                current.add(relative_path)
+                doc_id = self.doc_ids.get(relative_path)
+                if doc_id is not None and self.doc_info[doc_id][1] == self._signature(document):
+                    continue
+                self.update(relative_path, document)
+            for relative_path in [p for p in self.doc_ids if p not in current]:
+                self.update(relative_path, None)
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """更新单个文档（document为None表示删除）"""
+        with self.lock:
+            if not self.loaded:
+                self._deferred.append(('update', relative_path, document))
+                return
+            self._remove(relative_path)
+            if document is not None:
+                self._add(relative_path, document)
+            self.dirty = True
+
+    def _add(self, relative_path: str, document: Dict):
+        """将文档加入索引"""
+        doc_id = self.next_id
+        self.next_id += 1
+
+        positions = {}
+        position = 0
+        fields = [document.get('title', ''), ' '.join(document_tags(document)), document.get('content', '')]
+        for field in fields:
+            for token in tokenize(str(field)):
+                positions.setdefault(token, []).append(position)
+                position += 1
+            position += FIELD_GAP
+
+        for term, term_positions in positions.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._sorted_terms = None
+            postings[doc_id] = term_positions
+
+        length = sum(len(p) for p in positions.values())
+        self.doc_ids[relative_path] = doc_id
+        self.doc_info[doc_id] = (relative_path, self._signature(document), length)
+        self.doc_terms[doc_id] = list(positions)
+        self.total_length += length
+
+    def _remove(self, relative_path: str):
+        """从索引中移除文档"""
+        doc_id = self.doc_ids.pop(relative_path, None)
+        if doc_id is None:
+            return
+        _, _, length = self.doc_info.pop(doc_id)
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id, []):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                self._sorted_terms = None
+
+    def parse_query(self, query: str) -> List[List[Tuple[str, List[str]]]]:
+        """解析查询语句，返回 [分组[子句(类型, 词元)]]，分组之间为OR，子句之间为AND"""
+        groups = [[]]
+        for match in QUERY_PATTERN.finditer(query):
+            phrase, word = match.group(1), match.group(2)
+            if word in ('OR', '|'):
+                groups.append([])
+                continue
+            if phrase is not None:
+                tokens = tokenize(phrase)
+                if tokens:
+                    groups[-1].append(('phrase', tokens))
+            elif word.endswith('*') and len(word) > 1:
+                groups[-1].append(('prefix', [word[:-1].lower()]))
+            else:
+                tokens = tokenize(word)
+                if len(tokens) == 1:
+                    groups[-1].append(('term', tokens))
+                elif tokens:
+                    # 单个词被切分为多个词元时按短语处理
+                    groups[-1].append(('phrase', tokens))
+        return [group for group in groups if group]
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """获取以prefix开头的所有词元"""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        terms = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _match_clause(self, kind: str, tokens: List[str], scoring_terms: Set[str]) -> Set[int]:
+        """匹配单个子句，返回命中的文档ID"""
+        if kind == 'prefix':
+            matched = set()
+            for term in self._expand_prefix(tokens[0]):
+                matched.update(self.postings[term])
+                scoring_terms.add(term)
+            return matched
+
+        scoring_terms.update(tokens)
+        postings_list = [self.postings.get(token) for token in tokens]
+        if not all(postings_list):
+            return set()
+        smallest = min(postings_list, key=len)
+        matched = set(smallest)
+        for postings in postings_list:
+            if postings is not smallest:
+                matched.intersection_update(postings)
+        if kind == 'phrase' and len(tokens) > 1:
+            matched = {doc_id for doc_id in matched if self._has_phrase(doc_id, postings_list)}
+        return matched
+
+    @staticmethod
+    def _has_phrase(doc_id: int, postings_list: List[Dict]) -> bool:
+        """检查文档中是否存在连续出现的词元序列"""
+        following = [set(postings[doc_id]) for postings in postings_list[1:]]
+        for start in postings_list[0][doc_id]:
+            if all(start + offset + 1 in positions for offset, positions in enumerate(following)):
+                return True
+        return False
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """搜索文档，返回按BM25得分排序的 (相对路径, 得分)"""
+        with self.lock:
+            self._ensure_loaded()
+            groups = self.parse_query(query)
+            if not groups or not self.doc_ids:
+                return []
+
+            matched = set()
+            scoring_terms = set()
+            for group in groups:
+                group_matched = None
+                for kind, tokens in group:
+                    clause_matched = self._match_clause(kind, tokens, scoring_terms)
+                    group_matched = clause_matched if group_matched is None else group_matched & clause_matched
+                    if not group_matched:
+                        break
+                if group_matched:
+                    matched |= group_matched
+
+            if not matched:
+                return []
+
+            scores = self._score(matched, scoring_terms)
+            key = lambda item: (item[1], item[0])
+            if limit:
+                ranked = heapq.nlargest(limit, scores.items(), key=key)
+            else:
+                ranked = sorted(scores.items(), key=key, reverse=True)
+            return [(self.doc_info[doc_id][0], round(score, 4)) for doc_id, score in ranked]
+
+    def _score(self, doc_ids: Set[int], terms: Set[str]) -> Dict[int, float]:
+        """计算BM25得分"""
+        total_docs = len(self.doc_ids)
+        average_length = self.total_length / total_docs if total_docs else 0
+        scores = dict.fromkeys(doc_ids, 0.0)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in doc_ids:
+                positions = postings.get(doc_id)
+                if not positions:
+                    continue
+                tf = len(positions)
+                length = self.doc_info[doc_id][2]
+                norm = 1 - self.b + self.b * length / average_length if average_length else 1
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def get_stats(self) -> Dict:
+        """获取索引状态"""
+        return {
+            'loaded': self.loaded,
+            'documents': len(self.doc_ids),
+            'terms': len(self.postings),
+            'index_path': self.index_path
+        }
+
+# 进程内共享的搜索索引实例，按文档库路径区分
+_indexes: Dict[Tuple[str, str], SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(vault_path: str, cache_dir: str = './cache') -> SearchIndex:
+    """获取文档库对应的搜索索引实例"""
+    key = (os.path.abspath(vault_path), os.path.abspath(cache_dir))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SearchIndex(vault_path, cache_dir)
+            _indexes[key] = index
+        return index
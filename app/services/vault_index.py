@@ -0,0 +1,297 @@
+"""
+文档库索引 - 在内存中维护文档库的解析结果，并按监控到的变更增量更新
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 可用于排序的字段及其类型
+SORT_FIELDS = {
+    'modified_time': str,
+    'created_time': str,
+    'title': str,
+    'file_path': str,
+    'size': int,
+    'word_count': int,
+    'line_count': int
+}
+
+def document_digest(document: Dict) -> int:
+    """文档版本摘要（路径、修改时间、大小），用于计算文档库的内容指纹"""
+    key = f"{document.get('file_path')}\0{document.get('modified_time')}\0{document.get('size')}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def sort_value(document: Dict, sort_field: str):
+    """获取文档的排序值，保证同一字段的值可以互相比较"""
+    value = document.get(sort_field)
+    if SORT_FIELDS[sort_field] is str:
+        return str(value) if value is not None else ''
+    return value if isinstance(value, (int, float)) else 0
+
+class VaultIndex:
+    """内存文档索引类
+
+    首次访问时完整加载一次文档库，之后只处理监控服务上报的变更：
+    新增/修改的文件各重新解析一次，删除的文件直接移除。
+    """
+
+    def __init__(self, vault_path: str):
+        self.vault_path = vault_path
+        self.documents = {}  # relative_path -> document
+        self.loaded = False
+        self.monitored = False  # 是否有监控器负责上报变更
+        self.generation = 0  # 每次内容变化时递增
+        self.digest = 0  # 所有文档摘要的异或，内容相同的文档库在任何进程中都相同
+        self.pending = {}  # relative_path -> 'upsert' | 'delete'
+        self.scanning = False  # 是否正在完整扫描
+        self.stale = False  # 完整扫描期间收到了需要重新扫描的通知，扫描结束后需重新检查文件状态
+        self.listeners = []  # 派生索引，需实现 reset(documents) 和 update(path, document)
+        self.lock = threading.RLock()
+        self._sorted_cache = None
+        self._sort_keys = {}  # sort_field -> (keys, documents)，均为升序
+
+    def add_listener(self, listener):
+        """注册派生索引，已加载时立即同步当前内容"""
+        with self.lock:
+            if listener in self.listeners:
+                return
+            self.listeners.append(listener)
+            if self.loaded:
+                listener.reset(list(self.documents.values()))
+
+    def _notify_reset(self):
+        """通知派生索引完整重建"""
+        documents = list(self.documents.values())
+        for listener in self.listeners:
+            try:
+                listener.reset(documents)
+            except Exception as e:
+                logging.error(f"派生索引重建失败 {listener}: {e}")
+
+    def _notify_update(self, relative_path: str, document: Optional[Dict]):
+        """通知派生索引单个文档变更（document为None表示删除）"""
+        for listener in self.listeners:
+            try:
+                listener.update(relative_path, document)
+            except Exception as e:
+                logging.error(f"派生索引更新失败 {listener}: {e}")
+
+    def apply_changes(self, changes):
+        """记录监控器上报的变更，在下次读取时应用
+
+        完整扫描在索引锁之外遍历和解析文件，扫描期间上报的变更同样记录下来，
+        在扫描结果替换索引内容之后应用，不会丢失。
+        """
+        with self.lock:
+            if changes.rescan:
+                if self.loaded:
+                    # 无法增量处理，下次读取时完整扫描（解析结果仍可从缓存复用）
+                    self.loaded = False
+                elif self.scanning:
+                    # 正在进行的扫描可能已错过变更，由扫描方在结束后重新检查文件状态
+                    self.stale = True
+                self.pending.clear()
+                return
+            for relative_path in list(changes.added) + list(changes.modified):
+                self.pending[relative_path] = 'upsert'
+            for relative_path in changes.deleted:
+                self.pending[relative_path] = 'delete'
+
+    def begin_scan(self):
+        """开始完整扫描，之前记录的变更已包含在扫描结果中"""
+        with self.lock:
+            self.pending.clear()
+            self.scanning = True
+            self.stale = False
+
+    def take_stale(self) -> bool:
+        """扫描期间是否收到了重新扫描的通知（读取后清除）"""
+        with self.lock:
+            stale, self.stale = self.stale, False
+            return stale
+
+    def queue_changes(self, upserts: Iterable[str], deletes: Iterable[str]):
+        """记录待处理的变更，由下次sync应用"""
+        with self.lock:
+            self.pending.update((path, 'upsert') for path in upserts)
+            self.pending.update((path, 'delete') for path in deletes)
+
+    def replace(self, documents: Iterable[Dict]):
+        """用完整扫描的结果替换索引内容
+
+        begin_scan之后记录的变更保留在pending中，由调用方随后sync应用。
+        """
+        with self.lock:
+            self.documents = {doc['file_path']: doc for doc in documents}
+            self.digest = 0
+            for document in self.documents.values():
+                self.digest ^= document_digest(document)
+            self.loaded = True
+            self.scanning = False
+            self._bump()
+            self._notify_reset()
+
+    def merge(self, documents: Iterable[Dict]) -> int:
+        """用完整扫描的结果增量更新索引，返回有变化的文档数
+
+        内容版本（路径、修改时间、大小）与索引中相同的文档保持不变，
+        只对新增、修改和删除的文档通知派生索引；没有变化时版本号和排序缓存都保持不变。
+        索引尚未加载（首次扫描或要求重新扫描）时等同replace。
+        """
+        with self.lock:
+            if not self.loaded:
+                self.replace(documents)
+                return len(self.documents)
+            scanned = {doc['file_path']: doc for doc in documents}
+            changes = [(path, None) for path in self.documents if path not in scanned]
+            for path, document in scanned.items():
+                previous = self.documents.get(path)
+                if previous is document:
+                    continue
+                if previous is None or document_digest(previous) != document_digest(document):
+                    changes.append((path, document))
+            for path, document in changes:
+                previous = self.documents.pop(path, None)
+                if previous is not None:
+                    self.digest ^= document_digest(previous)
+                if document is not None:
+                    self.documents[path] = document
+                    self.digest ^= document_digest(document)
+                self._notify_update(path, document)
+            self.scanning = False
+            if changes:
+                self._bump()
+            return len(changes)
+
+    def restore(self, documents: Iterable[Dict], states: Dict[str, Dict], changed: Iterable[str] = (),
+                deleted: Iterable[str] = ()):
+        """用文档库快照恢复索引内容
+
+        实现了 restore_state(state) 的派生索引直接恢复快照中的状态（按snapshot_key查找），
+        其余派生索引照常重建。快照之后有变化的文件记为待处理变更，由下次sync应用。
+        """
+        with self.lock:
+            self.documents = {doc['file_path']: doc for doc in documents}
+            self.digest = 0
+            for document in self.documents.values():
+                self.digest ^= document_digest(document)
+            self.pending.update((path, 'upsert') for path in changed if path not in self.pending)
+            self.pending.update((path, 'delete') for path in deleted if path not in self.pending)
+            self.loaded = True
+            self.scanning = False
+            self._bump()
+            documents = list(self.documents.values())
+            for listener in self.listeners:
+                state = states.get(getattr(listener, 'snapshot_key', None))
+                if state is not None:
+                    try:
+                        listener.restore_state(state)
+                        continue
+                    except Exception as e:
+                        logging.warning(f"派生索引恢复失败，改为重建 {listener}: {e}")
+                try:
+                    listener.reset(documents)
+                except Exception as e:
+                    logging.error(f"派生索引重建失败 {listener}: {e}")
+
+    def sync(self, loader: Callable[[str], Optional[Dict]]) -> int:
+        """应用待处理的变更，返回处理的文件数
+
+        loader 接收相对路径，返回解析后的文档，文件不存在或不应收录时返回None。
+        """
+        with self.lock:
+            if not self.pending:
+                return 0
+            pending, self.pending = self.pending, {}
+            for relative_path, action in pending.items():
+                document = None
+                if action == 'upsert':
+                    try:
+                        document = loader(relative_path)
+                    except Exception as e:
+                        logging.error(f"增量更新文档失败 {relative_path}: {e}")
+                previous = self.documents.get(relative_path)
+                if document:
+                    self.documents[relative_path] = document
+                elif self.documents.pop(relative_path, None) is None:
+                    continue
+                if previous is not None:
+                    self.digest ^= document_digest(previous)
+                if document:
+                    self.digest ^= document_digest(document)
+                self._notify_update(relative_path, document)
+            self._bump()
+            return len(pending)
+
+    def invalidate(self):
+        """丢弃索引内容，下次访问时重新完整加载"""
+        with self.lock:
+            self.documents = {}
+            self.digest = 0
+            self.pending.clear()
+            self.loaded = False
+            self.stale = True
+            self._bump()
+
+    def is_fresh(self) -> bool:
+        """索引是否可以直接使用（已加载且有监控器上报变更）"""
+        return self.loaded and self.monitored
+
+    @property
+    def version(self) -> str:
+        """文档库内容版本（文档数和内容指纹），用于HTTP缓存校验
+        
+        与generation不同，它只取决于文档内容，多个工作进程和重启后保持一致。
+        """
+        return f'{len(self.documents)}-{self.digest:016x}'
+
+    def get(self, relative_path: str) -> Optional[Dict]:
+        """获取单个文档"""
+        return self.documents.get(relative_path)
+
+    def get_all(self) -> List[Dict]:
+        """获取所有文档，按修改时间倒序"""
+        with self.lock:
+            if self._sorted_cache is None:
+                self._sorted_cache = sorted(
+                    self.documents.values(),
+                    key=lambda x: x.get('modified_time', ''),
+                    reverse=True
+                )
+            return list(self._sorted_cache)
+
+    def get_sorted(self, sort_field: str) -> Tuple[List[Tuple], List[Dict]]:
+        """获取按指定字段升序排列的 (排序键, 文档) 列表，排序键为 (字段值, 相对路径)"""
+        with self.lock:
+            cached = self._sort_keys.get(sort_field)
+            if cached is None:
+                entries = sorted(
+                    ((sort_value(document, sort_field), path), document)
+                    for path, document in self.documents.items()
+                )
+                cached = ([key for key, _ in entries], [document for _, document in entries])
+                self._sort_keys[sort_field] = cached
+            return cached
+
+    def _bump(self):
+        """内容变化后更新版本号"""
+        self.generation += 1
+        self._sorted_cache = None
+        self._sort_keys = {}
+
+# 进程内共享的索引实例，按文档库路径区分
+_indexes: Dict[str, VaultIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_vault_index(vault_path: str) -> VaultIndex:
+    """获取文档库对应的索引实例"""
+    key = os.path.abspath(vault_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = VaultIndex(vault_path)
+            _indexes[key] = index
+        return index
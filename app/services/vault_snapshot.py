@@ -0,0 +1,182 @@
+"""
+文档库快照 - 把文档索引（元数据）和派生索引的状态写入一个文件，冷启动时读取快照并只重新加载有变化的文件
+"""
+
+import gc
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.document_cache import CACHE_SCHEMA_VERSION
+
+# 快照结构或任一派生索引的状态结构变化时递增，旧快照会被忽略
+SNAPSHOT_VERSION = 3
+
+@contextmanager
+def gc_paused():
+    """暂停循环垃圾回收
+
+    快照反序列化和创建文档记录时会一次性创建数十万个小容器，期间的分代回收会反复遍历整个堆。
+    暂停对整个进程生效，只应包住这类不执行其他代码的短时间操作。
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class VaultSnapshot:
+    """文档库快照类
+
+    快照包含每个文件的 (mtime_ns, size)、不含正文的文档记录，
+    以及实现了 get_state/restore_state 的派生索引（全局统计、链接图谱、标签和元数据索引）的状态。
+    搜索索引已单独持久化，不写入快照。
+
+    作为文档索引的派生索引注册后，增量更新过的文件在快照中记为未知版本，
+    下次冷启动时重新加载（文件未变化时直接命中文档缓存）。
+    """
+
+    def __init__(self, vault_path: str, cache_dir: str = './cache', save_interval: int = 60):
+        self.vault_path = os.path.abspath(vault_path)
+        self.cache_dir = cache_dir
+        self.save_interval = save_interval
+        self.path = self._get_snapshot_path()
+        self.stamps = {}  # relative_path -> (mtime_ns, size)，None表示版本未知
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.last_save = 0
+        self.last_load = None  # 上次加载的统计信息
+
+    def _get_snapshot_path(self) -> str:
+        """获取快照文件路径（每个文档库一个文件）"""
+        vault_hash = hashlib.sha1(self.vault_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f'snapshot-{vault_hash}.pickle')
+
+    def load(self) -> Optional[Dict]:
+        """读取快照，文件不存在或版本不一致时返回None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            if (state.get('version') != SNAPSHOT_VERSION
+                    or state.get('schema_version') != CACHE_SCHEMA_VERSION
+                    or state.get('vault_path') != self.vault_path):
+                return None
+            with self.lock:
+                self.stamps = dict(state['stamps'])
+                self.dirty = False
+            return state
+        except Exception as e:
+            logging.warning(f"加载文档库快照失败，将完整扫描: {e}")
+            return None
+
+    def diff(self, stamps: Dict[str, Tuple[int, int]]) -> Tuple[List[str], List[str]]:
+        """与当前文件状态比较，返回 (新增或修改的路径, 已删除的路径)"""
+        with self.lock:
+            changed = [path for path, stamp in stamps.items() if self.stamps.get(path) != stamp]
+            deleted = [path for path in self.stamps if path not in stamps]
+        return changed, deleted
+
+    def reset(self, documents: List[Dict]):
+        """完整扫描后由调用方通过save写入文件状态"""
+
+    def update(self, relative_path: str, document: Optional[Dict]):
+        """文档增量更新后该文件在快照中的版本未知"""
+        with self.lock:
+            if document is None:
+                self.stamps.pop(relative_path, None)
+            else:
+                self.stamps[relative_path] = None
+            self.dirty = True
+
+    def save(self, index, stamps: Optional[Iterable[Tuple[str, int, int]]] = None, force: bool = False):
+        """写入快照（默认按save_interval节流）
+
+        stamps 为完整扫描得到的 (相对路径, mtime_ns, size)，给出时替换记录的文件状态。
+        """
+        with self.lock:
+            if stamps is not None:
+                self.stamps = {path: (mtime_ns, size) for path, mtime_ns, size in stamps}
+                self.dirty = True
+            if not self.dirty:
+                return
+            if not force and time.time() - self.last_save < self.save_interval:
+                return
+            self.dirty = False
+            self.last_save = time.time()
+
+        start = time.time()
+        # 序列化期间持有文档索引的锁，派生索引的状态不会被并发修改
+        with index.lock:
+            with self.lock:
+                file_stamps = dict(self.stamps)
+            states = {}
+            for listener in index.listeners:
+                key = getattr(listener, 'snapshot_key', None)
+                if key and hasattr(listener, 'get_state'):
+                    states[key] = listener.get_state()
+            documents = [
+                {key: value for key, value in document.items() if key != 'content'}
+                for document in index.documents.values()
+            ]
+            try:
+                data = pickle.dumps({
+                    'version': SNAPSHOT_VERSION,
+                    'schema_version': CACHE_SCHEMA_VERSION,
+                    'vault_path': self.vault_path,
+                    'created': time.time(),
+                    'stamps': file_stamps,
+                    'documents': documents,
+                    'states': states
+                }, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logging.error(f"序列化文档库快照失败: {e}")
+                return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            logging.info(f"已保存文档库快照 {len(documents)} 篇文档, {len(data)} 字节, "
+                         f"耗时 {time.time() - start:.2f}s: {self.path}")
+        except Exception as e:
+            logging.error(f"保存文档库快照失败: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def get_stats(self) -> Dict:
+        """获取快照状态"""
+        exists = os.path.exists(self.path)
+        return {
+            'path': self.path,
+            'exists': exists,
+            'size': os.path.getsize(self.path) if exists else 0,
+            'files': len(self.stamps),
+            'dirty': self.dirty,
+            'last_save': self.last_save or None,
+            'last_load': self.last_load
+        }
+
+# 进程内共享的快照实例，按文档库路径区分
+_snapshots: Dict[Tuple[str, str], VaultSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+def get_vault_snapshot(vault_path: str, cache_dir: str = './cache', save_interval: int = 60) -> VaultSnapshot:
+    """获取文档库对应的快照实例"""
+    key = (os.path.abspath(vault_path), os.path.abspath(cache_dir))
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = VaultSnapshot(vault_path, cache_dir, save_interval)
+            _snapshots[key] = snapshot
+        snapshot.save_interval = save_interval
+        return snapshot
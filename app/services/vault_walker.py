@@ -0,0 +1,161 @@
+"""
+文档库遍历 - 基于os.scandir遍历文档库，统一排除规则并复用目录项的stat结果
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+DEFAULT_EXTENSIONS = ('.md', '.markdown')
+DEFAULT_EXCLUDE_PATTERNS = ('.git', '.obsidian', 'node_modules', '__pycache__')
+
+class VaultFile(NamedTuple):
+    """遍历得到的文档文件（不读取stat时 mtime_ns 和 size 为None）"""
+    path: str
+    relative_path: str
+    mtime_ns: Optional[int]
+    size: Optional[int]
+
+class VaultWalker:
+    """文档库遍历器
+
+    跳过隐藏目录和名称包含 exclude_patterns 中任一项的目录，只返回 extensions 结尾的文件。
+
+    trust_dir_mtime为True时，记住每个目录上次遍历的结果，目录自身mtime未变化则
+    不再列目录、也不再stat其中的文件。目录mtime只在增删、重命名条目时变化，
+    原地写入文件不会改变它，因此只适用于编辑器以“写临时文件再重命名”方式保存的场景；
+    同一实例多次遍历才有效果，文档服务通过 get_vault_walker 在请求间共享实例。
+    """
+
+    def __init__(self, vault_path: str, extensions: Optional[Iterable[str]] = None,
+                 exclude_patterns: Optional[Iterable[str]] = None, trust_dir_mtime: bool = False):
+        self.vault_path = vault_path
+        self.extensions = tuple(extensions or DEFAULT_EXTENSIONS)
+        self.exclude_patterns = tuple(exclude_patterns or DEFAULT_EXCLUDE_PATTERNS)
+        self.trust_dir_mtime = trust_dir_mtime
+        self.dir_cache = {}  # 目录路径 -> (mtime_ns, [(文件名, mtime_ns, size)], [子目录名])
+        self.pruned_dirs = 0  # 上次遍历中复用缓存的目录数
+
+    @classmethod
+    def from_config(cls, vault_path: str, config_service=None, trust_dir_mtime: bool = False) -> 'VaultWalker':
+        """按ConfigService中的 supported_extensions / exclude_patterns 创建遍历器"""
+        if config_service is None:
+            return cls(vault_path, trust_dir_mtime=trust_dir_mtime)
+        return cls(
+            vault_path,
+            config_service.get('supported_extensions'),
+            config_service.get('exclude_patterns'),
+            trust_dir_mtime
+        )
+
+    def is_excluded(self, name: str) -> bool:
+        """目录是否应跳过"""
+        return name.startswith('.') or any(pattern in name for pattern in self.exclude_patterns)
+
+    def is_document(self, name: str) -> bool:
+        """文件名是否为文档"""
+        return name.endswith(self.extensions)
+
+    def is_document_path(self, relative_path: str) -> bool:
+        """相对路径是否为应收录的文档（与遍历的过滤规则一致）"""
+        parts = relative_path.replace('\\', '/').split('/')
+        if any(self.is_excluded(part) for part in parts[:-1]):
+            return False
+        return self.is_document(parts[-1])
+
+    def walk(self, with_stat: bool = True) -> Iterator[VaultFile]:
+        """遍历文档库中的所有文档"""
+        self.pruned_dirs = 0
+        use_cache = self.trust_dir_mtime and with_stat
+        visited = set()
+        stack = [(self.vault_path, '')]
+        while stack:
+            directory, relative_dir = stack.pop()
+            listing = self._list_dir(directory, with_stat, use_cache)
+            if listing is None:
+                continue
+            visited.add(directory)
+            files, subdirs = listing
+            for name, mtime_ns, size in files:
+                yield VaultFile(
+                    os.path.join(directory, name),
+                    os.path.join(relative_dir, name) if relative_dir else name,
+                    mtime_ns, size
+                )
+            for name in reversed(subdirs):
+                stack.append((
+                    os.path.join(directory, name),
+                    os.path.join(relative_dir, name) if relative_dir else name
+                ))
+        if use_cache:
+            # 完整遍历后丢弃已不存在目录的缓存
+            for directory in [d for d in list(self.dir_cache) if d not in visited]:
+                self.dir_cache.pop(directory, None)
+
+    def _list_dir(self, directory: str, with_stat: bool,
+                  use_cache: bool) -> Optional[Tuple[List[Tuple], List[str]]]:
+        """列出目录中的文档和子目录，目录不可读时返回None"""
+        dir_mtime = None
+        if use_cache:
+            try:
+                dir_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                return None
+            cached = self.dir_cache.get(directory)
+            if cached and cached[0] == dir_mtime:
+                self.pruned_dirs += 1
+                return cached[1], cached[2]
+
+        files, subdirs = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self.is_excluded(entry.name):
+                                subdirs.append(entry.name)
+                        elif self.is_document(entry.name):
+                            if with_stat:
+                                # Windows下直接使用目录项中的信息，Linux下每个文件只stat一次
+                                stat = entry.stat()
+                                files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+                            else:
+                                files.append((entry.name, None, None))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"无法读取目录 {directory}: {e}")
+            return None
+
+        files.sort()
+        subdirs.sort()
+        if use_cache:
+            self.dir_cache[directory] = (dir_mtime, files, subdirs)
+        return files, subdirs
+
+    def count(self, limit: Optional[int] = None) -> int:
+        """统计文档数量，达到limit后停止遍历"""
+        total = 0
+        for _ in self.walk(with_stat=False):
+            total += 1
+            if limit and total >= limit:
+                break
+        return total
+
+# 进程内共享的遍历器，按文档库路径区分，目录缓存在请求间保留
+_walkers: Dict[str, VaultWalker] = {}
+_walkers_lock = threading.Lock()
+
+def get_vault_walker(vault_path: str, config_service=None) -> VaultWalker:
+    """获取文档库对应的遍历器（按ConfigService中的过滤规则和trust_dir_mtime），配置变化时重新创建"""
+    trust_dir_mtime = bool(config_service.get('trust_dir_mtime', False)) if config_service else False
+    walker = VaultWalker.from_config(vault_path, config_service, trust_dir_mtime)
+    key = os.path.abspath(vault_path)
+    with _walkers_lock:
+        shared = _walkers.get(key)
+        if (shared is None or shared.extensions != walker.extensions
+                or shared.exclude_patterns != walker.exclude_patterns
+                or shared.trust_dir_mtime != walker.trust_dir_mtime):
+            _walkers[key] = shared = walker
+        return shared
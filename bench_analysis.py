@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+文档分析性能测试脚本 - 统计AnalysisService分析单篇文档的耗时（不使用分析缓存）
+
+用法: python bench_analysis.py [文档库路径] [重复次数]
+"""
+
+import sys
+import time
+import statistics
+from pathlib import Path
+
+import frontmatter
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def load_contents(vault_path: str):
+    """读取文档库中所有文档的正文"""
+    from app.services.vault_walker import VaultWalker
+
+    contents = []
+    for vault_file in VaultWalker(vault_path).walk(with_stat=False):
+        with open(vault_file.path, 'r', encoding='utf-8') as f:
+            contents.append(frontmatter.loads(f.read()).content)
+    return contents
+
+def main():
+    vault_path = sys.argv[1] if len(sys.argv) > 1 else './docs'
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    from app.services.analysis_service import AnalysisService
+
+    contents = load_contents(vault_path)
+    if not contents:
+        print(f"❌ 在 {vault_path} 中未找到文档")
+        return 1
+
+    service = AnalysisService()
+    service.analyze_content(contents[0])  # 预热（加载jieba词典）
+
+    timings = []
+    for _ in range(rounds):
+        for content in contents:
+            start = time.perf_counter()
+            service.analyze_content(content)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"📄 文档数: {len(contents)}，重复 {rounds} 轮")
+    print(f"⏱  平均: {statistics.mean(timings):.2f} ms/篇")
+    print(f"⏱  中位数: {statistics.median(timings):.2f} ms/篇")
+    print(f"⏱  P95: {timings[int(len(timings) * 0.95) - 1]:.2f} ms/篇")
+    print(f"⏱  总计: {sum(timings) / 1000:.2f} s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 # Gunicorn配置文件 - 生产环境部署
 
+import gc
 import os
 import multiprocessing
 
@@ -44,6 +45,8 @@ def worker_int(worker):
 def pre_fork(server, worker):
     """fork工作进程前的回调"""
     server.log.info("🔄 正在fork工作进程...")
+    # 预加载的对象移入永久代，工作进程的垃圾回收不再写入这些对象所在的共享页
+    gc.freeze()
 
 def post_fork(server, worker):
     """fork工作进程后的回调"""
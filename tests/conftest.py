@@ -0,0 +1,85 @@
+"""
+测试公共夹具 - 在临时目录中创建文档库、配置文件和缓存目录
+"""
+
+import os
+import sys
+import json
+import pytest
+from pathlib import Path
+from flask import Flask
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+NOTES = {
+    'alpha.md': '---\ntags: [python, 学习]\nstatus: draft\n---\n# Alpha\n\nAlpha links to [[beta]] and [[gamma|G]].\n',
+    'beta.md': '---\ntags: [python/flask]\nstatus: done\n---\n# Beta\n\nBeta text about search engines and flask.\n',
+    'notes/gamma.md': '# Gamma\n\nGamma note #project with a [[alpha]] link.\n'
+}
+
+def write_note(vault, relative_path: str, text: str, mtime: float = None) -> str:
+    """写入笔记文件，可指定修改时间，返回绝对路径"""
+    path = os.path.join(str(vault), relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+@pytest.fixture
+def vault(tmp_path):
+    """包含几篇笔记的文档库"""
+    vault_dir = tmp_path / 'vault'
+    for index, (relative_path, text) in enumerate(NOTES.items()):
+        write_note(vault_dir, relative_path, text, 1700000000 + index * 3600)
+    return vault_dir
+
+@pytest.fixture
+def workdir(tmp_path, vault, monkeypatch):
+    """切换到临时工作目录，config.json指向临时文档库和缓存目录"""
+    config = {
+        'obsidian_vault_path': str(vault),
+        'cache_dir': str(tmp_path / 'cache'),
+        'monitor_backend': 'polling'
+    }
+    with open(tmp_path / 'config.json', 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ANALYSIS_SERVICE_URL', raising=False)
+    return tmp_path
+
+@pytest.fixture
+def app(workdir):
+    """完整的Flask应用，关闭文档库监控，每次请求都重新扫描文档库"""
+    from app import create_app
+    application = create_app()
+    application.config['TESTING'] = True
+    application.monitor_service.stop_all()
+    yield application
+    application.monitor_service.stop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def app_context(workdir):
+    """只提供应用上下文，用于直接测试服务层"""
+    application = Flask(__name__)
+    with application.app_context():
+        yield application
+
+def restart_process(monkeypatch):
+    """清空进程内共享的服务实例，模拟新启动的工作进程（磁盘上的缓存和快照保留）"""
+    from app.services import (
+        analysis_cache, blob_store, document_cache, facet_index, global_stats,
+        link_graph, search_index, vault_index, vault_snapshot, vault_walker
+    )
+    for module, name in [(analysis_cache, '_caches'), (blob_store, '_stores'), (document_cache, '_caches'),
+                         (facet_index, '_indexes'), (global_stats, '_statistics'), (link_graph, '_graphs'),
+                         (search_index, '_indexes'), (vault_index, '_indexes'), (vault_snapshot, '_snapshots'),
+                         (vault_walker, '_walkers')]:
+        monkeypatch.setattr(module, name, {})
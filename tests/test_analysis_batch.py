@@ -0,0 +1,46 @@
+"""
+批量分析接口测试 - NDJSON逐行结果、缺失文档、缓存命中、按文件夹分析和汇总行
+"""
+
+import json
+
+def post_batch(client, body):
+    response = client.post('/api/analysis/batch', json=body)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    return [json.loads(line) for line in lines]
+
+def test_batch_streams_one_line_per_document_and_a_done_record(client):
+    records = post_batch(client, {'paths': ['alpha.md', 'nope.md', 'beta.md', 'alpha.md']})
+    *results, done = records
+
+    # 缺失的文档最先返回，重复路径只分析一次
+    assert results[0] == {'path': 'nope.md', 'success': False, 'error': '文档不存在'}
+    analyzed = {result['path']: result for result in results[1:]}
+    assert sorted(analyzed) == ['alpha.md', 'beta.md']
+    assert all(result['success'] and result['source'] == 'local_service' for result in analyzed.values())
+    assert analyzed['alpha.md']['data']['basic_stats']['word_count'] > 0
+
+    assert done['done'] is True
+    assert (done['total'], done['succeeded'], done['failed']) == (3, 2, 1)
+    assert done['elapsed'] >= 0
+
+    # 再次分析时结果来自分析缓存
+    *results, done = post_batch(client, {'paths': ['alpha.md', 'beta.md']})
+    assert {result['source'] for result in results} == {'cache'}
+    assert (done['succeeded'], done['failed']) == (2, 0)
+
+def test_batch_analyzes_a_folder(client):
+    *results, done = post_batch(client, {'folder': 'notes'})
+    assert [result['path'] for result in results] == ['notes/gamma.md']
+    assert done['total'] == 1
+
+    *results, done = post_batch(client, {'folder': ''})
+    assert sorted(result['path'] for result in results) == ['alpha.md', 'beta.md', 'notes/gamma.md']
+
+def test_batch_rejects_invalid_requests(client):
+    for body in (['alpha.md'], {}, {'paths': 'alpha.md'}, {'paths': [1]}, {'folder': 3}):
+        response = client.post('/api/analysis/batch', json=body)
+        assert response.status_code == 400, body
+        assert not response.get_json()['success']
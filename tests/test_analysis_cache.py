@@ -0,0 +1,53 @@
+"""
+分析结果缓存测试 - 按内容哈希命中、SQLite持久化和过期结果清理
+"""
+
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_service import AnalysisService
+
+def make_document(path, content, modified_time='2024-01-01T00:00:00'):
+    return {'file_path': path, 'content': content, 'modified_time': modified_time, 'size': len(content)}
+
+def test_results_are_keyed_by_content(tmp_path):
+    cache = AnalysisCache('/vault', str(tmp_path))
+    document = make_document('a.md', 'hello')
+    key = cache.make_key(document['content'])
+    assert cache.make_key('hello') == key != cache.make_key('hello!')
+
+    assert cache.get(key) is None
+    cache.put(key, document, {'words': 1})
+    assert cache.get(key) == {'words': 1}
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 1
+
+def test_results_persist_and_memory_is_bounded(tmp_path):
+    cache = AnalysisCache('/vault', str(tmp_path), max_entries=2)
+    keys = [cache.make_key(str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, make_document(f'{i}.md', str(i)), {'n': i})
+    assert list(cache.entries) == keys[1:]
+    # 内存淘汰的结果仍可从SQLite读取
+    assert cache.get(keys[0]) == {'n': 0}
+    assert AnalysisCache('/vault', str(tmp_path)).get(keys[2]) == {'n': 2}
+
+def test_changed_or_deleted_documents_drop_old_results(tmp_path):
+    cache = AnalysisCache('/vault', str(tmp_path))
+    old, new = make_document('a.md', 'v1'), make_document('a.md', 'v2', '2024-02-01T00:00:00')
+    other = make_document('b.md', 'b')
+    for document in (old, other):
+        cache.put(cache.make_key(document['content']), document, {})
+
+    cache.update('a.md', new)
+    assert cache.get(cache.make_key('v1')) is None
+    assert cache.get(cache.make_key('b')) == {}
+
+    cache.reset([])
+    assert AnalysisCache('/vault', str(tmp_path)).get(cache.make_key('b')) is None
+
+def test_analyze_document_reuses_cached_result(app_context, monkeypatch):
+    service = AnalysisService()
+    document = make_document('a.md', '搜索引擎 search engines are fast.')
+    first = service.analyze_document(document)
+
+    monkeypatch.setattr(AnalysisService, 'analyze_content', lambda self, content: {'fresh': True})
+    assert service.analyze_document(dict(document)) == first
+    assert service.analyze_document(make_document('a.md', 'changed')) == {'fresh': True}
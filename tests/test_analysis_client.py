@@ -0,0 +1,140 @@
+"""
+外部分析服务客户端测试 - 服务配置、批量请求回退和熔断
+"""
+
+import time
+import threading
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from analysis_stub_server import StubHandler
+from app.services.analysis_client import (
+    AnalysisClient, CircuitBreaker, SocketAnalysisClient, get_analysis_client
+)
+
+class StubAnalysisService:
+    def analyze_content(self, content):
+        return {'length': len(content)}
+
+@pytest.fixture
+def stub_server():
+    """在随机端口启动模拟服务，返回 (地址, 选项, 请求路径记录)"""
+    paths = []
+    options = SimpleNamespace(latency=0.0, fail_rate=0.0, no_batch=False, verbose=False)
+
+    class Handler(StubHandler):
+        def do_POST(self):
+            paths.append(self.path)
+            super().do_POST()
+
+    Handler.options = options
+    Handler.service = StubAnalysisService()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', options, paths
+    server.shutdown()
+    server.server_close()
+
+def make_documents(count):
+    return [{'file_path': f'{i}.md', 'content': 'x' * (i + 1)} for i in range(count)]
+
+def test_unset_url_uses_local_analysis(app):
+    assert app.config['ANALYSIS_SERVICE_URL'] == ''
+    assert get_analysis_client(app.config) is None
+    assert get_analysis_client({}) is None
+
+    # 显式配置的地址（包括localhost:8001）都会使用外部服务
+    client = get_analysis_client({'ANALYSIS_SERVICE_URL': 'http://localhost:8001'})
+    assert isinstance(client, AnalysisClient)
+    assert get_analysis_client({'ANALYSIS_SERVICE_URL': 'http://localhost:8001'}) is client
+    assert isinstance(get_analysis_client({'ANALYSIS_SERVICE_URL': 'unix:///tmp/a.sock'}), SocketAnalysisClient)
+
+def test_batch_requests(stub_server):
+    url, _, paths = stub_server
+    client = AnalysisClient(url, batch_size=2, concurrency=1, retries=0)
+    results = dict((d['file_path'], r) for d, r in client.analyze_many(make_documents(5)))
+
+    assert results == {f'{i}.md': {'length': i + 1} for i in range(5)}
+    # 最后一批只有一个文档，直接使用单个文档接口
+    assert paths == ['/analyze/batch', '/analyze/batch', '/analyze']
+    assert client.get_metrics()['batch_supported']
+
+def test_falls_back_to_single_requests_without_batch_endpoint(stub_server):
+    url, options, paths = stub_server
+    options.no_batch = True
+    client = AnalysisClient(url, batch_size=4, concurrency=1, retries=0)
+    results = [result for _, result in client.analyze_many(make_documents(3))]
+
+    assert sorted(r['length'] for r in results) == [1, 2, 3]
+    assert paths == ['/analyze/batch', '/analyze', '/analyze', '/analyze']
+    assert not client.batch_supported
+    # 之后不再尝试批量接口
+    paths.clear()
+    list(client.analyze_many(make_documents(2)))
+    assert paths == ['/analyze', '/analyze']
+    # 404说明服务可用，不计入熔断
+    assert client.breaker.state == 'closed'
+
+def test_breaker_opens_and_recovers(stub_server):
+    url, options, paths = stub_server
+    options.fail_rate = 1.0
+    client = AnalysisClient(url, retries=0, breaker_threshold=2, breaker_cooldown=0.2)
+    document = make_documents(1)[0]
+
+    assert client.analyze(document) is None
+    assert client.breaker.state == 'closed'
+    assert client.analyze(document) is None
+    assert client.breaker.state == 'open'
+    # 熔断期间不发出请求
+    assert client.analyze(document) is None
+    assert len(paths) == 2
+    assert client.get_metrics()['short_circuited'] == 1
+
+    client.breaker.opened_at -= 0.2
+    assert client.breaker.state == 'half_open'
+    options.fail_rate = 0.0
+    assert client.analyze(document) == {'length': 1}
+    assert client.get_metrics()['circuit'] == 'closed'
+    assert client.breaker.failures == 0
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(threshold=3, cooldown=10)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    breaker.opened_at -= 10
+    assert breaker.state == 'half_open'
+    # 冷却结束后只放行一个试探请求
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+def test_hanging_service_opens_breaker_quickly(stub_server):
+    url, options, paths = stub_server
+    options.latency = 1.0
+    client = AnalysisClient(url, timeout=0.2, retries=2, breaker_threshold=2, breaker_cooldown=30)
+    document = make_documents(1)[0]
+
+    start = time.monotonic()
+    assert client.analyze(document) is None
+    assert client.analyze(document) is None
+    # 读取超时不重试，每次调用只发出一个请求
+    assert len(paths) == 2
+    assert time.monotonic() - start < 0.9
+    assert client.breaker.state == 'open'
+    assert client.get_metrics()['errors'] == 2
+
+def test_retries_stop_at_deadline(stub_server):
+    url, options, paths = stub_server
+    options.fail_rate = 1.0
+    client = AnalysisClient(url, retries=10, backoff=0.05, deadline=0.3)
+
+    start = time.monotonic()
+    assert client.analyze(make_documents(1)[0]) is None
+    assert time.monotonic() - start < 0.5
+    assert 1 < len(paths) < 11
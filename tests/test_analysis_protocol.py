@@ -0,0 +1,154 @@
+"""
+分析服务二进制协议测试 - 编码协商、帧大小限制和只发送内容哈希时的重发
+"""
+
+import time
+import socket
+import threading
+
+import pytest
+
+from app.services import analysis_protocol
+from app.services.analysis_protocol import (
+    AnalysisProtocolServer, CODEC_JSON, CODEC_MSGPACK, HEADER, MAGIC, MSG_ANALYZE, MSG_ERROR,
+    MSG_HELLO, PROTOCOL_VERSION, ProtocolError, available_codecs, content_id, encode_frame, read_frame
+)
+from app.services.analysis_client import SocketAnalysisClient
+
+@pytest.fixture
+def protocol_server(tmp_path):
+    """在临时套接字上启动参考实现，返回 (服务, 分析过的内容)"""
+    analyzed = []
+
+    def analyze(content):
+        if content == 'boom':
+            raise RuntimeError('分析失败')
+        if content == 'slow':
+            time.sleep(1)
+        analyzed.append(content)
+        return {'length': len(content)}
+
+    server = AnalysisProtocolServer(str(tmp_path / 'a.sock'), analyze)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, analyzed
+    server.shutdown()
+    server.server_close()
+
+def connect(server):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(server.server_address)
+    return sock
+
+def hello(sock, codecs):
+    sock.sendall(encode_frame(MSG_HELLO, {'version': PROTOCOL_VERSION, 'codecs': codecs}))
+    return read_frame(sock)
+
+def test_frame_round_trip():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_frame(MSG_ANALYZE, {'items': [{'id': 'x', 'content': '中文'}]}))
+        assert read_frame(right) == (MSG_ANALYZE, CODEC_JSON, {'items': [{'id': 'x', 'content': '中文'}]})
+
+def test_codec_negotiation(protocol_server):
+    server, _ = protocol_server
+    with connect(server) as sock:
+        msg_type, codec, payload = hello(sock, [CODEC_MSGPACK, CODEC_JSON])
+        # 服务端选用双方都支持的最优编码，HELLO响应起的帧都使用该编码
+        assert msg_type == MSG_HELLO
+        assert payload['codec'] == codec == available_codecs()[0]
+        sock.sendall(encode_frame(MSG_ANALYZE, {'items': [{'id': 'a', 'content': 'abc'}]}, payload['codec']))
+        msg_type, codec, payload = read_frame(sock)
+        assert (msg_type, codec) == (MSG_ANALYZE, available_codecs()[0])
+        assert payload['results'] == [{'id': 'a', 'status': 'ok', 'data': {'length': 3}}]
+
+    with connect(server) as sock:
+        # 客户端只支持JSON，或者只提供了未知编码时使用JSON
+        assert hello(sock, [CODEC_JSON])[2]['codec'] == CODEC_JSON
+    with connect(server) as sock:
+        assert hello(sock, [7])[2]['codec'] == CODEC_JSON
+
+def test_msgpack_requires_the_package(monkeypatch):
+    monkeypatch.setattr(analysis_protocol, 'msgpack', None)
+    assert available_codecs() == [CODEC_JSON]
+    with pytest.raises(ProtocolError):
+        encode_frame(MSG_HELLO, {}, CODEC_MSGPACK)
+    with pytest.raises(ProtocolError):
+        encode_frame(MSG_HELLO, {}, 9)
+
+def test_frame_size_limit(protocol_server, monkeypatch):
+    monkeypatch.setattr(analysis_protocol, 'MAX_FRAME', 64)
+    with pytest.raises(ProtocolError):
+        encode_frame(MSG_ANALYZE, {'items': [{'id': 'x', 'content': 'y' * 100}]})
+
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, MSG_ANALYZE, CODEC_JSON, 65))
+        with pytest.raises(ProtocolError):
+            read_frame(right)
+
+    # 服务端收到超长帧头时返回ERROR并关闭连接，不读取帧体
+    server, analyzed = protocol_server
+    with connect(server) as sock:
+        sock.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, MSG_ANALYZE, CODEC_JSON, 1 << 20))
+        msg_type, _, payload = read_frame(sock)
+        assert msg_type == MSG_ERROR and '帧过大' in payload['error']
+        assert sock.recv(1) == b''
+    assert not analyzed
+
+def test_invalid_header_gets_error(protocol_server):
+    server, _ = protocol_server
+    with connect(server) as sock:
+        sock.sendall(HEADER.pack(b'XXXX', PROTOCOL_VERSION, MSG_HELLO, CODEC_JSON, 0))
+        msg_type, _, payload = read_frame(sock)
+        assert msg_type == MSG_ERROR and '帧头' in payload['error']
+
+def test_missing_content_is_resent(protocol_server):
+    server, analyzed = protocol_server
+    client = SocketAnalysisClient(f'unix://{server.server_address}', retries=0, backoff=0)
+    document = {'file_path': 'a.md', 'content': 'hello world'}
+
+    assert client.analyze(document) == {'length': 11}
+    sent = client.bytes_sent
+    # 服务端已持有该内容，第二次只发送哈希
+    assert client.analyze(dict(document)) == {'length': 11}
+    assert client.bytes_sent - sent < sent
+    assert client.get_metrics()['content_skipped'] == 1
+
+    # 服务端淘汰结果后返回missing，客户端附带内容重发
+    server.results.clear()
+    assert client.analyze(document) == {'length': 11}
+    assert analyzed == ['hello world', 'hello world']
+    assert client.get_metrics()['content_skipped'] == 1
+    assert content_id('hello world') in client.known
+    client.close()
+
+def test_batch_sends_duplicate_content_once(protocol_server):
+    server, analyzed = protocol_server
+    client = SocketAnalysisClient(f'unix://{server.server_address}', retries=0, backoff=0)
+    documents = [{'file_path': 'a.md', 'content': 'same'}, {'file_path': 'b.md', 'content': 'same'},
+                 {'file_path': 'c.md', 'content': 'boom'}]
+
+    assert client._analyze_chunk(documents) == [{'length': 4}, {'length': 4}, None]
+    assert analyzed == ['same']
+    # 单个文档分析失败说明服务可用，不计入熔断
+    assert client.breaker.state == 'closed'
+    client.close()
+
+def test_unavailable_server_returns_none(tmp_path):
+    client = SocketAnalysisClient(f'unix://{tmp_path / "none.sock"}', retries=0, backoff=0,
+                                  breaker_threshold=1)
+    assert client.analyze({'content': 'x'}) is None
+    assert client.breaker.state == 'open'
+
+def test_read_timeout_is_not_retried(protocol_server):
+    server, analyzed = protocol_server
+    client = SocketAnalysisClient(f'unix://{server.server_address}', timeout=0.2, retries=2,
+                                  breaker_threshold=1)
+    start = time.monotonic()
+    assert client.analyze({'file_path': 'a.md', 'content': 'slow'}) is None
+    # 服务端已收到请求，超时后不再重发
+    assert time.monotonic() - start < 0.6
+    assert client.breaker.state == 'open'
+    assert client.idle.empty()
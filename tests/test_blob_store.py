@@ -0,0 +1,123 @@
+"""
+正文存储测试 - 追加写入、中断写入后的恢复、压缩、文档正文按需读取和列表页面的摘要
+"""
+
+import os
+from app.services.blob_store import BlobStore, BLOB_HEADER, BLOB_MAGIC, make_blob_key
+from app.services.document_cache import DocumentCache
+from app.services.document_service import DocumentService
+from app.services.vault_index import get_vault_index
+
+def test_put_and_get_across_instances(tmp_path):
+    path = str(tmp_path / 'blobs.dat')
+    writer, reader = BlobStore(path), BlobStore(path)
+    key = make_blob_key('content', 'a.md', 1, 2)
+    assert bytes(writer.put(key, 'α note'.encode('utf-8'))) == 'α note'.encode('utf-8')
+    # 其他实例在未命中时增量扫描新追加的记录
+    assert bytes(reader.get(key)) == 'α note'.encode('utf-8')
+    assert writer.put(key, b'ignored') is not None
+    assert writer.get_stats()['writes'] == 1
+
+def test_torn_write_is_truncated_on_next_put(tmp_path):
+    path = str(tmp_path / 'blobs.dat')
+    store = BlobStore(path)
+    first = make_blob_key('first')
+    store.put(first, b'complete')
+    # 模拟写入中断：只写入了头部和部分数据
+    with open(path, 'ab') as f:
+        f.write(BLOB_HEADER.pack(BLOB_MAGIC, make_blob_key('torn'), 100) + b'partial')
+
+    fresh = BlobStore(path)
+    assert bytes(fresh.get(first)) == b'complete'
+    assert fresh.get(make_blob_key('torn')) is None
+
+    second = make_blob_key('second')
+    fresh.put(second, b'after')
+    assert os.path.getsize(path) == 2 * BLOB_HEADER.size + len(b'complete') + len(b'after')
+    assert bytes(BlobStore(path).get(second)) == b'after'
+
+def test_compact_keeps_only_live_records(tmp_path):
+    path = str(tmp_path / 'blobs.dat')
+    store, other = BlobStore(path), BlobStore(path)
+    keys = [make_blob_key(i) for i in range(10)]
+    store.put_many((key, b'x' * 1000) for key in keys)
+    assert other.get(keys[0]) is not None
+    held = store.get(keys[1])
+
+    assert store.compact(keys[:2]) == 8 * (BLOB_HEADER.size + 1000)
+    assert store.get(keys[5]) is None
+    assert bytes(store.get(keys[1])) == b'x' * 1000
+    # 之前返回的视图仍指向旧映射，可以继续读取
+    assert bytes(held) == b'x' * 1000
+    # 其他实例发现文件被重写后重新扫描，之后的写入追加到新文件
+    other.put(keys[7], b'new')
+    assert other.get(keys[5]) is None
+    assert bytes(store.get(keys[7])) == b'new'
+    assert bytes(other.get(keys[0])) == b'x' * 1000
+
+def test_maybe_compact_checks_live_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr('app.services.blob_store.COMPACT_MIN_BYTES', 0)
+    store = BlobStore(str(tmp_path / 'blobs.dat'))
+    keys = [make_blob_key(i) for i in range(4)]
+    store.put_many((key, b'y' * 100) for key in keys)
+
+    assert not store.maybe_compact(lambda: keys[:3])
+    calls = []
+    # 文件没有继续增长时不再检查
+    assert not store.maybe_compact(lambda: calls.append(1) or [])
+    assert not calls
+
+    store.put_many((make_blob_key(i), b'z' * 100) for i in range(4, 12))
+    assert store.maybe_compact(lambda: keys[:1])
+    assert store.get_stats()['entries'] == 1
+
+def test_index_documents_do_not_hold_bodies(app_context, vault):
+    service = DocumentService()
+    documents = service.get_all_documents()
+    index = get_vault_index(service.vault_path)
+
+    assert documents
+    assert all('content' not in dict(document) for document in index.documents.values())
+    alpha = index.get('alpha.md')
+    assert 'Alpha links to [[beta]]' in alpha['content']
+    assert bytes(service.get_document_body('alpha.md')).decode('utf-8') == alpha['content']
+
+def test_body_is_restored_after_blob_file_is_removed(app_context, vault):
+    service = DocumentService()
+    service.get_all_documents()
+    store = service._get_blob_store()
+    os.remove(store.path)
+    DocumentService().get_all_documents()
+
+    alpha = get_vault_index(service.vault_path).get('alpha.md')
+    assert 'Alpha links to' in alpha['content']
+    # 从SQLite读取后补写到正文存储
+    assert store.get_stats()['entries'] == 1
+
+def test_compaction_check_position_is_shared_between_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr('app.services.blob_store.COMPACT_MIN_BYTES', 0)
+    path = str(tmp_path / 'blobs.dat')
+    store = BlobStore(path)
+    keys = [make_blob_key(i) for i in range(4)]
+    store.put_many((key, b'y' * 100) for key in keys)
+    assert not store.maybe_compact(lambda: keys)
+
+    calls = []
+    # 新启动的进程读取上次检查的位置，文件没有增长时不再统计有效数据
+    assert not BlobStore(path).maybe_compact(lambda: calls.append(1) or keys)
+    assert not calls
+
+def test_listing_pages_do_not_read_bodies(client, monkeypatch):
+    # 第一次搜索时建立搜索索引需要读取正文
+    client.get('/search?q=flask')
+    reads = []
+    original = DocumentCache.get_content
+    monkeypatch.setattr(DocumentCache, 'get_content',
+                        lambda self, *args: reads.append(args[0]) or original(self, *args))
+
+    pages = [client.get(url).get_data(as_text=True) for url in ('/docs', '/', '/search?q=flask')]
+    # 列表页面使用解析时保存的摘要
+    assert 'Beta text about search engines' in pages[0]
+    assert 'Gamma note #project' in pages[1]
+    assert 'Beta text about search engines' in pages[2]
+    assert reads == []
@@ -0,0 +1,43 @@
+"""
+HTTP条件请求测试 - ETag、Last-Modified和304响应
+"""
+
+import os
+
+def test_listing_revalidates_with_etag_only(client, vault):
+    response = client.get('/api/documents')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    assert client.get('/api/documents', headers={'If-None-Match': etag}).status_code == 304
+    # 查询参数不同的响应使用不同的ETag
+    assert client.get('/api/documents?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+def test_delete_invalidates_aggregate_responses(client, vault):
+    pages = ['/', '/docs', '/api/documents', '/api/statistics']
+    etags = {page: client.get(page).headers['ETag'] for page in pages}
+    os.remove(vault / 'beta.md')
+
+    for page in pages:
+        # 删除文档后最近修改时间不变，If-Modified-Since不能得到304
+        response = client.get(page, headers={
+            'If-None-Match': etags[page],
+            'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'
+        })
+        assert response.status_code == 200, page
+        response = client.get(page, headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        assert response.status_code == 200, page
+
+def test_single_document_uses_last_modified(client, vault):
+    response = client.get('/api/documents/alpha.md')
+    assert response.status_code == 200
+    last_modified = response.headers['Last-Modified']
+
+    cached = client.get('/api/documents/alpha.md', headers={'If-Modified-Since': last_modified})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == response.headers['ETag']
+
+    os.utime(vault / 'alpha.md', (1800000000, 1800000000))
+    assert client.get('/api/documents/alpha.md', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
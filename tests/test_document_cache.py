@@ -0,0 +1,100 @@
+"""
+文档缓存测试 - SQLite持久化、按修改时间和大小命中、共享模式的文档记录
+"""
+
+import json
+from app.services.document_cache import DocumentCache, DocumentRecord
+from app.services.document_service import DocumentService
+from app.services.monitor_service import ChangeSet
+from app.services.vault_index import get_vault_index
+from conftest import write_note
+
+def use_config(workdir, **options):
+    """在测试配置中追加选项"""
+    path = workdir / 'config.json'
+    config = json.loads(path.read_text(encoding='utf-8'))
+    config.update(options)
+    path.write_text(json.dumps(config), encoding='utf-8')
+
+def test_shared_mode_sync_keeps_records_without_bodies(app_context, workdir, vault):
+    use_config(workdir, document_store='shared', blob_store=False)
+    service = DocumentService()
+    service.get_all_documents()
+    index = get_vault_index(service.vault_path)
+    index.monitored = True
+
+    write_note(vault, 'new.md', '# New\n\nfresh body\n')
+    index.apply_changes(ChangeSet(service.vault_path, added=['new.md']))
+    DocumentService().get_all_documents()
+
+    document = index.get('new.md')
+    assert isinstance(document, DocumentRecord)
+    assert 'content' not in dict(document)
+    assert 'fresh body' in document['content']
+
+def test_put_returns_record_readable_before_flush(tmp_path):
+    cache = DocumentCache(str(tmp_path / 'vault'), str(tmp_path / 'cache'), shared=True)
+    record = cache.put('a.md', 1, 2, {'file_path': 'a.md', 'title': 'A', 'content': 'body'})
+    assert isinstance(record, DocumentRecord)
+    assert record['content'] == 'body'
+    cache.flush()
+    assert record['content'] == 'body'
+    assert cache.get('a.md', 1, 2) is record
+
+def test_entries_are_keyed_by_mtime_and_size(tmp_path):
+    cache = DocumentCache(str(tmp_path / 'vault'), str(tmp_path / 'cache'))
+    cache.put('a.md', 1, 2, {'file_path': 'a.md', 'title': 'A', 'content': 'body'})
+    assert cache.get('a.md', 1, 2)['title'] == 'A'
+    assert cache.get('a.md', 1, 3) is None
+    assert cache.get('a.md', 5, 2) is None
+    assert cache.get('b.md', 1, 2) is None
+
+def test_flushed_entries_are_reused_by_a_new_process(tmp_path):
+    vault_path, cache_dir = str(tmp_path / 'vault'), str(tmp_path / 'cache')
+    cache = DocumentCache(vault_path, cache_dir)
+    cache.put('a.md', 1, 2, {'file_path': 'a.md', 'title': 'A', 'content': 'body'})
+    cache.put('b.md', 3, 4, {'file_path': 'b.md', 'title': 'B', 'content': 'other'})
+    assert DocumentCache(vault_path, cache_dir).get('a.md', 1, 2) is None
+    cache.flush()
+
+    # 未整体加载时逐条读取
+    fresh = DocumentCache(vault_path, cache_dir)
+    assert fresh.get('a.md', 1, 2) == {'file_path': 'a.md', 'title': 'A', 'content': 'body'}
+    assert fresh.generation is None
+
+    cache.prune(['a.md'])
+    cache.flush()
+    fresh = DocumentCache(vault_path, cache_dir)
+    fresh.refresh()
+    assert sorted(fresh.entries) == ['a.md']
+    assert fresh.get_stats()['generation'] == 2
+
+def test_refresh_picks_up_writes_from_other_processes(tmp_path):
+    vault_path, cache_dir = str(tmp_path / 'vault'), str(tmp_path / 'cache')
+    reader, writer = DocumentCache(vault_path, cache_dir), DocumentCache(vault_path, cache_dir)
+    reader.refresh()
+    assert reader.entries == {}
+
+    writer.put('a.md', 1, 2, {'file_path': 'a.md', 'content': 'body'})
+    writer.flush()
+    with reader.indexer_lock():
+        assert reader.get('a.md', 1, 2)['content'] == 'body'
+
+def test_second_scan_reuses_parsed_documents(app_context, vault, monkeypatch):
+    DocumentService().get_all_documents()
+    parsed = []
+    original = DocumentService._parse_document
+
+    def counting_parse(self, file_path, relative_path):
+        parsed.append(relative_path)
+        return original(self, file_path, relative_path)
+
+    monkeypatch.setattr(DocumentService, '_parse_document', counting_parse)
+    # 新进程（清空进程内实例）只解析有变化的文件
+    monkeypatch.setattr('app.services.document_cache._caches', {})
+    monkeypatch.setattr('app.services.vault_index._indexes', {})
+    write_note(vault, 'beta.md', '# Beta\n\nchanged\n')
+    documents = DocumentService().get_all_documents()
+
+    assert len(documents) == 3
+    assert parsed == ['beta.md']
@@ -0,0 +1,63 @@
+"""
+文档列表接口测试 - offset/limit分页、游标翻页、字段选择、参数校验和每个请求只扫描一次文档库
+"""
+
+from app.services.vault_walker import VaultWalker
+
+def paths(response):
+    return [item['file_path'] for item in response.get_json()['data']]
+
+def test_offset_and_limit(client):
+    data = client.get('/api/documents?limit=2').get_json()
+    # 默认按修改时间倒序
+    assert [item['file_path'] for item in data['data']] == ['notes/gamma.md', 'beta.md']
+    assert (data['count'], data['total'], data['offset'], data['limit']) == (2, 3, 0, 2)
+    assert data['next_cursor']
+
+    assert paths(client.get('/api/documents?offset=2&limit=2')) == ['alpha.md']
+    assert paths(client.get('/api/documents?offset=5')) == []
+    assert paths(client.get('/api/documents?sort=file_path&order=asc')) == ['alpha.md', 'beta.md', 'notes/gamma.md']
+
+def test_cursor_pages_cover_every_document_once(client):
+    for order in ('desc', 'asc'):
+        seen, cursor = [], ''
+        while True:
+            data = client.get(f'/api/documents?limit=1&order={order}&cursor={cursor}').get_json()
+            seen += [item['file_path'] for item in data['data']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert sorted(seen) == ['alpha.md', 'beta.md', 'notes/gamma.md'] and len(seen) == 3
+        assert seen == (['notes/gamma.md', 'beta.md', 'alpha.md'] if order == 'desc' else
+                        ['alpha.md', 'beta.md', 'notes/gamma.md'])
+
+def test_fields_projection(client):
+    item = client.get('/api/documents?fields=file_path,title&limit=1').get_json()['data'][0]
+    assert item == {'file_path': 'notes/gamma.md', 'title': 'Gamma'}
+    # 默认只返回元数据，正文字段需显式指定
+    item = client.get('/api/documents?limit=1').get_json()['data'][0]
+    assert 'content' not in item and 'excerpt' in item
+    item = client.get('/api/documents?fields=content&limit=1').get_json()['data'][0]
+    assert 'Gamma note' in item['content']
+
+def test_invalid_parameters_are_rejected(client):
+    for query in ('fields=bogus', 'sort=bogus', 'order=sideways', 'offset=-1', 'limit=0', 'cursor=%%%'):
+        response = client.get(f'/api/documents?{query}')
+        assert response.status_code == 400, query
+        assert not response.get_json()['success']
+
+def test_request_walks_vault_once(client, monkeypatch):
+    client.get('/api/documents')
+    walks = []
+    walk = VaultWalker.walk
+
+    def counting_walk(self, *args, **kwargs):
+        walks.append(self.vault_path)
+        return walk(self, *args, **kwargs)
+
+    monkeypatch.setattr(VaultWalker, 'walk', counting_walk)
+    # 没有监控器时每个请求完整扫描一次，ETag校验和列表查询使用同一次扫描的结果
+    for page in ('/api/documents', '/api/search?q=flask', '/docs', '/', '/analysis', '/api/statistics'):
+        walks.clear()
+        assert client.get(page).status_code == 200, page
+        assert len(walks) == 1, page
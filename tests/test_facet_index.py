@@ -0,0 +1,74 @@
+"""
+标签和元数据索引测试 - 嵌套标签、字段值筛选、分面计数和增量更新
+"""
+
+from datetime import date
+from app.services.facet_index import FacetIndex, document_tags, normalize_value
+
+def make_document(path, tags=None, **metadata):
+    return {'file_path': path, 'tags': tags, 'metadata': metadata}
+
+def make_index():
+    index = FacetIndex('/vault')
+    index.reset([
+        make_document('a.md', ['Tech/Python', '学习'], status='draft', priority=1),
+        make_document('b.md', ['#tech/rust'], status='Done', aliases=['x', 'y']),
+        make_document('c.md', None, status='draft', due=date(2024, 3, 1), done=True),
+        make_document('d.md', 'tech')
+    ])
+    return index
+
+def test_document_tags_are_normalized():
+    assert document_tags({'tags': ['#Python', 'python/', ' python ', None, '', 'a/b']}) == ['python', 'a/b']
+    assert document_tags({'tags': 'single'}) == ['single']
+    assert document_tags({'tags': None}) == []
+    assert document_tags({}) == []
+
+def test_match_tags_and_metadata():
+    index = make_index()
+    assert index.match(['tech']) == {'a.md', 'b.md', 'd.md'}
+    assert index.match(['#TECH/python']) == {'a.md'}
+    assert index.match(['tech', '学习']) == {'a.md'}
+    assert index.match(meta={'status': ['done']}) == {'b.md'}
+    assert index.match(meta={'status': ['draft', 'done']}) == {'a.md', 'b.md', 'c.md'}
+    assert index.match(['tech'], {'status': ['draft']}) == {'a.md'}
+    assert index.match(meta={'aliases': ['y'], 'priority': [1]}) == set()
+    assert index.match(meta={'due': ['2024-03-01'], 'done': ['true']}) == {'c.md'}
+    assert index.match() == {'a.md', 'b.md', 'c.md', 'd.md'}
+    assert index.match(['missing']) == set()
+
+def test_facet_counts():
+    index = make_index()
+    counts = index.facets(index.match(['tech']), ['tags', 'meta.status'])
+    assert counts['tags'] == {'tech': 3, 'tech/python': 1, 'tech/rust': 1, '学习': 1}
+    assert counts['meta.status'] == {'draft': 1, 'done': 1}
+    assert index.facets({'a.md', 'b.md', 'c.md', 'd.md'}, ['tags'], limit=1)['tags'] == {'tech': 3}
+    assert index.get_fields()['status'] == 2
+    assert normalize_value({'nested': 1}) is None
+
+def test_updates_keep_indexes_consistent():
+    index = make_index()
+    index.update('a.md', make_document('a.md', ['life'], status='done'))
+    index.update('b.md', None)
+
+    assert index.match(['tech']) == {'d.md'}
+    assert index.match(meta={'status': ['done']}) == {'a.md'}
+    assert 'tech/python' not in index.get_tags() and 'aliases' not in index.get_fields()
+
+    restored = FacetIndex('/vault')
+    restored.restore_state(index.get_state())
+    assert restored.get_tags() == index.get_tags()
+    restored.update('e.md', make_document('e.md', ['tech'], status='done'))
+    assert restored.match(['tech'], {'status': ['done']}) == {'e.md'}
+
+def test_documents_api_filters_and_facets(client):
+    response = client.get('/api/documents?tag=Python&facets=tags,meta.status&fields=file_path')
+    data = response.get_json()
+    assert data['success']
+    assert sorted(item['file_path'] for item in data['data']) == ['alpha.md', 'beta.md']
+    assert data['facets']['tags'] == {'python': 2, 'python/flask': 1, '学习': 1}
+    assert data['facets']['meta.status'] == {'draft': 1, 'done': 1}
+
+    response = client.get('/api/documents?meta.status=done&fields=file_path')
+    assert [item['file_path'] for item in response.get_json()['data']] == ['beta.md']
+    assert client.get('/api/documents?facets=bogus').status_code == 400
@@ -0,0 +1,65 @@
+"""
+全局统计测试 - 增量维护、标签规范化和首页
+"""
+
+from app.services.global_stats import GlobalStatistics, classify_document_type
+from app.services.facet_index import FacetIndex
+
+def make_document(path, tags, words=10, modified_time='2024-03-01T00:00:00'):
+    return {
+        'file_path': path, 'tags': tags, 'word_count': words, 'size': words * 5,
+        'modified_time': modified_time, 'content': 'The cat sat on the mat. ' * words
+    }
+
+def test_incremental_updates_match_rebuild():
+    documents = [
+        make_document('a.md', ['学习', 'python']),
+        make_document('b.md', ['工作'], 20, '2024-04-02T00:00:00'),
+        make_document('c.md', [], 5)
+    ]
+    incremental = GlobalStatistics('/vault')
+    incremental.reset(documents[:2])
+    incremental.update('c.md', documents[2])
+    incremental.update('a.md', make_document('a.md', ['python'], 30, '2024-05-01T00:00:00'))
+    incremental.update('b.md', None)
+
+    rebuilt = GlobalStatistics('/vault')
+    rebuilt.reset([make_document('a.md', ['python'], 30, '2024-05-01T00:00:00'), documents[2]])
+    assert incremental.snapshot() == rebuilt.snapshot()
+    assert incremental.snapshot()['total_words'] == 35
+
+def test_missing_or_none_tags():
+    statistics = GlobalStatistics('/vault')
+    documents = [make_document('a.md', None), make_document('b.md', 'single')]
+    del documents[0]['tags']
+    statistics.reset(documents + [make_document('c.md', None), make_document('d.md', [None, ''])])
+
+    snapshot = statistics.snapshot()
+    assert snapshot['total_documents'] == 4
+    assert snapshot['top_tags'] == {'single': 1}
+    assert classify_document_type({'tags': None}) == '其他'
+
+def test_tag_counts_agree_with_facets():
+    documents = [
+        make_document('a.md', ['Python', '#python', '学习']),
+        make_document('b.md', ['python/']),
+        make_document('c.md', ['#学习'])
+    ]
+    statistics, facets = GlobalStatistics('/vault'), FacetIndex('/vault')
+    statistics.reset(documents)
+    facets.reset(documents)
+
+    top_tags = statistics.snapshot()['top_tags']
+    assert top_tags == {'python': 2, '学习': 2}
+    counts = facets.facets(set(facets.entries), ['tags'])['tags']
+    assert all(counts[tag] == count for tag, count in top_tags.items())
+    assert statistics.snapshot()['document_types'] == {'学习笔记': 2, '其他': 1}
+
+def test_home_page_lists_recent_documents(client):
+    response = client.get('/')
+    html = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    # 最近文档带有正文摘要（曾因未请求content字段而回退到空模板）
+    assert 'Gamma note #project' in html
+    assert 'Beta text about search engines' in html
@@ -0,0 +1,105 @@
+"""
+inotify监控测试 - 新建、修改、删除、重命名文件和移入目录产生的变更
+"""
+
+import os
+import queue
+import shutil
+import time
+
+import pytest
+
+from app.services.inotify_watcher import IN_CREATE, IN_ISDIR, InotifyWatcher, inotify_available
+from app.services.monitor_service import DocumentMonitor
+from conftest import write_note
+
+pytestmark = pytest.mark.skipif(not inotify_available(), reason='需要Linux inotify')
+
+class Changes:
+    """累计监控器上报的变更"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.reset()
+
+    def reset(self):
+        self.added, self.modified, self.deleted = set(), set(), set()
+
+    def wait_for(self, added=(), modified=(), deleted=(), timeout=5):
+        """等待直到累计变更包含期望的路径，返回累计结果"""
+        deadline = time.time() + timeout
+        while not (self.added >= set(added) and self.modified >= set(modified) and self.deleted >= set(deleted)):
+            try:
+                changes = self.queue.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                raise AssertionError(f'未收到期望的变更: {self.added}, {self.modified}, {self.deleted}')
+            self.added.update(changes.added)
+            self.modified.update(changes.modified)
+            self.deleted.update(changes.deleted)
+        result = (self.added, self.modified, self.deleted)
+        self.reset()
+        return result
+
+@pytest.fixture
+def monitor(vault):
+    changes = Changes()
+    monitor = DocumentMonitor(str(vault), changes.queue.put, 'inotify')
+    monitor.start()
+    # 首次扫描只建立基线并要求完整重新扫描
+    assert changes.queue.get(timeout=5).rescan
+    yield monitor, changes
+    monitor.stop()
+
+def test_create_modify_and_delete(monitor, vault):
+    monitor, changes = monitor
+    assert monitor.backend == 'inotify'
+
+    write_note(vault, 'notes/new.md', '# New\n')
+    write_note(vault, 'notes/ignored.txt', 'not a document')
+    assert changes.wait_for(added=['notes/new.md']) == ({'notes/new.md'}, set(), set())
+
+    write_note(vault, 'alpha.md', '# Alpha\n\nedited\n', 1800000000)
+    assert changes.wait_for(modified=['alpha.md'])[1] == {'alpha.md'}
+
+    os.remove(vault / 'beta.md')
+    assert changes.wait_for(deleted=['beta.md']) == (set(), set(), {'beta.md'})
+
+def test_rename_reports_delete_and_add(monitor, vault):
+    monitor, changes = monitor
+    os.rename(vault / 'alpha.md', vault / 'notes' / 'renamed.md')
+    added, _, deleted = changes.wait_for(added=['notes/renamed.md'], deleted=['alpha.md'])
+    assert (added, deleted) == ({'notes/renamed.md'}, {'alpha.md'})
+
+def test_directory_moved_in_and_out(monitor, vault, tmp_path):
+    monitor, changes = monitor
+    outside = tmp_path / 'outside'
+    write_note(outside, 'moved.md', '# Moved\n')
+    write_note(outside, 'deep/nested.md', '# Nested\n')
+    # 整个目录移入时没有其中文件的事件，重新扫描得到新增的文件
+    shutil.move(str(outside), str(vault / 'incoming'))
+    added, _, _ = changes.wait_for(added=['incoming/moved.md', 'incoming/deep/nested.md'])
+    assert added == {'incoming/moved.md', 'incoming/deep/nested.md'}
+
+    # 移入的目录已被监听，其中的后续变更也能收到
+    write_note(vault, 'incoming/deep/later.md', '# Later\n')
+    assert changes.wait_for(added=['incoming/deep/later.md'])[0] == {'incoming/deep/later.md'}
+
+    shutil.move(str(vault / 'incoming'), str(tmp_path / 'gone'))
+    deleted = changes.wait_for(deleted=['incoming/moved.md', 'incoming/deep/nested.md', 'incoming/deep/later.md'])[2]
+    assert len(deleted) == 3
+
+def test_watcher_skips_excluded_directories(vault):
+    os.makedirs(vault / '.obsidian')
+    watcher = InotifyWatcher()
+    try:
+        watcher.add_tree(str(vault), lambda name: name.startswith('.'))
+        assert sorted(watcher.paths) == [str(vault), str(vault / 'notes')]
+
+        os.makedirs(vault / 'fresh')
+        events = watcher.read_events(2)
+        assert (str(vault), IN_CREATE | IN_ISDIR, 'fresh') in events
+
+        watcher.remove_tree(str(vault / 'notes'))
+        assert sorted(watcher.paths) == [str(vault)]
+    finally:
+        watcher.close()
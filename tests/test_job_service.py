@@ -0,0 +1,138 @@
+"""
+后台任务测试 - 任务生命周期、进度、取消、进程退出或PID复用后的恢复和任务接口
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from app.services import job_service
+from app.services.job_service import (
+    CANCELLED, FAILED, FINISHED_STATES, QUEUED, RUNNING, SUCCEEDED, JobService
+)
+
+def wait_for(get_job, job_id, timeout=10):
+    """等待任务结束，返回任务信息"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = get_job(job_id)
+        if job['status'] in FINISHED_STATES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'任务未在{timeout}秒内结束: {job}')
+
+def test_job_succeeds_with_progress_and_result(tmp_path):
+    service = JobService(str(tmp_path))
+
+    def count(job):
+        total = job.params['n']
+        for done in range(1, total + 1):
+            job.progress(done, total, '计数')
+        return {'counted': total}
+
+    service.register('count', count)
+    job = service.submit('count', {'n': 3})
+    assert job['status'] in (QUEUED, RUNNING, SUCCEEDED)
+    assert job['params'] == {'n': 3}
+
+    job = wait_for(service.get, job['id'])
+    assert job['status'] == SUCCEEDED
+    assert job['progress'] == {'done': 3, 'total': 3, 'percent': 100.0, 'message': '计数'}
+    assert job['started'] and job['finished'] >= job['started']
+    assert service.get_result(job['id']) == {'counted': 3}
+    # 已结束的任务不能再取消
+    assert not service.cancel(job['id'])['cancel_requested']
+    # 其他进程（新的服务实例）可以读取任务状态和结果
+    assert JobService(str(tmp_path)).get_result(job['id']) == {'counted': 3}
+
+def test_failed_job_records_error(tmp_path):
+    service = JobService(str(tmp_path))
+    service.register('broken', lambda job: 1 / 0)
+    job = wait_for(service.get, service.submit('broken')['id'])
+    assert job['status'] == FAILED
+    assert 'division by zero' in job['error']
+    assert service.get_result(job['id']) is None
+
+def test_running_job_stops_at_next_progress_report(tmp_path):
+    service = JobService(str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def slow(job):
+        job.report_interval = 0
+        started.set()
+        release.wait(5)
+        job.progress(1, 10)
+        return 'unreachable'
+
+    service.register('slow', slow)
+    job = service.submit('slow')
+    assert started.wait(5)
+    assert service.cancel(job['id'])['cancel_requested']
+    release.set()
+
+    job = wait_for(service.get, job['id'])
+    assert job['status'] == CANCELLED
+    assert service.cancel('missing') is None
+
+def test_jobs_of_exited_processes_are_marked_failed(tmp_path, monkeypatch):
+    service = JobService(str(tmp_path))
+    service.register('noop', lambda job: None)
+    job = wait_for(service.get, service.submit('noop')['id'])
+    conn = service._connect()
+    conn.execute('UPDATE jobs SET status = ?, finished = NULL WHERE id = ?', (RUNNING, job['id']))
+    conn.commit()
+
+    monkeypatch.setattr(job_service, '_process_alive', lambda pid: False)
+    recovered = JobService(str(tmp_path)).get(job['id'])
+    assert recovered['status'] == FAILED
+    assert recovered['error'] == '执行任务的进程已退出'
+
+def test_jobs_of_reused_pids_are_marked_failed(tmp_path):
+    service = JobService(str(tmp_path))
+    service.register('noop', lambda job: None)
+    jobs = [wait_for(service.get, service.submit('noop')['id']) for _ in range(3)]
+    conn = service._connect()
+    # 三个任务的PID都是当前进程：实例相同、实例不同（PID被复用）、未记录实例（早期版本提交）
+    instances = [job_service._process_instance(os.getpid()), 'other-boot:1', None]
+    for job, instance in zip(jobs, instances):
+        conn.execute('UPDATE jobs SET status = ?, finished = NULL, instance = ? WHERE id = ?',
+                     (RUNNING, instance, job['id']))
+    conn.commit()
+
+    service = JobService(str(tmp_path))
+    assert [service.get(job['id'])['status'] for job in jobs] == [RUNNING, FAILED, RUNNING]
+
+def test_job_table_without_instance_column_is_upgraded(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'jobs.sqlite3'))
+    conn.execute(
+        'CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT, params TEXT, status TEXT, '
+        'progress_done INTEGER DEFAULT 0, progress_total INTEGER DEFAULT 0, message TEXT, '
+        'cancel_requested INTEGER DEFAULT 0, result TEXT, error TEXT, pid INTEGER, '
+        'created REAL, started REAL, finished REAL)'
+    )
+    conn.execute("INSERT INTO jobs (id, kind, status, pid, created) VALUES ('old', 'noop', ?, 0, 0)", (RUNNING,))
+    conn.commit()
+    conn.close()
+
+    service = JobService(str(tmp_path))
+    assert service.get('old')['status'] == FAILED
+    service.register('noop', lambda job: None)
+    assert wait_for(service.get, service.submit('noop')['id'])['status'] == SUCCEEDED
+
+def test_jobs_api(client):
+    response = client.post('/api/jobs', json={'kind': 'analysis', 'params': {'paths': ['alpha.md', 'nope.md']}})
+    assert response.status_code == 202
+    job_id = response.get_json()['data']['id']
+
+    job = wait_for(lambda i: client.get(f'/api/jobs/{i}').get_json()['data'], job_id)
+    assert job['status'] == SUCCEEDED
+    assert job['progress']['total'] == 1
+    result = client.get(f'/api/jobs/{job_id}/result').get_json()['data']
+    assert list(result['documents']) == ['alpha.md']
+    assert result['failed'] == {'nope.md': '文档不存在'}
+    assert client.get('/api/jobs').get_json()['data'][0]['id'] == job_id
+
+    assert client.post('/api/jobs', json={'kind': 'bogus'}).status_code == 400
+    assert client.post('/api/jobs', json=['analysis']).status_code == 400
+    assert client.get('/api/jobs/missing').status_code == 404
+    assert client.get('/api/jobs/missing/result').status_code == 404
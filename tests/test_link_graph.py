@@ -0,0 +1,69 @@
+"""
+链接图谱测试 - 紧凑导出（CSR）、标签过滤和二进制编码
+"""
+
+import json
+from app.services.link_graph import (
+    LinkGraph, GRAPH_HEADER, GRAPH_MAGIC, encode_graph_binary, encode_graph_json
+)
+
+def make_document(path, links=(), embeds=(), tags=None):
+    return {'file_path': path, 'title': path[:-3], 'wikilinks': list(links),
+            'embeds': list(embeds), 'tags': tags}
+
+def make_graph():
+    graph = LinkGraph('/vault')
+    graph.reset([
+        make_document('a.md', ['b', 'missing'], ['c'], ['Tech/Python']),
+        make_document('b.md', ['a'], tags=['#tech']),
+        make_document('notes/c.md', ['a', 'b'], tags=None),
+        make_document('d.md', tags=['technology'])
+    ])
+    return graph
+
+def test_export_builds_csr_arrays():
+    export = make_graph().export()
+
+    assert export['paths'] == ['a.md', 'b.md', 'd.md', 'notes/c.md']
+    assert export['offsets'].tolist() == [0, 2, 3, 3, 5]
+    assert export['targets'].tolist() == [1, 3, 0, 0, 1]
+    assert export['kinds'].tolist() == [0, 1, 0, 0, 0]
+
+def test_export_filters_and_degrees():
+    graph = make_graph()
+    assert graph.export(folder='notes')['paths'] == ['notes/c.md']
+    assert graph.export(include_embeds=False)['targets'].tolist() == [1, 0, 0, 1]
+    # d.md没有任何链接
+    assert graph.export(min_degree=1)['paths'] == ['a.md', 'b.md', 'notes/c.md']
+    assert graph.export(max_degree=3)['paths'] == ['b.md', 'd.md', 'notes/c.md']
+
+def test_tag_filter_uses_normalized_tags():
+    graph = make_graph()
+    # 大小写、#前缀和首尾斜杠不影响匹配；嵌套子标签也匹配，但technology不匹配tech
+    for tag in ('tech', '#Tech', 'TECH/'):
+        assert graph.export(tag=tag)['paths'] == ['a.md', 'b.md']
+    assert graph.export(tag='tech/python')['paths'] == ['a.md']
+    assert graph.export(tag='#')['paths'] == graph.export()['paths']
+
+def test_export_is_reused_until_graph_changes():
+    graph = make_graph()
+    first = graph.export(tag='tech')
+    assert graph.export(tag='#tech') is first
+
+    graph.update('d.md', make_document('d.md', ['a'], tags=['Tech']))
+    export = graph.export(tag='tech')
+    assert export is not first
+    assert export['paths'] == ['a.md', 'b.md', 'd.md']
+
+def test_binary_encoding_matches_json():
+    export = make_graph().export()
+    data = encode_graph_binary(export)
+    magic, _, _, _, nodes, edges, names_length = GRAPH_HEADER.unpack_from(data)
+    assert magic == GRAPH_MAGIC
+    assert (nodes, edges) == (4, 5)
+    assert GRAPH_HEADER.size % 4 == 0
+
+    names = json.loads(data[-names_length:].decode('utf-8'))
+    encoded = encode_graph_json(export)
+    assert names == {'nodes': encoded['nodes'], 'titles': encoded['titles']}
+    assert len(data) == GRAPH_HEADER.size + 4 * (nodes + 1) + 4 * edges + edges + names_length
@@ -0,0 +1,59 @@
+"""
+并行解析测试 - 进程池解析结果与顺序解析一致、按配置启用和失败时退回顺序解析
+"""
+
+import json
+from app.services.document_service import DocumentService, _parse_batch
+from app.services.vault_index import get_vault_index
+from conftest import write_note
+
+def add_notes(vault, count=40):
+    for i in range(count):
+        write_note(vault, f'bulk/note-{i:02d}.md',
+                   f'---\ntags: [bulk, n{i % 3}]\n---\n# Note {i}\n\nBody {i} links to [[alpha]].\n',
+                   1700100000 + i)
+
+def stamps(service):
+    return [(f.relative_path, f.mtime_ns, f.size) for f in service.walker.walk()]
+
+def test_parallel_parse_matches_serial_parse(app_context, vault):
+    add_notes(vault)
+    service = DocumentService()
+    entries = stamps(service)
+
+    parallel = service._parse_files_parallel(entries, 2)
+    serial = _parse_batch(service.vault_path, entries, service)
+    # 结果顺序与输入一致，子进程解析的文档与本进程解析的完全相同
+    assert [entry[:3] for entry in parallel] == entries
+    assert parallel == serial
+
+def test_cold_scan_uses_process_pool_when_enabled(app_context, workdir, vault, monkeypatch):
+    add_notes(vault)
+    path = workdir / 'config.json'
+    config = json.loads(path.read_text(encoding='utf-8'))
+    path.write_text(json.dumps(dict(config, parallel_parse=True, parse_workers=2,
+                                    parallel_parse_threshold=8, document_cache=False)), encoding='utf-8')
+    calls = []
+    original = DocumentService._parse_files_parallel
+
+    def recording(self, entries, workers):
+        calls.append((len(entries), workers))
+        return original(self, entries, workers)
+
+    monkeypatch.setattr(DocumentService, '_parse_files_parallel', recording)
+    documents = DocumentService().get_all_documents()
+    assert calls == [(43, 2)]
+    assert len(documents) == 43
+    assert 'Body 7 links' in get_vault_index(str(vault)).get('bulk/note-07.md')['content']
+
+def test_parallel_failure_falls_back_to_serial(app_context, vault, monkeypatch):
+    add_notes(vault, 4)
+    service = DocumentService()
+    service.parallel_parse, service.parse_workers, service.parallel_parse_threshold = True, 2, 1
+    entries = stamps(service)
+
+    def broken(self, entries, workers):
+        raise OSError('进程池不可用')
+
+    monkeypatch.setattr(DocumentService, '_parse_files_parallel', broken)
+    assert service._parse_files(entries) == _parse_batch(service.vault_path, entries, service)
@@ -0,0 +1,57 @@
+"""
+渲染缓存测试 - 内存LRU淘汰、磁盘读取和磁盘大小上限
+"""
+
+import os
+import sys
+from app.services.render_cache import RenderCache
+
+def html(char):
+    return char * 100
+
+def test_memory_budget_evicts_least_recently_used():
+    cache = RenderCache(max_bytes=sys.getsizeof(html('a')) * 3)
+    for char in 'abc':
+        cache.put(char, html(char))
+    # 读取a后b成为最久未使用的条目
+    assert cache.get('a') == html('a')
+    cache.put('d', html('d'))
+
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.get('b') is None
+    assert cache.get_stats()['bytes'] <= cache.max_bytes
+    # 超过预算的单个结果不进入内存
+    cache.put('big', 'x' * cache.max_bytes)
+    assert 'big' not in cache.entries
+
+def test_disk_results_survive_restart(tmp_path):
+    disk_dir = str(tmp_path / 'html')
+    RenderCache(disk_dir=disk_dir).put('a' * 64, '<p>a</p>')
+
+    cache = RenderCache(disk_dir=disk_dir)
+    assert cache.get('a' * 64) == '<p>a</p>'
+    assert cache.get_stats()['disk_hits'] == 1
+    assert cache.get('b' * 64) is None
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    keys = [char * 64 for char in 'abc']
+    cache = RenderCache(disk_dir=str(tmp_path / 'html'), disk_max_bytes=250)
+    cache.put(keys[0], html('a'))
+    cache.put(keys[1], html('b'))
+    for age, key in enumerate(keys[:2]):
+        os.utime(cache._disk_path(key), ns=(age, age))
+
+    # 从磁盘读取a会更新其修改时间，写入c超出上限时删除最久未使用的b
+    cache.clear()
+    assert cache.get(keys[0]) == html('a')
+    cache.put(keys[2], html('c'))
+
+    assert os.path.exists(cache._disk_path(keys[0]))
+    assert not os.path.exists(cache._disk_path(keys[1]))
+    assert os.path.exists(cache._disk_path(keys[2]))
+    stats = cache.get_stats()
+    assert stats['disk_evictions'] == 1 and stats['disk_bytes'] == 200
+
+    # 超过磁盘上限的单个结果不落盘
+    cache.put('d' * 64, 'x' * 300)
+    assert not os.path.exists(cache._disk_path('d' * 64))
@@ -0,0 +1,78 @@
+"""
+全文搜索索引测试 - 查询语法、短语匹配、BM25排序和索引持久化
+"""
+
+from app.services.search_index import SearchIndex
+
+def make_document(path, content, tags=None, title='', modified_time='2024-01-01T00:00:00'):
+    return {'file_path': path, 'title': title, 'tags': tags, 'content': content,
+            'modified_time': modified_time, 'size': len(content)}
+
+DOCUMENTS = [
+    make_document('a.md', 'search engine design with inverted index. search is fast.'),
+    make_document('b.md', 'the engine of search. a long note about cars and engines and more words here.'),
+    make_document('c.md', 'flask web framework', tags=['Python', '#web']),
+    make_document('d.md', '搜索引擎的倒排索引', tags='中文')
+]
+
+def make_index(tmp_path):
+    index = SearchIndex('/vault', str(tmp_path))
+    index.reset(DOCUMENTS)
+    return index
+
+def paths(results):
+    return [path for path, _ in results]
+
+def test_bm25_ranks_term_frequency_and_length(tmp_path):
+    results = make_index(tmp_path).search('search')
+    # a.md出现两次且更短，得分更高
+    assert paths(results) == ['a.md', 'b.md']
+    assert results[0][1] > results[1][1] > 0
+
+def test_phrase_and_boolean_queries(tmp_path):
+    index = make_index(tmp_path)
+    assert paths(index.search('"search engine"')) == ['a.md']
+    assert paths(index.search('"engine search"')) == []
+    assert sorted(paths(index.search('search engine'))) == ['a.md', 'b.md']
+    assert sorted(paths(index.search('cars OR flask'))) == ['b.md', 'c.md']
+    assert sorted(paths(index.search('engine*'))) == ['a.md', 'b.md']
+    assert paths(index.search('倒排索引')) == ['d.md']
+    assert index.search('"search engine"', limit=1) == index.search('"search engine"')[:1]
+
+def test_tags_are_indexed_whatever_their_form(tmp_path):
+    index = make_index(tmp_path)
+    assert paths(index.search('python')) == ['c.md']
+    assert paths(index.search('web')) == ['c.md']
+    # 单个字符串标签不会被拆成字符，None标签不报错
+    assert paths(index.search('中文')) == ['d.md']
+    index.update('e.md', make_document('e.md', 'memo', tags=[1, None]))
+    assert paths(index.search('memo')) == ['e.md']
+
+def test_updates_and_reset_reindex_only_changes(tmp_path):
+    index = make_index(tmp_path)
+    index.update('a.md', None)
+    assert paths(index.search('search')) == ['b.md']
+
+    index.reset(DOCUMENTS[1:] + [make_document('c.md', 'django', modified_time='2024-02-01T00:00:00')])
+    assert paths(index.search('flask')) == []
+    assert paths(index.search('django')) == ['c.md']
+    assert index.get_stats()['documents'] == 3
+
+def test_index_is_saved_and_loaded(tmp_path):
+    index = make_index(tmp_path)
+    index.search('search')
+    index.save(force=True)
+
+    loaded = SearchIndex('/vault', str(tmp_path))
+    assert not loaded.get_stats()['loaded']
+    # 加载前收到的变更在第一次查询时应用
+    loaded.update('b.md', None)
+    assert paths(loaded.search('search')) == ['a.md']
+    assert loaded.get_stats()['documents'] == 3
+
+def test_search_api(client):
+    response = client.get('/api/search?q="search engines"')
+    data = response.get_json()
+    assert data['success'] and data['count'] == 1
+    assert data['data'][0]['file_path'] == 'beta.md'
+    assert client.get('/api/search').status_code == 400
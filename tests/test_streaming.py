@@ -0,0 +1,66 @@
+"""
+流式列表测试 - stream=1分块JSON、NDJSON逐行输出、汇总行和输出中途出错时的error字段
+"""
+
+import json
+from app.services.document_service import DocumentService
+
+def ndjson(response):
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def fail_on(path):
+    """渲染指定文档时抛出异常的get_html"""
+    original = DocumentService.get_html
+
+    def get_html(self, document):
+        if document['file_path'] == path:
+            raise RuntimeError('渲染失败')
+        return original(self, document)
+    return get_html
+
+def test_streamed_json_matches_regular_response(client):
+    query = '/api/documents?sort=file_path&order=asc&fields=file_path,title,tags'
+    regular = client.get(query).get_json()
+    response = client.get(query + '&stream=1')
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == regular
+    assert 'Accept' in response.headers['Vary']
+
+    # 流式输出不限制limit上限
+    assert client.get('/api/documents?limit=5000&stream=1').get_json()['limit'] == 5000
+    assert client.get('/api/documents?limit=5000').get_json()['limit'] == 1000
+
+def test_ndjson_lines_end_with_done_record(client):
+    lines = ndjson(client.get('/api/documents?sort=file_path&order=asc&fields=file_path&format=ndjson'))
+    *items, done = lines
+    assert items == [{'file_path': 'alpha.md'}, {'file_path': 'beta.md'}, {'file_path': 'notes/gamma.md'}]
+    assert done == {'done': True, 'count': 3, 'total': 3, 'offset': 0, 'limit': 50, 'next_cursor': None}
+
+    # Accept头同样可以请求NDJSON
+    lines = ndjson(client.get('/api/search?q=flask', headers={'Accept': 'application/x-ndjson'}))
+    assert [item['file_path'] for item in lines[:-1]] == ['beta.md']
+    assert lines[-1] == {'done': True, 'query': 'flask', 'count': 1}
+
+def test_error_mid_stream_is_reported_in_the_tail(client, monkeypatch):
+    monkeypatch.setattr(DocumentService, 'get_html', fail_on('beta.md'))
+    query = '/api/documents?sort=file_path&order=asc&fields=file_path,html_content'
+
+    *items, done = ndjson(client.get(query + '&format=ndjson'))
+    # 已输出的条目保留，出错后停止输出，最后一行附带错误
+    assert [item['file_path'] for item in items] == ['alpha.md']
+    assert done['done'] and done['error'] == '渲染失败'
+
+    response = client.get(query + '&stream=1')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [item['file_path'] for item in data['data']] == ['alpha.md']
+    assert data['error'] == '渲染失败'
+
+def test_search_stream_reports_errors(client, monkeypatch):
+    def broken(self, document):
+        raise RuntimeError('读取正文失败')
+
+    monkeypatch.setattr(DocumentService, 'materialize', broken)
+    data = client.get('/api/search?q=flask&stream=1').get_json()
+    assert data['data'] == [] and data['error'] == '读取正文失败' and data['count'] == 1
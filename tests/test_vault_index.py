@@ -0,0 +1,166 @@
+"""
+文档索引测试 - 增量变更、完整扫描期间的变更和内容版本
+"""
+
+from app.services.vault_index import VaultIndex, get_vault_index
+from app.services.monitor_service import ChangeSet
+from app.services.document_service import DocumentService
+from conftest import write_note
+
+def make_document(path, modified_time='2024-01-01T00:00:00', size=1):
+    return {'file_path': path, 'title': path, 'modified_time': modified_time, 'size': size}
+
+class RecordingListener:
+    def __init__(self):
+        self.resets = 0
+        self.updates = []
+
+    def reset(self, documents):
+        self.resets += 1
+
+    def update(self, relative_path, document):
+        self.updates.append((relative_path, document is not None))
+
+def test_sync_applies_pending_changes():
+    index = VaultIndex('/vault')
+    listener = RecordingListener()
+    index.add_listener(listener)
+    index.replace([make_document('a.md'), make_document('b.md')])
+    index.apply_changes(ChangeSet('/vault', added=['c.md'], deleted=['a.md']))
+
+    assert index.sync(lambda path: make_document(path)) == 2
+    assert sorted(index.documents) == ['b.md', 'c.md']
+    assert sorted(listener.updates) == [('a.md', False), ('c.md', True)]
+    assert listener.resets == 1
+
+def test_changes_reported_during_scan_are_kept():
+    index = VaultIndex('/vault')
+    index.begin_scan()
+    # 扫描在索引锁之外进行，此时上报的变更不能丢失
+    index.apply_changes(ChangeSet('/vault', modified=['a.md'], added=['late.md']))
+    index.replace([make_document('a.md')])
+
+    assert index.loaded
+    assert index.pending == {'a.md': 'upsert', 'late.md': 'upsert'}
+    index.sync(lambda path: make_document(path, '2024-02-01T00:00:00'))
+    assert index.get('late.md') is not None
+    assert index.get('a.md')['modified_time'] == '2024-02-01T00:00:00'
+
+def test_rescan_during_scan_marks_scan_stale():
+    index = VaultIndex('/vault')
+    # 未加载且没有扫描时无需处理（下次读取本来就会完整扫描）
+    index.apply_changes(ChangeSet('/vault', rescan=True))
+    assert not index.stale
+
+    index.begin_scan()
+    index.apply_changes(ChangeSet('/vault', rescan=True))
+    index.replace([make_document('a.md')])
+    assert index.loaded
+    assert index.take_stale()
+    assert not index.take_stale()
+
+    index.apply_changes(ChangeSet('/vault', rescan=True))
+    assert not index.loaded
+
+def test_full_scan_picks_up_file_written_during_scan(app_context, vault, monkeypatch):
+    service = DocumentService()
+    index = get_vault_index(service.vault_path)
+    index.monitored = True
+    original = DocumentService._scan_and_parse
+
+    def scan_then_write(self, cache):
+        result = original(self, cache)
+        write_note(vault, 'late.md', '# Late\n\nwritten while scanning\n')
+        index.apply_changes(ChangeSet(service.vault_path, added=['late.md']))
+        return result
+
+    monkeypatch.setattr(DocumentService, '_scan_and_parse', scan_then_write)
+    service._get_index()
+
+    assert index.get('late.md') is not None
+    assert index.is_fresh()
+    assert not index.pending
+
+def test_merge_notifies_only_changed_documents():
+    index = VaultIndex('/vault')
+    listener = RecordingListener()
+    index.add_listener(listener)
+    a, b = make_document('a.md'), make_document('b.md')
+    index.merge([a, b])
+    generation, version = index.generation, index.version
+
+    assert index.merge([a, dict(b)]) == 0
+    assert (index.generation, index.version) == (generation, version)
+    assert listener.resets == 1 and not listener.updates
+
+    assert index.merge([make_document('a.md', size=5), make_document('c.md')]) == 3
+    assert sorted(listener.updates) == [('a.md', True), ('b.md', False), ('c.md', True)]
+    assert listener.resets == 1
+    assert index.version.startswith('2-')
+
+def test_unmonitored_requests_do_not_rebuild_derived_indexes(app_context, vault):
+    service = DocumentService()
+    service.get_all_documents()
+    index = get_vault_index(service.vault_path)
+    listener = RecordingListener()
+    index.add_listener(listener)
+
+    # 每个请求使用新的服务实例
+    DocumentService().get_all_documents()
+    DocumentService().get_all_documents()
+    assert listener.resets == 1 and not listener.updates
+
+    write_note(vault, 'beta.md', '# Beta\n\nchanged\n')
+    DocumentService().get_all_documents()
+    assert listener.resets == 1
+    assert listener.updates == [('beta.md', True)]
+
+def test_unchanged_scan_keeps_generation_and_version(app_context, vault):
+    DocumentService().get_all_documents()
+    index = get_vault_index(DocumentService().vault_path)
+    listener = RecordingListener()
+    index.add_listener(listener)
+    generation, version, resets = index.generation, index.version, listener.resets
+
+    # 没有监控器时每个请求完整扫描，文件未变化时索引不变，也不重建派生索引
+    for _ in range(3):
+        DocumentService().get_all_documents()
+    assert (index.generation, index.version) == (generation, version)
+    assert listener.resets == resets and not listener.updates
+
+    write_note(vault, 'delta.md', '# Delta\n')
+    DocumentService().get_all_documents()
+    assert index.generation == generation + 1 and index.version != version
+    assert listener.resets == resets and listener.updates == [('delta.md', True)]
+
+def test_version_depends_only_on_content():
+    first, second = VaultIndex('/vault'), VaultIndex('/vault')
+    first.replace([make_document('a.md'), make_document('b.md')])
+    second.replace([make_document('b.md')])
+    second.apply_changes(ChangeSet('/vault', added=['a.md']))
+    second.sync(lambda path: make_document(path))
+    assert first.version == second.version
+
+    first.apply_changes(ChangeSet('/vault', modified=['a.md']))
+    first.sync(lambda path: make_document(path, size=2))
+    assert first.version != second.version
+    assert first.version.startswith('2-')
+
+def test_rescan_during_scan_rechecks_file_states(app_context, vault, monkeypatch):
+    service = DocumentService()
+    index = get_vault_index(service.vault_path)
+    index.monitored = True
+    original = DocumentService._scan_and_parse
+
+    def scan_then_rescan(self, cache):
+        result = original(self, cache)
+        write_note(vault, 'beta.md', '# Beta\n\nedited while scanning\n')
+        index.apply_changes(ChangeSet(service.vault_path, rescan=True))
+        return result
+
+    monkeypatch.setattr(DocumentService, '_scan_and_parse', scan_then_rescan)
+    service._get_index()
+
+    assert index.is_fresh()
+    assert 'edited while scanning' in index.get('beta.md')['content']
+    assert index.get('alpha.md') is not None
@@ -0,0 +1,89 @@
+"""
+文档库快照测试 - 冷启动从快照恢复、快照之后的变更和快照不可用时的完整扫描
+"""
+
+import os
+import pytest
+from app.services.document_service import DocumentService
+from app.services.facet_index import get_facet_index
+from app.services.link_graph import get_link_graph
+from app.services.vault_index import get_vault_index
+from conftest import restart_process, write_note
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """记录被重新解析的文件"""
+    paths = []
+    original = DocumentService._parse_document
+
+    def counting_parse(self, file_path, relative_path):
+        paths.append(relative_path)
+        return original(self, file_path, relative_path)
+
+    monkeypatch.setattr(DocumentService, '_parse_document', counting_parse)
+    return paths
+
+def test_cold_start_restores_from_snapshot(app_context, monkeypatch, parsed):
+    service = DocumentService()
+    service.get_all_documents()
+    snapshot = service._get_snapshot()
+    assert os.path.exists(snapshot.path)
+    version = get_vault_index(service.vault_path).version
+    assert len(parsed) == 3
+
+    restart_process(monkeypatch)
+    parsed.clear()
+    service = DocumentService()
+    documents = service.get_all_documents()
+    snapshot = service._get_snapshot()
+
+    assert snapshot.last_load['documents'] == 3
+    assert snapshot.last_load['changed'] == snapshot.last_load['deleted'] == 0
+    assert parsed == []
+    assert len(documents) == 3
+    index = get_vault_index(service.vault_path)
+    assert index.version == version
+    # 派生索引直接使用快照中的状态，正文按需读取
+    backlinks = get_link_graph(service.vault_path).get_backlinks('beta.md')['backlinks']
+    assert [link['file_path'] for link in backlinks] == ['alpha.md']
+    assert get_facet_index(service.vault_path).match(['python']) == {'alpha.md', 'beta.md'}
+    assert 'Alpha links to' in index.get('alpha.md')['content']
+
+def test_changes_after_snapshot_are_reloaded(app_context, vault, monkeypatch, parsed):
+    DocumentService().get_all_documents()
+    write_note(vault, 'beta.md', '---\ntags: [rust]\n---\n# Beta\n\nrewritten\n')
+    write_note(vault, 'delta.md', '# Delta\n\nnew note linking [[beta]]\n')
+    os.remove(vault / 'notes' / 'gamma.md')
+
+    restart_process(monkeypatch)
+    parsed.clear()
+    service = DocumentService()
+    documents = service.get_all_documents()
+    snapshot = service._get_snapshot()
+
+    assert (snapshot.last_load['changed'], snapshot.last_load['deleted']) == (2, 1)
+    assert sorted(parsed) == ['beta.md', 'delta.md']
+    assert sorted(d['file_path'] for d in documents) == ['alpha.md', 'beta.md', 'delta.md']
+    assert get_facet_index(service.vault_path).match(['python']) == {'alpha.md'}
+    graph = get_link_graph(service.vault_path)
+    assert [link['file_path'] for link in graph.get_backlinks('beta.md')['backlinks']] == ['alpha.md', 'delta.md']
+    assert graph.get_backlinks('alpha.md')['backlinks'] == []
+
+    # 变更已写入快照，再次冷启动时不需要重新加载
+    restart_process(monkeypatch)
+    DocumentService().get_all_documents()
+    assert DocumentService()._get_snapshot().last_load['changed'] == 0
+
+def test_unreadable_snapshot_falls_back_to_full_scan(app_context, monkeypatch, parsed):
+    service = DocumentService()
+    service.get_all_documents()
+    with open(service._get_snapshot().path, 'wb') as f:
+        f.write(b'not a snapshot')
+
+    restart_process(monkeypatch)
+    parsed.clear()
+    service = DocumentService()
+    assert len(service.get_all_documents()) == 3
+    assert service._get_snapshot().last_load is None
+    # 文档缓存仍然命中，不需要重新解析
+    assert parsed == []
@@ -0,0 +1,54 @@
+"""
+文档库遍历测试 - 过滤规则、按目录mtime跳过未变化的目录和请求间共享的遍历器
+"""
+
+import os
+import json
+from app.services.document_service import DocumentService
+from app.services.vault_walker import VaultWalker
+from conftest import write_note
+
+def relative_paths(walker):
+    return sorted(f.relative_path.replace(os.sep, '/') for f in walker.walk())
+
+def test_walk_applies_extension_and_exclude_rules(vault):
+    write_note(vault, '.obsidian/workspace.md', 'hidden')
+    write_note(vault, 'node_modules/pkg/readme.md', 'excluded')
+    write_note(vault, 'notes/image.png', 'not a document')
+    walker = VaultWalker(str(vault))
+
+    assert relative_paths(walker) == ['alpha.md', 'beta.md', 'notes/gamma.md']
+    assert walker.count() == 3 and walker.count(limit=2) == 2
+    assert walker.is_document_path('notes/gamma.md')
+    assert not walker.is_document_path('.obsidian/workspace.md')
+    assert not walker.is_document_path('notes/image.png')
+    stamp = next(f for f in walker.walk() if f.relative_path == 'alpha.md')
+    assert stamp.size == os.path.getsize(vault / 'alpha.md')
+
+def test_trusted_dir_mtime_skips_unchanged_directories(vault):
+    walker = VaultWalker(str(vault), trust_dir_mtime=True)
+    assert relative_paths(walker) == ['alpha.md', 'beta.md', 'notes/gamma.md']
+    assert walker.pruned_dirs == 0
+
+    relative_paths(walker)
+    assert walker.pruned_dirs == 2
+
+    # 新增文件改变所在目录的mtime，只有该目录被重新列出
+    write_note(vault, 'notes/delta.md', '# Delta\n')
+    assert relative_paths(walker) == ['alpha.md', 'beta.md', 'notes/delta.md', 'notes/gamma.md']
+    assert walker.pruned_dirs == 1
+
+def test_document_services_share_the_walker(app_context, workdir, vault):
+    path = workdir / 'config.json'
+    config = json.loads(path.read_text(encoding='utf-8'))
+    path.write_text(json.dumps(dict(config, trust_dir_mtime=True)), encoding='utf-8')
+
+    DocumentService().get_all_documents()
+    service = DocumentService()
+    # 目录缓存在请求间保留，未变化的目录不再列出
+    assert service.walker is DocumentService().walker
+    service.get_all_documents()
+    assert service.walker.pruned_dirs == 2
+
+    path.write_text(json.dumps(config), encoding='utf-8')
+    assert not DocumentService().walker.trust_dir_mtime
@@ -0,0 +1,84 @@
+"""
+文档库监视器测试 - 主监控进程竞选、主进程退出后接替和通过事件日志向其他进程分发变更
+"""
+
+import time
+import sqlite3
+import multiprocessing
+
+import pytest
+
+from app.services import monitor_service
+from app.services.monitor_service import ChangeSet, VaultEventLog, VaultWatcher
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def publish_from_child(event_log, changes):
+    """在另一个进程中发布变更，模拟其他工作进程中的主监控进程"""
+    process = multiprocessing.get_context('fork').Process(target=event_log.publish, args=(changes,))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+def test_event_log_delivers_changes_of_other_processes(tmp_path):
+    event_log = VaultEventLog(str(tmp_path / 'vault'), str(tmp_path / 'cache'))
+    seq = event_log.latest_seq()
+    assert seq == 0
+
+    publish_from_child(event_log, ChangeSet(event_log.vault_path, ['a.md'], ['b.md'], ['c.md']))
+    changes, seq = event_log.read_since(seq)
+    assert (changes.added, changes.modified, changes.deleted, changes.rescan) == (['a.md'], ['b.md'], ['c.md'], False)
+    assert seq == event_log.latest_seq() == 3
+
+    # 本进程发布的变更已经在本进程处理过，读取时跳过但序号前进
+    event_log.publish(ChangeSet(event_log.vault_path, added=['mine.md']))
+    changes, seq = event_log.read_since(seq)
+    assert changes.is_empty() and seq == 4
+
+    publish_from_child(event_log, ChangeSet(event_log.vault_path, rescan=True))
+    changes, seq = event_log.read_since(seq)
+    assert changes.rescan and not changes.added
+
+def test_reader_that_fell_behind_rescans(tmp_path):
+    event_log = VaultEventLog(str(tmp_path / 'vault'), str(tmp_path / 'cache'))
+    event_log.max_events = 2
+    for i in range(5):
+        event_log.publish(ChangeSet(event_log.vault_path, added=[f'{i}.md']))
+    # 序号1之后的事件已被清理，无法增量更新
+    changes, seq = event_log.read_since(1)
+    assert changes.rescan and seq == 5
+    assert not event_log.read_since(3)[0].rescan
+
+@pytest.mark.skipif(monitor_service.fcntl is None, reason='需要fcntl文件锁')
+def test_one_leader_per_vault_and_takeover(tmp_path, vault):
+    cache_dir = str(tmp_path / 'cache')
+    received = {'first': [], 'second': []}
+    first = VaultWatcher(str(vault), received['first'].append, cache_dir, 0.05, 'polling')
+    second = VaultWatcher(str(vault), received['second'].append, cache_dir, 0.05, 'polling')
+    try:
+        first.start()
+        second.start()
+        assert (first.role, second.role) == ('leader', 'follower')
+        assert first.active_backend == 'polling' and second.active_backend is None
+
+        # 主监控进程处理首次扫描，并把变更写入事件日志供其他进程读取
+        assert wait_until(lambda: received['first'])
+        assert received['first'][0].rescan
+        rows = sqlite3.connect(first.event_log.db_path).execute('SELECT kind FROM events').fetchall()
+        assert rows == [('rescan',)]
+        time.sleep(0.2)
+        assert second.role == 'follower'
+
+        # 主监控进程退出后释放锁，跟随者接替并建立自己的基线
+        first.stop()
+        assert wait_until(lambda: second.role == 'leader')
+        assert wait_until(lambda: received['second'] and received['second'][0].rescan)
+    finally:
+        first.stop()
+        second.stop()